@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Admission Control Module
+
+Keeps the command server responsive under overload:
+
+    - token-bucket rate limits per connection and for the whole server
+    - a bounded number of pending (queued + running) requests, globally and
+      per connection; beyond it the client gets an immediate
+      "busy, retry after X ms" answer instead of an ever-growing queue
+    - per-type concurrency caps, so a flood of CODE: requests cannot starve
+      cheap INFO:/CMD: requests
+
+Usage:
+    ticket = controller.reserve(client_id, "CMD")  # raises AdmissionRejected
+    async with controller.slot(ticket):
+        ...  # ticket.queue_wait holds the time spent waiting for a slot
+
+A ticket that never reaches slot() (e.g. its task is cancelled while
+queued) must be given back with controller.release(ticket); releasing is
+idempotent, so it is safe to do so unconditionally when the task is done.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from core.protocol import MESSAGE_TYPES
+
+logger = logging.getLogger("Admission")
+
+# Alapértelmezett korlátok
+DEFAULT_GLOBAL_RATE = 500.0      # kérés/másodperc az egész szerverre
+DEFAULT_GLOBAL_BURST = 1000
+DEFAULT_CLIENT_RATE = 50.0       # kérés/másodperc kapcsolatonként
+DEFAULT_CLIENT_BURST = 100
+DEFAULT_MAX_PENDING = 512
+DEFAULT_CLIENT_MAX_PENDING = 128
+DEFAULT_TYPE_LIMITS = {
+    "CMD": 32,
+    "CODE": 4,
+    "FILE": 16,
+    "INFO": 64,
+    "REPLAY": 8,
+    "BATCH": 4,
+    "WORKFLOW": 4,
+}
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; the client should retry after retry_after_ms"""
+
+    def __init__(self, reason, retry_after_ms):
+        super().__init__(f"{reason}, retry after {retry_after_ms} ms")
+        self.reason = reason
+        self.retry_after_ms = retry_after_ms
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` stored"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount=1.0):
+        """Take tokens if available; returns (acquired, seconds until enough tokens)"""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True, 0.0
+        missing = amount - self.tokens
+        return False, missing / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self, amount=1.0):
+        self.tokens = min(self.burst, self.tokens + amount)
+
+
+class _ClientState:
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.pending = 0
+
+
+class Ticket:
+    """Handle for an admitted request"""
+
+    def __init__(self, msg_type, client):
+        self.msg_type = msg_type
+        self.client = client
+        self.queue_wait = 0.0
+        self.released = False
+
+
+class AdmissionController:
+    """
+    Rate limits, pending-request bounds and per-type concurrency caps.
+
+    Args:
+        global_rate, global_burst: Token bucket for the whole server
+        client_rate, client_burst: Token bucket for each connection
+        max_pending: Maximum number of queued + running requests on the server
+        client_max_pending: Maximum number of queued + running requests per connection
+        type_limits: Dict of message type -> maximum concurrent requests of that type
+    """
+
+    def __init__(self, global_rate=DEFAULT_GLOBAL_RATE, global_burst=DEFAULT_GLOBAL_BURST,
+                 client_rate=DEFAULT_CLIENT_RATE, client_burst=DEFAULT_CLIENT_BURST,
+                 max_pending=DEFAULT_MAX_PENDING, client_max_pending=DEFAULT_CLIENT_MAX_PENDING,
+                 type_limits=None):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_pending = max_pending
+        self.client_max_pending = client_max_pending
+        self.type_limits = dict(DEFAULT_TYPE_LIMITS if type_limits is None else type_limits)
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._clients = {}
+        self._semaphores = {t: asyncio.Semaphore(n) for t, n in self.type_limits.items()}
+        self.pending = 0
+        self._service_time = 0.05  # Átlagos kiszolgálási idő (EWMA), másodperc
+        self.stats = {"admitted": 0, "rejected_rate": 0, "rejected_busy": 0}
+
+    def _client(self, client_id):
+        state = self._clients.get(client_id)
+        if state is None:
+            state = _ClientState(self.client_rate, self.client_burst)
+            self._clients[client_id] = state
+        return state
+
+    def release_client(self, client_id):
+        """Forget a disconnected client's bucket"""
+        self._clients.pop(client_id, None)
+
+    def _busy_retry_ms(self):
+        """Estimated wait until a pending slot frees up"""
+        capacity = max(1, sum(self.type_limits.values()))
+        estimate = self._service_time * max(1.0, self.pending / capacity)
+        return max(10, int(estimate * 1000))
+
+    def reserve(self, client_id, msg_type):
+        """
+        Admit or reject a request without waiting.
+
+        Returns:
+            Ticket counted as pending until the request finishes in `slot()`
+
+        Raises:
+            AdmissionRejected: Rate limit exceeded or too many pending requests
+        """
+        client = self._client(client_id)
+
+        if self.pending >= self.max_pending or client.pending >= self.client_max_pending:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionRejected("Server busy", self._busy_retry_ms())
+
+        ok, wait = client.bucket.try_acquire()
+        if not ok:
+            self.stats["rejected_rate"] += 1
+            raise AdmissionRejected("Client rate limit exceeded", max(1, int(wait * 1000)))
+
+        ok, wait = self._global.try_acquire()
+        if not ok:
+            client.bucket.refund()
+            self.stats["rejected_rate"] += 1
+            raise AdmissionRejected("Server rate limit exceeded", max(1, int(wait * 1000)))
+
+        self.pending += 1
+        client.pending += 1
+        self.stats["admitted"] += 1
+        return Ticket(msg_type, client)
+
+    def release(self, ticket):
+        """Stop counting a ticket as pending (only the first call counts)"""
+        if ticket.released:
+            return
+        ticket.released = True
+        self.pending -= 1
+        ticket.client.pending -= 1
+
+    @asynccontextmanager
+    async def slot(self, ticket):
+        """Wait for a concurrency slot of the ticket's type, then release everything afterwards"""
+        semaphore = self._semaphores.get(ticket.msg_type)
+        try:
+            queued = time.monotonic()
+            if semaphore is not None:
+                await semaphore.acquire()
+            started = time.monotonic()
+            ticket.queue_wait = started - queued
+            try:
+                yield ticket
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+                self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - started)
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def admit(self, client_id, msg_type):
+        """reserve() and slot() in one step"""
+        ticket = self.reserve(client_id, msg_type)
+        async with self.slot(ticket):
+            yield ticket
+
+
+def message_type(message):
+    """Message type of a legacy text message (the prefix before ':')"""
+    prefix = message.split(":", 1)[0].strip().upper()
+    return prefix if prefix in MESSAGE_TYPES else "OTHER"
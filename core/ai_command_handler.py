@@ -21,20 +21,19 @@ import re  # For regex handling
 import hashlib  # For caching
 import pickle  # For cache serialization
 from core.response_router import route_response
-from core.command_library import COMMAND_LIBRARY  # Importáljuk a parancskönyvtárat
+from core.command_library import COMMAND_LIBRARY, OUTPUT_HEAD_BYTES, OUTPUT_TAIL_BYTES  # Importáljuk a parancskönyvtárat
+from core.execution_engine import run_blocking
+from core.history_store import HistoryStore, DEFAULT_HISTORY_PATH
+from core.logging_setup import setup_logging
 
-# Configure logging with UTF-8 encoding
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("ai_command_handler.log", encoding='utf-8'),  # Add UTF-8 encoding here
-        logging.StreamHandler()
-    ]
-)
+# Nem blokkoló naplózás (lásd core.logging_setup)
+setup_logging("ai_command_handler.log")
 
 logger = logging.getLogger("AI_Command_Handler")
 
+# A kezelő bejegyzéseinek forrása a közös előzménytárban
+HISTORY_SOURCE = "ai_command_handler"
+
 class AICommandHandler:
     """
     Unified handler for AI command detection and execution.
@@ -44,7 +43,7 @@ class AICommandHandler:
     # Command prefixes that are recognized
     COMMAND_PREFIXES = ("CMD:", "CODE:", "INFO:", "FILE:", "REPLAY:")
     
-    def __init__(self, chrome_path, chrome_driver_path, ws_port=8765):
+    def __init__(self, chrome_path, chrome_driver_path, ws_port=8765, history_store=None):
         self.chrome_path = chrome_path
         self.chrome_driver_path = chrome_driver_path
         self.ws_port = ws_port
@@ -67,12 +66,16 @@ class AICommandHandler:
         self.failed_commands = {}
         self.max_retries = 3
         
-        # Command history
-        self.command_history = []
+        # Command history (shown by "history"; REPLAY: may refer to older entries too)
         self.max_history_size = 10
         
-        # Initialize ReplayManager
-        self.replay_manager = ReplayManager()
+        # Tartós parancstörténet: alapból a szerverrel közös adatbázis, saját forrásnévvel
+        # (így a REPLAY: sorszámai csak a kezelő saját parancsait számolják)
+        self.history_store = history_store if history_store is not None else HistoryStore(DEFAULT_HISTORY_PATH)
+        
+        # Initialize ReplayManager (the only writer of this handler's history entries)
+        self.replay_manager = ReplayManager(max_history_size=self.max_history_size,
+                                            history_store=self.history_store, source=HISTORY_SOURCE)
         
         # Initialize browser connection
         self._initialize_browser()
@@ -152,7 +155,10 @@ class AICommandHandler:
             # Check if command contains file redirection
             has_redirection = any(op in cmd for op in ['>', '>>', '<'])
             
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=15, encoding='utf-8', errors='ignore')
+            # Korlátos kimenet: a teljes kimenet a lemezre kerül ("output <azonosító>")
+            result = run_blocking(cmd, timeout=15, head_bytes=OUTPUT_HEAD_BYTES, tail_bytes=OUTPUT_TAIL_BYTES)
+            if result.timed_out:
+                return "Hiba: Rendszerparancs időtúllépés."
             output = result.stdout.strip() or result.stderr.strip()
             
             # If command has redirection and was successful but no output, provide helpful message
@@ -166,13 +172,7 @@ class AICommandHandler:
                     pass
                 return "A fájlművelet sikeresen végrehajtva."
             
-            # Limit output length
-            if len(output) > 1000:
-                output = output[:1000] + "... [kimenet levágva]"
-            
             return output if output else "(Nincs kimenet)"
-        except subprocess.TimeoutExpired:
-            return "Hiba: Rendszerparancs időtúllépés."
         except Exception as e:
             self.command_stats["errors"] += 1
             return f"Rendszerparancs hiba: {str(e)}"
@@ -204,7 +204,7 @@ class AICommandHandler:
                 # Parancs feldolgozása kategória szerint
                 if category == "ECHO" and command.startswith("CMD:"):
                     cmd_content = command[command.find(":")+1:].strip()
-                    response = self._run_system_command(cmd_content)
+                    response = await self._run_system_command_async(cmd_content)
                     
                 elif category == "CODE":
                     # Kód végrehajtása vagy szerkesztése
@@ -220,7 +220,7 @@ class AICommandHandler:
                 # Válasz kezelése
                 if response:
                     self.handle_response(response, original_command=command)
-                    self._add_to_history(command)
+                    self._add_to_history(command, response)
                     self.log_command(command, response)
 
             except Exception as e:
@@ -410,7 +410,7 @@ class AICommandHandler:
             f"Python verzió: {py_version}",
             f"Operációs rendszer: {os_info}",
             f"Cache mérete: {len(self.cache)} bejegyzés",
-            f"Parancs előzmények: {len(self.command_history)} bejegyzés",
+            f"Parancs előzmények: {self.replay_manager.history_size()} bejegyzés",
             f"Könyvtár: {os.getcwd()}"
         ]
         
@@ -430,11 +430,12 @@ class AICommandHandler:
         
     def _cmd_history(self, args):
         """Parancs előzmények megjelenítése."""
-        if not self.command_history:
+        entries = self.replay_manager.recent_commands()
+        if not entries:
             return "Nincs parancselőzmény."
             
         result = []
-        for i, cmd in enumerate(self.command_history):
+        for i, cmd in enumerate(entry["command"] for entry in entries):
             # Rövidítsük le a parancsokat ha túl hosszúak
             truncated = cmd[:50] + "..." if len(cmd) > 50 else cmd
             result.append(f"{i+1}. {truncated}")
@@ -539,7 +540,10 @@ class AICommandHandler:
             # Check if command contains file redirection
             has_redirection = any(op in cmd for op in ['>', '>>', '<'])
             
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=15, encoding='utf-8', errors='ignore')
+            # Korlátos kimenet: a teljes kimenet a lemezre kerül ("output <azonosító>")
+            result = run_blocking(cmd, timeout=15, head_bytes=OUTPUT_HEAD_BYTES, tail_bytes=OUTPUT_TAIL_BYTES)
+            if result.timed_out:
+                return "Hiba: Rendszerparancs időtúllépés."
             output = result.stdout.strip() or result.stderr.strip()
             
             # If command has redirection and was successful but no output, provide helpful message
@@ -553,18 +557,26 @@ class AICommandHandler:
                     pass
                 return "A fájlművelet sikeresen végrehajtva."
             
-            # Limit output length
-            max_output_len = 1000
-            if len(output) > max_output_len:
-                output = output[:max_output_len] + "... [kimenet levágva]"
-            
             return output if output else "(Nincs kimenet)"
-        except subprocess.TimeoutExpired:
-            return "Hiba: Rendszerparancs időtúllépés."
         except Exception as e:
             self.command_stats["errors"] += 1
             return f"Rendszerparancs hiba: {str(e)}"
 
+    async def _run_system_command_async(self, cmd: str) -> str:
+        """_run_system_command az eseményhurok blokkolása nélkül (könyvtári parancsok natívan aszinkron)."""
+        parts = cmd.strip().split(None, 1)
+        base_cmd = parts[0].lower() if parts else ""
+        if base_cmd and base_cmd not in self.system_commands and base_cmd in COMMAND_LIBRARY:
+            self.command_stats["total_commands"] += 1
+            self.command_stats["system_commands"] += 1
+            try:
+                return await COMMAND_LIBRARY.acall(base_cmd, parts[1] if len(parts) > 1 else "")
+            except Exception as e:
+                self.command_stats["errors"] += 1
+                return f"Hiba a parancs végrehajtása közben: {str(e)}"
+        # Diagnosztika, JSON és nyers rendszerparancs: a szinkron változat szálon fut
+        return await asyncio.get_running_loop().run_in_executor(None, self._run_system_command, cmd)
+
     async def _send_openai_request(self, command):
         """OpenAI API-n keresztül küld egy kérést, cache-eléssel."""
         # Try to get from cache first
@@ -1008,7 +1020,7 @@ class AICommandHandler:
 
     def _get_command_index(self, command: str) -> int:
         """
-        Megkeresi egy parancs indexét a command_history listában.
+        Megkeresi egy parancs indexét a legutóbbi előzmények között.
         
         Args:
             command (str): A keresett parancs
@@ -1018,9 +1030,10 @@ class AICommandHandler:
         """
         try:
             # Keresés a history-ban
-            if command in self.command_history:
-                # 1-alapú index visszaadása (REPLAY:1 az első parancsra)
-                return self.command_history.index(command) + 1
+            for index, entry in enumerate(self.replay_manager.recent_commands(), start=1):
+                if entry["command"] == command:
+                    # 1-alapú index (REPLAY:1 a legutóbbi parancsra)
+                    return index
             return -1
         except Exception as e:
             logger.error(f"Hiba a parancs index keresésekor: {str(e)}")
@@ -1046,15 +1059,11 @@ class AICommandHandler:
             logger.error(error_msg)
             return error_msg
 
-    def _add_to_history(self, command):
-        """Add a command to history, maintaining max size"""
+    def _add_to_history(self, command, response=None):
+        """Record a finished command and its response (once per command, REPLAY: excluded)"""
         if command and not command.startswith("REPLAY:"):
-            # Csak akkor adjuk hozzá, ha még nincs benne
-            if command not in self.command_history:
-                self.command_history.insert(0, command)  # Add to front
-                if len(self.command_history) > self.max_history_size:
-                    self.command_history.pop()  # Remove oldest
-                logger.info(f"Command added to history: {command[:50]}...")
+            success = not self._is_error_response(response) if response else True
+            self.replay_manager.add_command(command, response, success)
 
     async def send_command_to_websocket(self, command):
         """Send a command to the WebSocket server"""
@@ -1065,10 +1074,6 @@ class AICommandHandler:
         is_replay = command.startswith("REPLAY:")
         original_command = command
         
-        # Ha nem REPLAY parancs, adjuk hozzá a history-hoz
-        if not is_replay:
-            self.replay_manager.add_command(command, "", True)  # Initially mark as successful
-        
         # WebSocket kapcsolat és parancs küldése
         for attempt in range(max_retries):
             try:
@@ -1094,17 +1099,17 @@ class AICommandHandler:
                     # Wait for response
                     response = await asyncio.wait_for(websocket.recv(), timeout=30)
                     
-                    # Update command status in replay manager
+                    # Update the retry tracking (the caller records the finished command in the history)
                     if not is_replay:
                         success = not self._is_error_response(response)
-                        self.replay_manager.add_command(command, response, success)
+                        self.replay_manager.track_result(command, success)
                         
                         if not success and self.replay_manager.should_retry(command):
                             logger.info(f"Command failed, triggering automatic retry...")
                             # Get command entry to retry
-                            command_entry = self.replay_manager.get_command_by_content(command)
-                            if command_entry:
-                                return await self.handle_replay(command_entry["index"])
+                            index = self._get_command_index(command)
+                            if index > 0:
+                                return await self.handle_replay(index)
                     
                     return response
                     
@@ -1118,7 +1123,7 @@ class AICommandHandler:
                     error_msg = f"WebSocket connection failed after {max_retries} attempts. Last error: {e}"
                     logger.error(error_msg)
                     if not is_replay:
-                        self.replay_manager.add_command(command, error_msg, False)
+                        self.replay_manager.track_result(command, False)
                     return error_msg
 
     def send_response_via_selenium(self, message):
@@ -1574,9 +1579,9 @@ class AICommandHandler:
                         # Handle system commands directly
                         if self._is_system_command(cmd_content):
                             print(f"DEBUG - Rendszerparancs detektálva: {cmd_content}")
-                            response = self._run_system_command(cmd_content)
+                            response = await self._run_system_command_async(cmd_content)
                             self.send_response_via_selenium(response)
-                            self._add_to_history(command)
+                            self._add_to_history(command, response)
                             self.log_command(command, response)
                             continue
                             
@@ -1587,7 +1592,7 @@ class AICommandHandler:
                         # MÓDOSÍTVA: Az összes CMD: parancsot megpróbáljuk futtatni subprocess-szel
                         else:
                             print(f"DEBUG - Nyers rendszerparancs futtatása: {cmd_content}")
-                            response = self._run_system_command(cmd_content)
+                            response = await self._run_system_command_async(cmd_content)
                             # Ha nincs kimenet, akkor adjunk visszajelzést
                             if not response or response == "(Nincs kimenet)":
                                 response = "Parancs végrehajtva, de nincs kimenet."
@@ -1661,7 +1666,7 @@ class AICommandHandler:
                     
                     if not is_handled_system_cmd:
                         self.handle_response(response, original_command=command)
-                        self._add_to_history(command)
+                        self._add_to_history(command, response)
                         self.log_command(command, response)
                 else:
                     logger.info("No response generated for command.")
@@ -1717,11 +1722,8 @@ class AICommandHandler:
     def get_previous_command(self, index):
         """Get a previously executed command by index (1-based)"""
         try:
-            # Convert to 0-based index
-            actual_index = index - 1
-            if 0 <= actual_index < len(self.command_history):
-                return self.command_history[actual_index]
-            return None
+            entry = self.replay_manager.get_command(index)
+            return entry["command"] if entry else None
         except Exception as e:
             logger.error(f"Error getting previous command: {e}")
             return None
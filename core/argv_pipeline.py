@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Argv Pipeline Module
+
+Shell-free execution of library command templates. A template is written
+like a shell command line, but it is never given to a shell:
+
+    "netstat -ano"                        argv, the arguments are appended
+    "ping -n 1 {args}"                    argv, the arguments replace {args}
+    "netstat -abno | findstr LISTENING"   argv + in-process pipeline stages
+
+The first stage is split into an argv list and executed directly (exec),
+so the user's arguments are plain argv elements: `|`, `>`, `;` or `&&` in
+them have no special meaning. Every further stage is a line filter run in
+this process on the command's output:
+
+    grep [-i] [-v] [-F] PATTERN          regular expression (-F: literal)
+    findstr [/I] [/V] [/R] STRING        literal (/R: regular expression)
+    find [/I] [/V] STRING                literal
+    head [-n] N, tail [-n] N             first / last N lines
+    sort [-r] [-n], uniq, wc -l          sort, drop repeated lines, count
+
+Anything else after a `|` (or a redirection / command chaining) is a
+PipelineError when the template is parsed.
+"""
+
+import logging
+import os
+import re
+import shlex
+from collections import deque
+
+logger = logging.getLogger("Argv_Pipeline")
+
+ARGS_PLACEHOLDER = "{args}"
+
+# A cmd.exe belső parancsai: Windowson csak "cmd /c" alatt futtathatók
+CMD_BUILTINS = frozenset(("dir", "cd", "chdir", "copy", "move", "del", "erase", "mkdir", "md", "rmdir", "rd",
+                          "cls", "ver", "type", "echo", "set", "ren", "rename", "vol", "date", "time"))
+
+# Olyan programok, amelyek az argumentumaikat maguk is parancsként értelmezik
+SHELL_PROGRAMS = frozenset(("cmd", "powershell", "pwsh", "sh", "bash", "zsh"))
+SHELL_METACHARACTERS = ("|", ">", "<", "&", ";", "`", "$(")
+
+
+class PipelineError(ValueError):
+    """Invalid command template, pipeline stage or argument string"""
+
+
+def split_args(text):
+    """Split an argument string into argv elements (quotes group words, backslashes are kept on Windows)"""
+    try:
+        if os.name == "nt":
+            parts = shlex.split(text, posix=False)
+            return [p[1:-1] if len(p) > 1 and p[0] == p[-1] and p[0] in "\"'" else p for p in parts]
+        return shlex.split(text)
+    except ValueError as e:
+        raise PipelineError(f"Invalid arguments: {e}")
+
+
+def program_name(argv):
+    """Lower-case program name of an argv list, without directory and .exe"""
+    name = os.path.basename(argv[0].replace("\\", "/")).lower() if argv else ""
+    return name[:-4] if name.endswith(".exe") else name
+
+
+class _Grep:
+    def __init__(self, pattern, ignore_case=False, invert=False, regex=True):
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regex = re.compile(pattern if regex else re.escape(pattern), flags)
+        self.invert = invert
+
+    def process(self, line):
+        return [line] if bool(self.regex.search(line)) != self.invert else []
+
+    def finish(self):
+        return []
+
+
+class _Head:
+    def __init__(self, count):
+        self.remaining = count
+
+    def process(self, line):
+        if self.remaining <= 0:
+            return []
+        self.remaining -= 1
+        return [line]
+
+    def finish(self):
+        return []
+
+
+class _Tail:
+    def __init__(self, count):
+        self.lines = deque(maxlen=count)
+
+    def process(self, line):
+        self.lines.append(line)
+        return []
+
+    def finish(self):
+        return list(self.lines)
+
+
+class _Sort:
+    def __init__(self, reverse=False, numeric=False):
+        self.reverse = reverse
+        self.numeric = numeric
+        self.lines = []
+
+    def _key(self, line):
+        match = re.match(r"\s*(-?\d+(?:\.\d+)?)", line)
+        return (0, float(match.group(1)), line) if match else (1, 0.0, line)
+
+    def process(self, line):
+        self.lines.append(line)
+        return []
+
+    def finish(self):
+        return sorted(self.lines, key=self._key if self.numeric else None, reverse=self.reverse)
+
+
+class _Uniq:
+    def __init__(self):
+        self.previous = None
+
+    def process(self, line):
+        if line == self.previous:
+            return []
+        self.previous = line
+        return [line]
+
+    def finish(self):
+        return []
+
+
+class _Count:
+    def __init__(self):
+        self.count = 0
+
+    def process(self, line):
+        self.count += 1
+        return []
+
+    def finish(self):
+        return [str(self.count)]
+
+
+def _line_count(tokens, name):
+    """N of "head -n N", "head -N" or "head N" (default 10)"""
+    if not tokens:
+        return 10
+    value = tokens[1] if tokens[0] == "-n" and len(tokens) > 1 else tokens[0].lstrip("-")
+    try:
+        return max(0, int(value))
+    except ValueError:
+        raise PipelineError(f"Invalid line count for {name}: {' '.join(tokens)}")
+
+
+def _split_flags(tokens, prefix):
+    """Leading flags ("-iv" -> {"i", "v"}, "/I" -> {"i"}) and the remaining tokens"""
+    flags = set()
+    index = 0
+    while index < len(tokens) and tokens[index].startswith(prefix) and len(tokens[index]) > 1:
+        flag = tokens[index][1:].lower()
+        flags.update(flag if prefix == "-" else (flag,))
+        index += 1
+    return flags, tokens[index:]
+
+
+def _grep_factory(text, pattern, ignore_case, invert, regex):
+    try:
+        _Grep(pattern, ignore_case, invert, regex)
+    except re.error as e:
+        raise PipelineError(f"Invalid pattern in '{text}': {e}")
+    return lambda: _Grep(pattern, ignore_case, invert, regex)
+
+
+def _parse_stage(text):
+    """One in-process stage ("grep -i foo") as a stage factory"""
+    try:
+        tokens = shlex.split(text)
+    except ValueError as e:
+        raise PipelineError(f"Invalid pipeline stage '{text}': {e}")
+    if not tokens:
+        raise PipelineError("Empty pipeline stage")
+    name, args = tokens[0].lower(), tokens[1:]
+
+    if name == "grep":
+        flags, rest = _split_flags(args, "-")
+        if len(rest) != 1:
+            raise PipelineError(f"grep needs exactly one pattern: {text}")
+        return _grep_factory(text, rest[0], "i" in flags, "v" in flags, "f" not in flags)
+    if name in ("findstr", "find"):
+        flags, rest = _split_flags(args, "/")
+        if len(rest) != 1:
+            raise PipelineError(f"{name} needs exactly one search string: {text}")
+        return _grep_factory(text, rest[0], "i" in flags, "v" in flags, name == "findstr" and "r" in flags)
+    if name == "head":
+        count = _line_count(args, name)
+        return lambda: _Head(count)
+    if name == "tail":
+        count = _line_count(args, name)
+        return lambda: _Tail(count)
+    if name == "sort":
+        flags, rest = _split_flags(args, "-")
+        if rest or flags - {"r", "n"}:
+            raise PipelineError(f"Unsupported sort options: {text}")
+        return lambda: _Sort("r" in flags, "n" in flags)
+    if name == "uniq" and not args:
+        return _Uniq
+    if name == "wc" and args == ["-l"]:
+        return _Count
+    raise PipelineError(f"Unsupported pipeline stage: {text}")
+
+
+class LineFilter:
+    """
+    Runs the stages of one execution on a byte stream, line by line.
+
+    feed() returns the filtered bytes of the complete lines received so
+    far; close() flushes the last partial line and the buffering stages
+    (tail, sort, wc).
+    """
+
+    def __init__(self, stages, encoding="utf-8"):
+        self.stages = stages
+        self.encoding = encoding
+        self._partial = b""
+
+    def _push(self, lines, first=0):
+        for stage in self.stages[first:]:
+            if not lines:
+                break
+            output = []
+            for line in lines:
+                output.extend(stage.process(line))
+            lines = output
+        return lines
+
+    def _encode(self, lines):
+        return "".join(line + "\n" for line in lines).encode(self.encoding)
+
+    def feed(self, data):
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return self._encode(self._push([line.decode(self.encoding, errors="replace") for line in lines]))
+
+    def close(self):
+        lines = [self._partial.decode(self.encoding, errors="replace")] if self._partial else []
+        self._partial = b""
+        output = self._push(lines)
+        for index, stage in enumerate(self.stages):
+            # A pufferelő szakasz kimenete a további szakaszokon is átmegy
+            output.extend(self._push(stage.finish(), index + 1))
+        return self._encode(output)
+
+
+class CommandTemplate:
+    """
+    Parsed library command template.
+
+    Args:
+        argv: Program and fixed arguments (may contain ARGS_PLACEHOLDER)
+        stages: Factories of the in-process pipeline stages
+        text: The template as declared
+    """
+
+    def __init__(self, argv, stages=(), text=""):
+        self.argv_template = list(argv)
+        self.stages = list(stages)
+        self.text = text
+
+    def argv(self, args=""):
+        """Argv of one execution with the user's argument string"""
+        extra = split_args(args) if args and args.strip() else []
+        if ARGS_PLACEHOLDER in self.argv_template:
+            index = self.argv_template.index(ARGS_PLACEHOLDER)
+            argv = self.argv_template[:index] + extra + self.argv_template[index + 1:]
+        else:
+            argv = self.argv_template + extra
+        if os.name == "nt" and program_name(argv) in CMD_BUILTINS:
+            argv = ["cmd", "/d", "/c"] + argv
+        return argv
+
+    def line_filter(self):
+        """A fresh LineFilter for one execution, or None if there are no stages"""
+        if not self.stages:
+            return None
+        return LineFilter([factory() for factory in self.stages])
+
+    def __repr__(self):
+        return f"CommandTemplate({self.text!r})"
+
+
+def parse_command_template(text):
+    """Parse "program args [| stage ...]" into a CommandTemplate (PipelineError if not supported)"""
+    parts = _split_pipeline(text)
+    if any(marker in parts[0] for marker in SHELL_METACHARACTERS):
+        raise PipelineError(f"Shell syntax is not supported in command templates: {text}")
+    argv = split_args(parts[0])
+    if not argv:
+        raise PipelineError("Empty command template")
+    return CommandTemplate(argv, [_parse_stage(part) for part in parts[1:]], text)
+
+
+def _split_pipeline(text):
+    """Split a template at the `|` characters outside quotes"""
+    parts = []
+    current = []
+    quote = None
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "|":
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    if quote:
+        raise PipelineError(f"Unbalanced quotes in command template: {text}")
+    if len(parts) > 1 and not all(parts):
+        raise PipelineError(f"Empty pipeline stage in command template: {text}")
+    return parts
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Batch Runner Module
+
+Runs a JSON command list concurrently, in the format of the repository's
+batch files (parancsok.json, kombinalt_parancsok.json, ...):
+
+    {"parancsok": ["echo Elso", "echo Masodik"], "parallel": 8}
+
+An item is either a command string, a library call
+({"parancs": "sysinfo", "paraméterek": ""}) or a conditional item
+({"feltetel": false, "utasitas": "..."}, skipped when the condition is
+false). The document may be given inline or as the path of a .json file.
+
+The result lists every item (output, success, duration) in the original
+order, plus an aggregate status: "ok", "partial" or "failed". With a
+parallelism limit of N, the batch takes roughly as long as its slowest
+item as long as there are no more than N items.
+
+Used by the BATCH: request type (run_batch, async) and by the "batch"
+library command (run_batch_sync, thread pool).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.protocol import is_error_response
+
+logger = logging.getLogger("Batch_Runner")
+
+DEFAULT_PARALLELISM = 8
+MAX_PARALLELISM = 64
+
+
+class BatchError(ValueError):
+    """The batch document is missing or invalid"""
+
+
+def load_batch_document(text):
+    """Parse an inline JSON batch document or load it from a .json file"""
+    text = text.strip()
+    if not text:
+        raise BatchError("Empty batch document")
+    if text.startswith("{"):
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BatchError(f"Invalid JSON batch document: {e}")
+    else:
+        if not os.path.isfile(text):
+            raise BatchError(f"Batch file not found: {text}")
+        try:
+            with open(text, "r", encoding="utf-8") as f:
+                document = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise BatchError(f"Cannot read batch file {text}: {e}")
+
+    if not isinstance(document, dict) or not isinstance(document.get("parancsok"), list):
+        raise BatchError("Batch document must be an object with a 'parancsok' list")
+    return document
+
+
+def batch_items(document):
+    """
+    Normalize the items of a batch document.
+
+    Returns:
+        List of {"command": str, "enabled": bool}; library calls become the
+        JSON command format understood by CMD: ({"parancs": ..., "paraméterek": ...})
+    """
+    items = []
+    for index, item in enumerate(document["parancsok"]):
+        if isinstance(item, str):
+            items.append({"command": item, "enabled": True})
+        elif isinstance(item, dict) and "utasitas" in item:
+            items.append({"command": str(item["utasitas"]), "enabled": item.get("feltetel", True) is not False})
+        elif isinstance(item, dict) and "parancs" in item:
+            command = json.dumps({"parancs": item["parancs"], "paraméterek": item.get("paraméterek", "")},
+                                 ensure_ascii=False)
+            items.append({"command": command, "enabled": True})
+        else:
+            raise BatchError(f"Invalid batch item #{index + 1}: {item!r}")
+    return items
+
+
+def batch_parallelism(document, default=DEFAULT_PARALLELISM):
+    """The document's "parallel" setting, clamped to 1..MAX_PARALLELISM"""
+    try:
+        value = int(document.get("parallel", default))
+    except (TypeError, ValueError):
+        raise BatchError(f"Invalid parallel value: {document.get('parallel')!r}")
+    return max(1, min(MAX_PARALLELISM, value))
+
+
+def _item_result(index, item, output, success, duration):
+    return {
+        "index": index,
+        "command": item["command"],
+        "status": "ok" if success else "failed",
+        "output": output,
+        "duration": round(duration, 4),
+    }
+
+
+def _skipped(index, item):
+    return {"index": index, "command": item["command"], "status": "skipped", "output": None, "duration": 0.0}
+
+
+def summarize(results, duration):
+    """Aggregate status of the item results (skipped items do not count)"""
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    failed = sum(1 for r in results if r["status"] == "failed")
+    if failed == 0:
+        status = "ok"
+    elif succeeded == 0:
+        status = "failed"
+    else:
+        status = "partial"
+    return {
+        "status": status,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": failed,
+        "skipped": len(results) - succeeded - failed,
+        "duration": round(duration, 4),
+        "items": results,
+    }
+
+
+async def run_batch(items, execute, parallelism=DEFAULT_PARALLELISM, on_item=None):
+    """
+    Run the items concurrently on the event loop.
+
+    Args:
+        items: Output of batch_items()
+        execute: Async callable(command) returning the text response
+        parallelism: Maximum number of items running at once
+        on_item: Optional async callback(result) called as each item finishes
+
+    Returns:
+        Summary dict (see summarize), items in their original order
+    """
+    semaphore = asyncio.Semaphore(parallelism)
+    started = time.monotonic()
+
+    async def run_item(index, item):
+        if not item["enabled"]:
+            result = _skipped(index, item)
+        else:
+            async with semaphore:
+                item_started = time.monotonic()
+                try:
+                    output = await execute(item["command"])
+                    success = not is_error_response(output)
+                except Exception as e:
+                    logger.error(f"Batch item #{index + 1} failed: {e}")
+                    output, success = f"Error: {e}", False
+                result = _item_result(index, item, output, success, time.monotonic() - item_started)
+        if on_item is not None:
+            await on_item(result)
+        return result
+
+    results = await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
+    return summarize(list(results), time.monotonic() - started)
+
+
+def run_batch_sync(items, execute, parallelism=DEFAULT_PARALLELISM):
+    """Blocking variant of run_batch(): `execute(command)` runs on a thread pool"""
+    started = time.monotonic()
+
+    def run_item(index, item):
+        if not item["enabled"]:
+            return _skipped(index, item)
+        item_started = time.monotonic()
+        try:
+            output = execute(item["command"])
+            success = not is_error_response(output)
+        except Exception as e:
+            output, success = f"Hiba: {e}", False
+        return _item_result(index, item, output, success, time.monotonic() - item_started)
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch") as pool:
+        results = list(pool.map(lambda pair: run_item(*pair), enumerate(items)))
+    return summarize(results, time.monotonic() - started)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Code Worker Module
+
+Entry point of a warm interpreter started by core.interpreter_pool. The
+worker imports the preloaded modules once, then executes CODE blocks
+received over its stdin pipe, each in a fresh namespace.
+
+Protocol (one JSON object per line):
+    pool -> worker: {"code": "..."}
+    worker -> pool: {"returncode": 0, "stdout": "...", "stderr": "...", "rss": 12345678}
+
+The protocol uses duplicates of the original stdin/stdout descriptors.
+File descriptors 1 and 2 are pointed at temp files while code runs, so
+print(), sys.stdout writes and child processes (os.system) are all
+captured without touching the protocol pipe.
+
+Between runs the worker puts back the state a snippet can cheaply change:
+the working directory, os.environ, sys.path, sys.argv and the builtins.
+State it cannot reset - newly imported modules, rebound attributes of the
+modules loaded at startup (monkeypatches), threads left running - makes
+the reply carry a "recycle" reason, and the pool replaces the worker.
+
+Not detected (isolation limits): in-place changes of shared objects (e.g.
+a handler added to the logging root, an item put into a module-level
+dict) and process-wide OS state (signal handlers, umask, resource limits,
+open file descriptors, child processes). Use a pool with max_runs=1, or
+no pool, when snippets of different clients must not affect each other.
+"""
+
+import argparse
+import builtins
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import traceback
+from json import dumps as _dumps, loads as _loads, JSONDecodeError as _JSONDecodeError
+
+# Ennyi bájt kimenetet küld vissza futásonként (a többit levágja)
+DEFAULT_MAX_OUTPUT = 1024 * 1024
+
+
+def _current_rss():
+    """Resident memory of this worker in bytes (0 if it cannot be measured)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss: kilobájt Linuxon, bájt macOS-en
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+    except Exception:
+        return 0
+
+
+def _read_capture(f, max_output):
+    """Read back what the code wrote into a capture file, then empty the file"""
+    f.flush()
+    size = f.tell()
+    f.seek(0)
+    data = f.read(max_output)
+    f.seek(0)
+    f.truncate()
+    text = data.decode("utf-8", errors="replace")
+    if size > max_output:
+        text += f"\n...(truncated, {size - max_output} more bytes)..."
+    return text
+
+
+class Baseline:
+    """Snapshot of the interpreter state after startup, restored after every run"""
+
+    def __init__(self):
+        self.cwd = os.getcwd()
+        self.environ = dict(os.environ)
+        self.path = list(sys.path)
+        self.argv = list(sys.argv)
+        self.builtins = dict(vars(builtins))
+        self.modules = {name: (module, dict(vars(module))) for name, module in list(sys.modules.items())
+                        if module is not None and hasattr(module, "__dict__")}
+
+    def _changed_modules(self):
+        changed = []
+        for name, (module, attributes) in self.modules.items():
+            current = vars(module)
+            if sys.modules.get(name) is not module or len(current) != len(attributes):
+                changed.append(name)
+            elif any(current.get(key, attributes) is not value for key, value in attributes.items()):
+                changed.append(name)
+        return changed
+
+    def restore(self):
+        """Reset the resettable state; returns why the worker must be recycled, or None"""
+        reasons = []
+        try:
+            os.chdir(self.cwd)
+        except OSError as e:
+            reasons.append(f"cannot restore the working directory: {e}")
+        if os.environ != self.environ:
+            os.environ.clear()
+            os.environ.update(self.environ)
+        sys.path[:] = self.path
+        sys.argv[:] = self.argv
+        if vars(builtins) != self.builtins:
+            vars(builtins).clear()
+            vars(builtins).update(self.builtins)
+
+        # Ami nem állítható vissza: új modulok, módosított modulattribútumok, futó szálak
+        imported = sorted(set(sys.modules) - set(self.modules))
+        if imported:
+            reasons.append(f"imported {', '.join(imported[:5])}")
+        changed = self._changed_modules()
+        if changed:
+            reasons.append(f"modified {', '.join(changed[:5])}")
+        if threading.active_count() > 1:
+            reasons.append(f"{threading.active_count() - 1} threads left running")
+        return "; ".join(reasons) or None
+
+
+def run_code(code, out_file, err_file, max_output, baseline=None):
+    """Execute one CODE block in a fresh namespace and collect its result"""
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    returncode = 0
+    try:
+        exec(compile(code, "<generated_code>", "exec"), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    reply = {
+        "returncode": returncode,
+        "stdout": _read_capture(out_file, max_output),
+        "stderr": _read_capture(err_file, max_output),
+        "rss": _current_rss(),
+    }
+    recycle = baseline.restore() if baseline is not None else None
+    if recycle:
+        reply["recycle"] = recycle
+    return reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Project-S warm CODE worker")
+    parser.add_argument("--preload", default="", help="Comma separated modules to import at startup")
+    parser.add_argument("--max-output", type=int, default=DEFAULT_MAX_OUTPUT)
+    options = parser.parse_args()
+
+    # Úgy viselkedjen, mintha a kód a munkakönyvtárban lévő fájlból futna
+    sys.path[0] = os.getcwd()
+
+    # Protokoll csatornák: az eredeti stdin/stdout másolatai
+    proto_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    proto_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+
+    # A futtatott kód ne olvashasson a protokoll csatornából
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    sys.stdin = open(os.devnull, "r")
+
+    # Az 1-es és 2-es leírókat ideiglenes fájlokba irányítjuk
+    out_file = tempfile.TemporaryFile()
+    err_file = tempfile.TemporaryFile()
+    os.dup2(out_file.fileno(), 1)
+    os.dup2(err_file.fileno(), 2)
+    sys.stdout = open(1, "w", encoding="utf-8", errors="replace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="replace", closefd=False)
+
+    preloaded = []
+    for name in filter(None, (m.strip() for m in options.preload.split(","))):
+        try:
+            importlib.import_module(name)
+            preloaded.append(name)
+        except Exception as e:
+            print(f"Preload failed for {name}: {e}", file=sys.stderr)
+    _read_capture(out_file, 0)
+    _read_capture(err_file, 0)
+    # Bemelegítés: a hibaútvonal (traceback) és a psutil / resource lusta importjai
+    # az induló állapot részei legyenek, ne váltsanak ki újraindítást
+    run_code("raise RuntimeError('warm-up')", out_file, err_file, 0)
+    baseline = Baseline()
+
+    proto_out.write(_dumps({"ready": True, "pid": os.getpid(), "preloaded": preloaded}) + "\n")
+    proto_out.flush()
+
+    for line in proto_in:
+        if not line.strip():
+            continue
+        try:
+            request = _loads(line)
+        except _JSONDecodeError as e:
+            reply = {"returncode": 1, "stdout": "", "stderr": f"Invalid request: {e}", "rss": _current_rss()}
+        else:
+            reply = run_code(request.get("code", ""), out_file, err_file, options.max_output, baseline)
+        proto_out.write(_dumps(reply, ensure_ascii=False) + "\n")
+        proto_out.flush()
+
+
+if __name__ == "__main__":
+    main()
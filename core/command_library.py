@@ -6,86 +6,231 @@ Project-S - Command Library Module
 
 This module imports command lists from system_commands.py and creates a unified 
 command library dictionary for use in the AI command handler.
+
+The library is a lazy CommandRegistry (see core.command_registry): importing
+this module only declares the commands. The command tables are expanded on
+first access, heavy dependencies (psutil, the batch runner, the execution
+engine, ...) are imported by the commands that use them, and third-party
+command packs are loaded through entry points. `python -m core.command_library`
+checks the import time against IMPORT_BUDGET_MS.
+
+Results are cached per command: CACHE_POLICIES declares how long the output
+of a command may be reused (commands not listed there are never cached),
+and the shared RESULT_CACHE keeps them with LRU eviction. Concurrent calls
+of the same read-only command (COALESCED_COMMANDS) with the same arguments
+share one execution (LIBRARY_FLIGHTS, or LIBRARY_ASYNC_FLIGHTS when awaited);
+every other command runs once per call.
+
+Shell command entries and aliases are command templates (core.argv_pipeline):
+they are executed directly, without /bin/sh or cmd.exe, and a "| findstr"
+style pipeline runs as in-process stages on their output.
 """
 
-import subprocess
 import os
-import platform
-import socket
 import datetime
 import json
-import psutil  # Tipp: ha ez hiányzik, telepítsd: pip install psutil
 from core.system_commands import SYSTEM_COMMANDS, POWERSHELL_COMMANDS, SECURITY_COMMANDS
+from core.command_registry import CommandRegistry, KindView, KIND_TRIVIAL, KIND_IO, KIND_CPU
+from core.result_cache import ResultCache, CACHE_NEVER, CACHE_FOREVER
+from core.single_flight import SingleFlight, AsyncSingleFlight
 
-# Create a unified command library dictionary
-# Keys are command identifiers and values are the actual commands
-COMMAND_LIBRARY = {}
+# Az importálás időkerete (lásd main())
+IMPORT_BUDGET_MS = 10
 
-# Cache rendered command results
-_COMMAND_CACHE = {}
-_MAX_CACHE_SIZE = 100
-_CACHE_TTL = 300  # 5 perc cache élettartam másodpercben
+# Parancseredmények gyorsítótára (LRU + parancsonkénti élettartam, lásd CACHE_POLICIES)
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE = ResultCache(max_entries=RESULT_CACHE_SIZE)
 
-# Helper function to execute a command with subprocess
-def _execute_command(cmd, args=""):
-    """Execute a command with subprocess and return the output"""
+# Parancsonkénti élettartam másodpercben; ami nincs itt, az sosem kerül a gyorsítótárba
+CACHE_POLICIES = {
+    # Mindig friss eredmény kell
+    "date": CACHE_NEVER,
+    "time": CACHE_NEVER,
+    # Lassan változó állapot
+    "sysinfo": 5,
+    "diskspace": 5,
+    "firewall_status": 10,
+    "services": 10,
+    "disk_info": 30,
+    "system_info": 60,
+    "users": 60,
+    "installed_software": 300,
+    "startup_items": 300,
+    # Futás közben nem változik
+    "ver": CACHE_FOREVER,
+    "help": CACHE_FOREVER,
+    "whoami": CACHE_FOREVER,
+    "hostname": CACHE_FOREVER,
+    "cpu_info": CACHE_FOREVER,
+    "memory_info": CACHE_FOREVER,
+}
+
+# Egyidejű azonos hívások összevonása (egy végrehajtás, közös eredmény)
+LIBRARY_FLIGHTS = SingleFlight()
+LIBRARY_ASYNC_FLIGHTS = AsyncSingleFlight()
+
+# Csak olvasó parancsok: csak ezek egyidejű azonos hívásai vonhatók össze,
+# minden más (copy, del, sec_sc, batch, ...) hívásonként külön fut le
+COALESCED_COMMANDS = frozenset((
+    "echo", "cat", "type", "dir", "ls", "pwd", "ver", "date", "time", "whoami", "hostname", "help", "output",
+    "sysinfo", "system_info", "cpu_info", "memory_info", "disk_info", "diskspace", "processes",
+    "running_processes", "network", "network_connections", "open_ports", "firewall_status", "services",
+    "users", "installed_software", "startup_items",
+    "ps_getcontent", "ps_getchilditem", "ps_testpath", "ps_getprocess", "ps_getservice",
+    "sec_netstat", "sec_tasklist",
+))
+
+# A memóriában tartott kimenet: eleje és vége (a teljes kimenet a lemezre kerül, lásd "output")
+OUTPUT_HEAD_BYTES = 1000
+OUTPUT_TAIL_BYTES = 500
+
+# Rendszerparancsok időkorlátja másodpercben
+COMMAND_TIMEOUT = 15
+
+# Tiltott részletek a parancssorban
+HARMFUL_PATTERNS = ("rm -rf", "deltree", "format", ":(){", "sudo rm")
+MAX_COMMAND_LENGTH = 500
+
+# Könyvtári parancssablonok (elemzés egyszer, első használatkor)
+_TEMPLATES = {}
+
+def _checked_command_line(cmd, args=""):
+    """(full command line, None), or (None, error message) if the command is not allowed"""
     full_cmd = cmd
     if args:
         full_cmd = f"{cmd} {args}"
+    
+    # Biztonsági ellenőrzések
+    if len(full_cmd) > MAX_COMMAND_LENGTH:
+        return None, "Hiba: Túl hosszú parancs."
+    
+    # Shellen át futó parancs: az átirányítás és a csővezeték is tiltott
+    if any(pattern in full_cmd.lower() for pattern in HARMFUL_PATTERNS + (">", "|")):
+        return None, "Hiba: Potenciálisan veszélyes parancs blokkolva biztonsági okokból."
+    return full_cmd, None
+
+def _checked_argv(command, args=""):
+    """(argv, line filter, None) of a library command template, or (None, None, error message)"""
+    from core.argv_pipeline import PipelineError, SHELL_PROGRAMS, SHELL_METACHARACTERS, program_name
+    try:
+        template = _TEMPLATES.get(command)
+        if template is None:
+            from core.argv_pipeline import parse_command_template
+            template = _TEMPLATES[command] = parse_command_template(command)
+        argv = template.argv(args)
+    except PipelineError as e:
+        return None, None, f"Hiba: {str(e)}"
+    
+    command_line = " ".join(argv)
+    if len(command_line) > MAX_COMMAND_LENGTH:
+        return None, None, "Hiba: Túl hosszú parancs."
+    if any(pattern in command_line.lower() for pattern in HARMFUL_PATTERNS):
+        return None, None, "Hiba: Potenciálisan veszélyes parancs blokkolva biztonsági okokból."
+    # Nincs shell: a |, > stb. sima argumentum, kivéve ha maga a program is shell (cmd, powershell)
+    if program_name(argv) in SHELL_PROGRAMS and any(marker in args for marker in SHELL_METACHARACTERS):
+        return None, None, "Hiba: Potenciálisan veszélyes parancs blokkolva biztonsági okokból."
+    return argv, template.line_filter(), None
+
+def _command_output(result):
+    """Response text of an ExecutionResult"""
+    if result.timed_out:
+        return "Hiba: Rendszerparancs időtúllépés."
+    output = result.stdout.strip() or result.stderr.strip()
+    return output if output else "(Nincs kimenet)"
+
+# Helper function to execute a command with subprocess
+def _execute_command(cmd, args=""):
+    """Execute a command with subprocess and return the output"""
+    # A gyorsítótárazás a regiszterben történik (CACHE_POLICIES szerint)
+    try:
+        full_cmd, error = _checked_command_line(cmd, args)
+        if error:
+            return error
         
-    # Ellenőrizzük a cache-t
-    cache_key = f"{full_cmd}__{platform.node()}"
-    if cache_key in _COMMAND_CACHE:
-        result, timestamp = _COMMAND_CACHE[cache_key]
-        if (datetime.datetime.now() - timestamp).total_seconds() < _CACHE_TTL:
-            return result
+        from core.execution_engine import run_blocking
         
-    # Korlátozzuk a cache méretét
-    if len(_COMMAND_CACHE) >= _MAX_CACHE_SIZE:
-        # A legrégebbi 10 elem törlése
-        keys_to_remove = sorted(_COMMAND_CACHE.keys(), 
-                             key=lambda k: _COMMAND_CACHE[k][1])[:10]
-        for key in keys_to_remove:
-            del _COMMAND_CACHE[key]
-    
+        # Korlátos kimenet: csak az eleje és a vége marad a memóriában
+        return _command_output(run_blocking(full_cmd, timeout=COMMAND_TIMEOUT, head_bytes=OUTPUT_HEAD_BYTES,
+                                            tail_bytes=OUTPUT_TAIL_BYTES))
+    except Exception as e:
+        return f"Rendszerparancs hiba: {str(e)}"
+
+def _execute_template(command, args=""):
+    """Run a library command template directly, without a shell (pipeline stages run in-process)"""
+    argv = None
     try:
-        # Biztonsági ellenőrzések
-        if len(full_cmd) > 500:
-            return "Hiba: Túl hosszú parancs."
-            
-        harmful_patterns = ["rm -rf", "deltree", "format", ":(){", "sudo rm", ">", "|"]
-        if any(pattern in full_cmd.lower() for pattern in harmful_patterns):
-            return "Hiba: Potenciálisan veszélyes parancs blokkolva biztonsági okokból."
+        argv, line_filter, error = _checked_argv(command, args)
+        if error:
+            return error
+        
+        from core.execution_engine import run_blocking
         
-        result = subprocess.run(full_cmd, shell=True, capture_output=True, text=True, timeout=15, encoding='utf-8', errors='ignore')
-        output = result.stdout.strip() or result.stderr.strip()
+        return _command_output(run_blocking(argv, timeout=COMMAND_TIMEOUT, shell=False, head_bytes=OUTPUT_HEAD_BYTES,
+                                            tail_bytes=OUTPUT_TAIL_BYTES, line_filter=line_filter))
+    except FileNotFoundError:
+        return f"Hiba: A program nem található: {argv[0]}"
+    except Exception as e:
+        return f"Rendszerparancs hiba: {str(e)}"
+
+async def _execute_template_async(command, args=""):
+    """Awaitable _execute_template: asyncio subprocess, killed on timeout or cancellation"""
+    argv = None
+    try:
+        argv, line_filter, error = _checked_argv(command, args)
+        if error:
+            return error
         
-        # Limit output length
-        max_output_len = 1000
-        if len(output) > max_output_len:
-            output = output[:max_output_len] + "... [kimenet levágva]"
+        from core.execution_engine import ExecutionEngine, engine_slot
         
-        final_output = output if output else "(Nincs kimenet)"
+        engine = ExecutionEngine(max_concurrency=1, default_timeout=COMMAND_TIMEOUT,
+                                 head_bytes=OUTPUT_HEAD_BYTES, tail_bytes=OUTPUT_TAIL_BYTES)
+        # A hívó (szerver) közös végrehajtójának egy helyét foglalja
+        async with engine_slot():
+            return _command_output(await engine.run_exec(argv, line_filter=line_filter))
+    except FileNotFoundError:
+        return f"Hiba: A program nem található: {argv[0]}"
+    except Exception as e:
+        return f"Rendszerparancs hiba: {str(e)}"
+
+async def _execute_command_async(cmd, args=""):
+    """Awaitable _execute_command: asyncio subprocess, killed on timeout or cancellation"""
+    try:
+        full_cmd, error = _checked_command_line(cmd, args)
+        if error:
+            return error
         
-        # Cache the result
-        _COMMAND_CACHE[cache_key] = (final_output, datetime.datetime.now())
+        from core.execution_engine import ExecutionEngine, engine_slot
         
-        return final_output
-    except subprocess.TimeoutExpired:
-        return "Hiba: Rendszerparancs időtúllépés."
+        # Hívásonként saját motor (nem kötődik egyetlen eseményhurokhoz sem),
+        # a párhuzamossági korlát a hívó közös végrehajtójáé
+        engine = ExecutionEngine(max_concurrency=1, default_timeout=COMMAND_TIMEOUT,
+                                 head_bytes=OUTPUT_HEAD_BYTES, tail_bytes=OUTPUT_TAIL_BYTES)
+        async with engine_slot():
+            return _command_output(await engine.run_shell(full_cmd))
     except Exception as e:
         return f"Rendszerparancs hiba: {str(e)}"
 
+# Create a unified command library (lazy registry: entries are declared, callables resolved on first use)
+# Keys are command identifiers and values are the actual commands
+COMMAND_LIBRARY = CommandRegistry(shell_runner=_execute_template, cache=RESULT_CACHE, flights=LIBRARY_FLIGHTS,
+                                  async_shell_runner=_execute_template_async, async_flights=LIBRARY_ASYNC_FLIGHTS)
+
+# Parancsazonosító -> végrehajtási típus (ami hiányzik, az KIND_IO)
+COMMAND_KINDS = KindView(COMMAND_LIBRARY)
+
 # Function to create command entry in the library
-def _add_command(command_id, command_text):
-    """Add a command to the library with a function that executes it"""
-    
-    # Create a function that will execute this specific command
-    def execute_command(args=""):
-        return _execute_command(command_text, args)
-    
-    # Add the function to the library
-    COMMAND_LIBRARY[command_id] = execute_command
+def _add_command(command_id, command_text, kind=KIND_IO):
+    """Declare a shell command in the library (its runner is built on first use)"""
+    return COMMAND_LIBRARY.register(command_id, command=command_text, kind=kind, **_policy(command_id))
+
+def _policy(command_id):
+    """Cache and coalescing options of a built-in command"""
+    return {"cache_ttl": CACHE_POLICIES.get(command_id, CACHE_NEVER),
+            "coalesce": command_id in COALESCED_COMMANDS}
+
+def get_command_kind(command_id):
+    """Return how a library command should be dispatched (KIND_TRIVIAL, KIND_IO or KIND_CPU)"""
+    return COMMAND_LIBRARY.kind(command_id)
 
 # Gyorsított belső parancsok natív Python implementációkkal
 def _cmd_echo(args=""):
@@ -111,28 +256,18 @@ def _cmd_whoami(args=""):
 def _cmd_hostname(args=""):
     """Számítógépnév lekérdezése"""
     try:
+        import socket
         return socket.gethostname()
     except:
         return "unknown"
 
 def _cmd_dir(args=""):
-    """Könyvtár tartalmának listázása"""
-    path = args.strip() if args else "."
+    """Könyvtár tartalmának listázása (opciók: depth=N glob=minta)"""
     try:
-        items = os.listdir(path)
-        result = []
-        for item in items:
-            full_path = os.path.join(path, item)
-            size = ""
-            try:
-                if os.path.isdir(full_path):
-                    item += "/"
-                else:
-                    size = f" ({os.path.getsize(full_path)} bytes)"
-            except:
-                pass
-            result.append(f"{item}{size}")
-        return "\n".join(sorted(result))
+        from core.dir_listing import scan, parse_list_options, format_entry
+        path, options = parse_list_options(args.strip() if args else ".")
+        entries = scan(path, options.get("depth", 1), options.get("glob"))
+        return "\n".join(format_entry(info) for info in entries)
     except Exception as e:
         return f"Hiba: {str(e)}"
 
@@ -154,24 +289,52 @@ def _cmd_cat(args=""):
     except Exception as e:
         return f"Hiba a fájl olvasásakor: {str(e)}"
 
+def _sampler():
+    """The background system sampler (started on first use, see core.system_sampler)"""
+    from core.system_sampler import get_sampler
+    return get_sampler()
+
+def _history_seconds(args):
+    """N of a "history=N" option (0 if not given)"""
+    for token in (args or "").split():
+        name, _, value = token.partition("=")
+        if name.lower() == "history":
+            try:
+                return max(0, int(float(value)))
+            except ValueError:
+                return 0
+    return 0
+
 def _cmd_sysinfo(args=""):
-    """Rendszerinformáció Python-alapú implementációja"""
+    """Rendszerinformáció a háttér-mintavevő legutóbbi pillanatképéből (history=N: utolsó N mp trendje)"""
     try:
-        import psutil
-        mem = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        from core.system_sampler import summarize_window
+        sampler = _sampler()
+        snap = sampler.snapshot()
+        root = next((d for d in snap["disks"] if d["mountpoint"] in ("/", "C:\\")), None)
         
         info = [
-            f"Rendszernév: {platform.node()}",
-            f"Operációs rendszer: {platform.system()} {platform.release()}",
-            f"CPU: {platform.processor()}",
-            f"CPU magok: {psutil.cpu_count(logical=False)} (fizikai), {psutil.cpu_count()} (logikai)",
-            f"CPU használat: {psutil.cpu_percent()}%",
-            f"Memória: {mem.total / (1024*1024*1024):.2f} GB (használt: {mem.percent}%)",
-            f"Lemez: {disk.total / (1024*1024*1024):.2f} GB (használt: {disk.percent}%)",
-            f"Hálózati csatolók: {', '.join(psutil.net_if_addrs().keys())}",
-            f"Bootolás ideje: {datetime.datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S')}"
+            f"Rendszernév: {snap['node']}",
+            f"Operációs rendszer: {snap['system']} {snap['release']}",
+            f"CPU: {snap['processor']}",
+            f"CPU magok: {snap['physical_cores']} (fizikai), {snap['logical_cores']} (logikai)",
+            f"CPU használat: {snap['cpu_percent']}%",
+            f"Memória: {snap['memory_total'] / (1024*1024*1024):.2f} GB (használt: {snap['memory_percent']}%)",
+        ]
+        if root is not None:
+            info.append(f"Lemez: {root['total'] / (1024*1024*1024):.2f} GB (használt: {root['percent']}%)")
+        info += [
+            f"Hálózati csatolók: {', '.join(snap['interfaces'])}",
+            f"Bootolás ideje: {datetime.datetime.fromtimestamp(snap['boot_time']).strftime('%Y-%m-%d %H:%M:%S')}"
         ]
+        
+        seconds = _history_seconds(args)
+        if seconds:
+            for name, label in (("cpu_percent", "CPU"), ("memory_percent", "Memória")):
+                summary = summarize_window(sampler.window(name, seconds))
+                if summary:
+                    info.append(f"{label} (utolsó {seconds} mp): átlag {summary['avg']:.1f}%, "
+                                f"min {summary['min']:.1f}%, max {summary['max']:.1f}% ({summary['samples']} minta)")
         return "\n".join(info)
     except ImportError:
         return "A psutil modul nem elérhető. Telepítsd: pip install psutil"
@@ -179,41 +342,33 @@ def _cmd_sysinfo(args=""):
         return f"Hiba a rendszerinformáció lekérdezésekor: {str(e)}"
 
 def _cmd_processes(args=""):
-    """Futó processek listázása Python-alapú implementációja"""
+    """A legnagyobb terhelésű folyamatok (sort=cpu|rss|io n=N user=NÉV name=REGEX)"""
     try:
-        import psutil
+        from core.process_table import parse_process_options, top_processes
+        try:
+            options = parse_process_options(args)
+        except ValueError as e:
+            return f"Hiba: {str(e)}"
+        records = _sampler().snapshot()["processes"]
+        top = top_processes(records, options["n"], options["sort"], options["user"], options["name"])
+        
         procs = []
-        for proc in psutil.process_iter(['pid', 'name', 'username', 'memory_info']):
-            try:
-                pinfo = proc.info
-                mem = pinfo['memory_info'].rss / (1024 * 1024) if pinfo['memory_info'] else 0
-                procs.append(f"{pinfo['pid']}\t{mem:.1f} MB\t{pinfo['username'] or 'N/A'}\t{pinfo['name'] or 'N/A'}")
-                if len(procs) >= 25:  # Limit to top 25 processes
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
+        for pinfo in top:
+            mem = pinfo['rss'] / (1024 * 1024)
+            procs.append(f"{pinfo['pid']}\t{pinfo['cpu_percent']:.1f}%\t{mem:.1f} MB\t"
+                         f"{pinfo['io_rate'] / 1024:.1f} KB/s\t{pinfo['username'] or 'N/A'}\t{pinfo['name'] or 'N/A'}")
                 
-        return "PID\tMemória\tFelhasználó\tFolyamatnév\n" + "\n".join(procs)
+        return "PID\tCPU\tMemória\tI/O\tFelhasználó\tFolyamatnév\n" + "\n".join(procs)
     except ImportError:
         return "A psutil modul nem elérhető. Telepítsd: pip install psutil"
     except Exception as e:
         return f"Hiba a folyamatok lekérdezésekor: {str(e)}"
 
 def _cmd_network(args=""):
-    """Hálózati kapcsolatok megjelenítése Python-alapú implementációja"""
+    """Hálózati kapcsolatok a háttér-mintavevő kapcsolattáblájából"""
     try:
-        import psutil
-        conns = []
-        for conn in psutil.net_connections(kind='inet'):
-            try:
-                if conn.laddr and conn.laddr.port:
-                    conns.append(f"{conn.laddr.ip}:{conn.laddr.port} -> " + 
-                               f"{conn.raddr.ip if conn.raddr else '*'}:{conn.raddr.port if conn.raddr else '*'} " +
-                               f"[{conn.status}] (PID: {conn.pid or 'N/A'})")
-                if len(conns) >= 25:  # Limit to top 25 connections
-                    break
-            except:
-                pass
+        conns = [f"{conn['laddr']} -> {conn['raddr']} [{conn['status']}] (PID: {conn['pid'] or 'N/A'})"
+                 for conn in _sampler().snapshot()["connections"][:25]]  # Limit to 25 connections
                 
         return "\n".join(conns) if conns else "Nem találhatók hálózati kapcsolatok"
     except ImportError:
@@ -221,6 +376,73 @@ def _cmd_network(args=""):
     except Exception as e:
         return f"Hiba a hálózati kapcsolatok lekérdezésekor: {str(e)}"
 
+def _run_batch_command(command):
+    """Egy kötegelt parancs: JSON könyvtári hívás, könyvtári parancs vagy rendszerparancs"""
+    if command.startswith("{"):
+        call = json.loads(command)
+        name = call["parancs"].lower().strip()
+        if name not in COMMAND_LIBRARY:
+            return f"Ismeretlen parancs a parancskönyvtárban: {name}"
+        return COMMAND_LIBRARY[name](call.get("paraméterek", ""))
+    parts = command.strip().split(None, 1)
+    if parts and parts[0].lower() in COMMAND_LIBRARY and parts[0].lower() != "batch":
+        return COMMAND_LIBRARY[parts[0].lower()](parts[1] if len(parts) > 1 else "")
+    return _execute_command(command)
+
+def _cmd_batch(args=""):
+    """JSON parancslista párhuzamos futtatása (batch fájl.json vagy inline {"parancsok": [...]})"""
+    if not args or not args.strip():
+        return "Használat: batch [fájl.json | {\"parancsok\": [...]}]"
+    from core.batch_runner import BatchError, load_batch_document, batch_items, batch_parallelism, run_batch_sync
+    try:
+        document = load_batch_document(args)
+        summary = run_batch_sync(batch_items(document), _run_batch_command, batch_parallelism(document))
+        return json.dumps(summary, indent=2, ensure_ascii=False)
+    except BatchError as e:
+        return f"Hiba: {str(e)}"
+
+async def _run_batch_command_async(command):
+    """Awaitable _run_batch_command: the items of a batch run concurrently on the event loop"""
+    if command.startswith("{"):
+        call = json.loads(command)
+        name = call["parancs"].lower().strip()
+        if name not in COMMAND_LIBRARY:
+            return f"Ismeretlen parancs a parancskönyvtárban: {name}"
+        return await COMMAND_LIBRARY.acall(name, call.get("paraméterek", ""))
+    parts = command.strip().split(None, 1)
+    if parts and parts[0].lower() in COMMAND_LIBRARY and parts[0].lower() != "batch":
+        return await COMMAND_LIBRARY.acall(parts[0].lower(), parts[1] if len(parts) > 1 else "")
+    return await _execute_command_async(command)
+
+async def _acmd_batch(args=""):
+    """Native async batch: run_batch() on the caller's event loop instead of a thread pool"""
+    if not args or not args.strip():
+        return _cmd_batch(args)
+    from core.batch_runner import BatchError, load_batch_document, batch_items, batch_parallelism, run_batch
+    try:
+        document = load_batch_document(args)
+        summary = await run_batch(batch_items(document), _run_batch_command_async, batch_parallelism(document))
+        return json.dumps(summary, indent=2, ensure_ascii=False)
+    except BatchError as e:
+        return f"Hiba: {str(e)}"
+
+def _cmd_output(args=""):
+    """Levágott parancskimenet teljes szövege azonosító alapján (output <id> offset=N length=N)"""
+    if not args or not args.strip():
+        return "Használat: output <azonosító> [offset=N] [length=N]"
+    from core.file_transfer import TransferError, parse_range_options
+    from core.output_capture import OutputNotFound, read_output, DEFAULT_READ_LENGTH
+    try:
+        output_id, options = parse_range_options(args.strip())
+        offset = options.get("offset", 0)
+        data, more = read_output(output_id, offset, options.get("length") or DEFAULT_READ_LENGTH)
+    except (OutputNotFound, TransferError) as e:
+        return f"Hiba: {str(e)}"
+    text = data.decode("utf-8", errors="replace")
+    if more:
+        text += f"\n... [folytatás: output {output_id} offset={offset + len(data)}]"
+    return text
+
 def _cmd_help(args=""):
     """Parancs súgó"""
     commands = {
@@ -231,10 +453,12 @@ def _cmd_help(args=""):
         "hostname": "Számítógépnév",
         "dir/ls": "Könyvtár tartalmának listázása (dir [útvonal])",
         "cat/type": "Fájl tartalmának megjelenítése (cat fájlnév)",
-        "sysinfo": "Részletes rendszerinformáció",
-        "processes": "Futó folyamatok listája",
+        "sysinfo": "Részletes rendszerinformáció (history=N: utolsó N mp CPU/memória trendje)",
+        "processes": "Legnagyobb terhelésű folyamatok (sort=cpu|rss|io n=N user=NÉV name=REGEX)",
         "network": "Hálózati kapcsolatok listája",
         "diskspace": "Lemezterület információ",
+        "batch": "JSON parancslista párhuzamos futtatása (batch parancsok.json)",
+        "output": "Levágott parancskimenet teljes szövege (output <azonosító> offset=N)",
         "help": "Ez a súgó",
         "open_ports": "Nyitott portok listázása",
         "system_info": "Teljes rendszerinformáció"
@@ -247,19 +471,12 @@ def _cmd_help(args=""):
     return result
 
 def _cmd_diskspace(args=""):
-    """Lemezterület információ Python-alapú implementációja"""
+    """Lemezterület információ a háttér-mintavevő pillanatképéből"""
     try:
-        import psutil
-        disks = []
-        for part in psutil.disk_partitions(all=False):
-            if os.name == 'nt':
-                if 'cdrom' in part.opts or part.fstype == '':
-                    # Skip CD-ROM és nem elérhető meghajtók
-                    continue
-            usage = psutil.disk_usage(part.mountpoint)
-            disks.append(f"{part.device} ({part.mountpoint}): " +
-                       f"{usage.total / (1024*1024*1024):.2f} GB total, " +
-                       f"{usage.used / (1024*1024*1024):.2f} GB used ({usage.percent}%)")
+        disks = [f"{disk['device']} ({disk['mountpoint']}): " +
+                 f"{disk['total'] / (1024*1024*1024):.2f} GB total, " +
+                 f"{disk['used'] / (1024*1024*1024):.2f} GB used ({disk['percent']}%)"
+                 for disk in _sampler().snapshot()["disks"]]
                        
         return "\n".join(disks)
     except ImportError:
@@ -267,70 +484,85 @@ def _cmd_diskspace(args=""):
     except Exception as e:
         return f"Hiba a lemezterület információ lekérdezésekor: {str(e)}"
 
-# Internal commands with fast execution
+# Internal commands with fast execution: (function, execution kind)
 INTERNAL_COMMANDS = {
-    "echo": _cmd_echo,
-    "date": _cmd_date,
-    "time": _cmd_time,
-    "whoami": _cmd_whoami,
-    "hostname": _cmd_hostname,
-    "dir": _cmd_dir,
-    "ls": _cmd_dir,  # alias for dir
-    "cat": _cmd_cat, 
-    "type": _cmd_cat,  # alias for cat
-    "help": _cmd_help,
-    "sysinfo": _cmd_sysinfo,
-    "processes": _cmd_processes,
-    "network": _cmd_network,
-    "diskspace": _cmd_diskspace
+    "echo": (_cmd_echo, KIND_TRIVIAL),
+    "date": (_cmd_date, KIND_TRIVIAL),
+    "time": (_cmd_time, KIND_TRIVIAL),
+    "whoami": (_cmd_whoami, KIND_TRIVIAL),
+    "hostname": (_cmd_hostname, KIND_TRIVIAL),
+    "dir": (_cmd_dir, KIND_IO),
+    "ls": (_cmd_dir, KIND_IO),  # alias for dir
+    "cat": (_cmd_cat, KIND_IO),
+    "type": (_cmd_cat, KIND_IO),  # alias for cat
+    "help": (_cmd_help, KIND_TRIVIAL),
+    "sysinfo": (_cmd_sysinfo, KIND_IO),
+    # A mintavevő a szerverfolyamatban fut: a pillanatkép olvasása nem igényel folyamatkészletet
+    "processes": (_cmd_processes, KIND_IO),
+    "network": (_cmd_network, KIND_IO),
+    "diskspace": (_cmd_diskspace, KIND_IO),
+    "batch": (_cmd_batch, KIND_IO),
+    "output": (_cmd_output, KIND_IO)
+}
+
+# Natív aszinkron megvalósítások (a többi belső parancs várakozáskor szálon fut)
+ASYNC_COMMANDS = {
+    "batch": _acmd_batch,
 }
 
-# Add internal commands to library
-for cmd_id, func in INTERNAL_COMMANDS.items():
-    COMMAND_LIBRARY[cmd_id] = func
-
-# Add system commands to library
-for cmd in SYSTEM_COMMANDS:
-    command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
-    if command_parts:
-        # Extract the command name for the library key
-        cmd_id = command_parts.split()[0].lower()
-        if cmd_id not in COMMAND_LIBRARY:  # Ne írjuk felül a belső parancsokat
-            _add_command(cmd_id, command_parts)
-
-# Add PowerShell commands with 'ps_' prefix
-for cmd in POWERSHELL_COMMANDS:
-    command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
-    if command_parts:
-        # Use 'ps_' prefix for PowerShell commands
-        cmd_id = "ps_" + command_parts.split()[0].lower().replace('-', '')
-        if cmd_id not in COMMAND_LIBRARY:
-            _add_command(cmd_id, f"powershell {command_parts}")
-
-# Add security commands with 'sec_' prefix
-for cmd in SECURITY_COMMANDS:
-    command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
-    if command_parts:
-        # Extract first significant part for command ID
-        first_part = command_parts.split()[0].lower()
-        if first_part in ('powershell', 'netsh', 'reg'):
-            # For commands starting with these, use the second part as well
-            parts = command_parts.split()
-            if len(parts) > 1:
-                cmd_id = f"sec_{first_part}_{parts[1].lower()}"
+def _register_builtin_commands(registry):
+    """Declare the internal commands and the command tables (runs on first access to the library)"""
+    # Add internal commands to library
+    for cmd_id, (func, kind) in INTERNAL_COMMANDS.items():
+        registry.register(cmd_id, func, kind=kind, description=(func.__doc__ or "").strip(),
+                          async_target=ASYNC_COMMANDS.get(cmd_id), **_policy(cmd_id))
+
+    # Add system commands to library
+    for cmd in SYSTEM_COMMANDS:
+        command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
+        if command_parts:
+            # Extract the command name for the library key
+            cmd_id = command_parts.split()[0].lower()
+            # Ne írjuk felül a belső parancsokat (register nem cserél)
+            registry.register(cmd_id, command=command_parts, description=SYSTEM_COMMANDS[cmd], **_policy(cmd_id))
+
+    # Add PowerShell commands with 'ps_' prefix
+    for cmd in POWERSHELL_COMMANDS:
+        command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
+        if command_parts:
+            # Use 'ps_' prefix for PowerShell commands
+            cmd_id = "ps_" + command_parts.split()[0].lower().replace('-', '')
+            registry.register(cmd_id, command=f"powershell {command_parts}", description=POWERSHELL_COMMANDS[cmd],
+                              **_policy(cmd_id))
+
+    # Add security commands with 'sec_' prefix
+    for cmd in SECURITY_COMMANDS:
+        command_parts = cmd.split('#', 1)[0].strip()  # Remove comments
+        if command_parts:
+            # Extract first significant part for command ID
+            first_part = command_parts.split()[0].lower()
+            if first_part in ('powershell', 'netsh', 'reg'):
+                # For commands starting with these, use the second part as well
+                parts = command_parts.split()
+                if len(parts) > 1:
+                    cmd_id = f"sec_{first_part}_{parts[1].lower()}"
+                else:
+                    cmd_id = f"sec_{first_part}"
             else:
                 cmd_id = f"sec_{first_part}"
-        else:
-            cmd_id = f"sec_{first_part}"
-        
-        # Ensure uniqueness by adding a number if needed
-        original_cmd_id = cmd_id
-        counter = 1
-        while cmd_id in COMMAND_LIBRARY:
-            cmd_id = f"{original_cmd_id}_{counter}"
-            counter += 1
             
-        _add_command(cmd_id, command_parts)
+            # Ensure uniqueness by adding a number if needed
+            original_cmd_id = cmd_id
+            counter = 1
+            while registry.registered(cmd_id):
+                cmd_id = f"{original_cmd_id}_{counter}"
+                counter += 1
+                
+            registry.register(cmd_id, command=command_parts, description=SECURITY_COMMANDS[cmd], **_policy(cmd_id))
+
+    # Add aliases to the command library
+    for alias, cmd in ALIASES.items():
+        registry.register(alias, command=cmd, **_policy(alias))
 
 # Add some common command aliases
 ALIASES = {
@@ -348,10 +580,57 @@ ALIASES = {
     "memory_info": "wmic memorychip get Capacity,Speed"
 }
 
-# Add aliases to the command library
-for alias, cmd in ALIASES.items():
-    if alias not in COMMAND_LIBRARY:  # Ne írjuk felül a belső parancsokat
-        _add_command(alias, cmd)
+COMMAND_LIBRARY.add_provider(_register_builtin_commands)
+
+def measure_import_time(runs=5):
+    """
+    Import this module in `runs` fresh interpreters (json and logging already loaded).
+
+    Returns:
+        (median import time in ms, list of modules that should have stayed unloaded but did not)
+    """
+    import compileall
+    import statistics
+    import subprocess
+    import sys
+    
+    # Meleg indítás mérése: a bájtkód már le van fordítva, ahogy telepített csomagnál
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), quiet=1)
+    # A logging és a json minden Project-S folyamatban már be van töltve: a keret a saját költséget méri
+    probe = ("import sys, time, json, logging; t = time.perf_counter(); import core.command_library; "
+             "print((time.perf_counter() - t) * 1000); "
+             "print(','.join(m for m in ('psutil', 'asyncio', 'core.execution_engine') if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    eager = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.splitlines()
+        timings.append(float(output[0]))
+        eager.update(m for m in (output[1] if len(output) > 1 else "").split(",") if m)
+    return statistics.median(timings), sorted(eager)
+
+def main():
+    """Startup benchmark: importing the library must fit into IMPORT_BUDGET_MS"""
+    import time
+    
+    import_ms, eager = measure_import_time()
+    print(f"Import: {import_ms:.1f} ms (keret: {IMPORT_BUDGET_MS} ms)")
+    
+    start = time.perf_counter()
+    count = len(COMMAND_LIBRARY)
+    print(f"Első hozzáférés ({count} parancs deklarálva): {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    COMMAND_LIBRARY["echo"]("x")
+    print(f"Első hívás (echo): {(time.perf_counter() - start) * 1000:.2f} ms, {COMMAND_LIBRARY.stats}")
+    
+    assert not eager, f"Modules imported eagerly: {', '.join(eager)}"
+    assert import_ms <= IMPORT_BUDGET_MS, f"Import took {import_ms:.1f} ms, budget is {IMPORT_BUDGET_MS} ms"
+    return import_ms
+
+# Export the library and its dispatch metadata for use in other modules
+__all__ = ['COMMAND_LIBRARY', 'COMMAND_KINDS', 'RESULT_CACHE', 'LIBRARY_FLIGHTS', 'get_command_kind',
+           'KIND_TRIVIAL', 'KIND_IO', 'KIND_CPU']
 
-# Export just the COMMAND_LIBRARY for use in other modules
-__all__ = ['COMMAND_LIBRARY']
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
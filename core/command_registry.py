@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Command Registry Module
+
+Lazy registry behind COMMAND_LIBRARY. Commands are declared as metadata
+(name, target, execution kind, description) and nothing is imported or
+built until it is needed:
+
+    - the built-in command tables are turned into entries on first access
+    - a target given as "package.module:function" is imported on first call
+    - a command template entry ("netstat -ano", see core.argv_pipeline) gets
+      its runner on first call
+
+Third-party command packs register through the "project_s.commands" entry
+point group. The entry point names a function that receives the registry:
+
+    # pyproject.toml of the pack
+    [project.entry-points."project_s.commands"]
+    netpack = "netpack.commands:register"
+
+    # netpack/commands.py
+    def register(registry):
+        registry.register("traceroute_fast", "netpack.trace:run", kind="io",
+                          description="Parallel traceroute")
+        registry.register("logstats", "netpack.logs:stats", kind="cpu",
+                          description="Pure-Python log analysis, runs on the process pool")
+
+A command can declare how long its result may be reused (cache_ttl, see
+core.result_cache); the registry then answers repeated calls with the same
+arguments from its ResultCache. Commands are not cached by default.
+Identical calls of a command declared with coalesce=True (read-only
+commands) that run at the same time share one execution (core.single_flight);
+commands are not coalesced by default, since two calls of a command with
+side effects must both run. Caching and coalescing apply the same way to
+sync and awaited calls.
+
+Every command can also be awaited (COMMAND_LIBRARY.acall / async_function):
+shell command entries run through the registry's async shell runner (an
+asyncio subprocess, killed on timeout or cancellation), commands declared
+with an async_target run as native coroutines, and plain callables run on
+a thread. A command given only as an async_target still works for sync
+callers, in its own event loop.
+
+    await COMMAND_LIBRARY.acall("sysinfo", "", timeout=10)
+
+Packs are loaded the first time a name is not found among the built-in
+commands (or the whole library is listed), and cannot replace built-in
+commands unless they pass replace=True.
+
+The registry is a read-only Mapping, so COMMAND_LIBRARY[name](args) and
+`name in COMMAND_LIBRARY` work as with the former plain dict.
+"""
+
+import importlib
+import logging
+import threading
+from collections.abc import Mapping
+
+from core.result_cache import CACHE_NEVER, MISSING
+
+logger = logging.getLogger("Command_Registry")
+
+# Végrehajtási típusok: hol futtassa a szerver az adott parancsot
+KIND_TRIVIAL = "trivial"  # azonnal visszatér, futhat az eseményhurkon
+KIND_IO = "io"            # blokkoló I/O vagy alfolyamat -> szálkészlet
+KIND_CPU = "cpu"          # számításigényes -> folyamatkészlet
+
+ENTRY_POINT_GROUP = "project_s.commands"
+
+
+class CommandSpec:
+    """
+    Declaration of one library command.
+
+    Args:
+        name: Command id
+        target: Callable(args) or "module:function" path, resolved on first use
+        kind: Execution kind (KIND_TRIVIAL, KIND_IO or KIND_CPU)
+        description: Short help text
+        command: Command template run by the registry's shell runner (instead of a target)
+        cache_ttl: Seconds a result may be reused for the same arguments (CACHE_NEVER / CACHE_FOREVER)
+        coalesce: Concurrent identical calls share one execution (only for read-only commands)
+        async_target: Coroutine function(args) or "module:function" path of a native async implementation
+    """
+
+    __slots__ = ("name", "target", "kind", "description", "command", "cache_ttl", "coalesce", "async_target",
+                 "_func", "_async_func")
+
+    def __init__(self, name, target=None, kind=KIND_IO, description="", command=None, cache_ttl=CACHE_NEVER,
+                 coalesce=False, async_target=None):
+        if target is None and command is None and async_target is None:
+            raise ValueError(f"Command '{name}' needs a target or a shell command")
+        self.name = name
+        self.target = target
+        self.kind = kind
+        self.description = description
+        self.command = command
+        self.cache_ttl = cache_ttl
+        self.coalesce = coalesce
+        self.async_target = async_target
+        self._func = None
+        self._async_func = None
+
+    @property
+    def resolved(self):
+        return self._func is not None
+
+    def resolve(self, shell_runner, cache=None, flights=None):
+        """The callable of the command (imported / built on the first call)"""
+        if self._func is None:
+            if self.command is not None:
+                command = self.command
+
+                def run_shell_command(args=""):
+                    return shell_runner(command, args)
+
+                func = run_shell_command
+            elif self.target is None:
+                # Csak aszinkron megvalósítás: szinkron hívónak saját eseményhurokban fut
+                async_func = _import_target(self.async_target)
+
+                def run_async_command(args=""):
+                    import asyncio
+                    return asyncio.run(async_func(args))
+
+                func = run_async_command
+            else:
+                func = _import_target(self.target)
+            if flights is not None and self.coalesce and self.kind != KIND_TRIVIAL:
+                func = _coalesced_command(self.name, func, flights)
+            if cache is not None and self.cache_ttl:
+                func = _cached_command(self.name, func, cache, self.cache_ttl)
+            self._func = func
+        return self._func
+
+    def resolve_async(self, shell_runner, async_shell_runner=None, cache=None, flights=None, async_flights=None):
+        """The coroutine function of the command (built on the first call)"""
+        if self._async_func is None:
+            if self.command is not None and async_shell_runner is not None:
+                command = self.command
+
+                async def run_shell_command(args=""):
+                    return await async_shell_runner(command, args)
+
+                func = run_shell_command
+            elif self.async_target is not None:
+                func = _import_target(self.async_target)
+            else:
+                # Nincs natív változat: a szinkron hívás (gyorsítótárral együtt) szálon fut
+                sync_func = self.resolve(shell_runner, cache, flights)
+                trivial = self.kind == KIND_TRIVIAL
+
+                async def run_sync_command(args=""):
+                    if trivial:
+                        return sync_func(args)
+                    import asyncio
+                    return await asyncio.get_running_loop().run_in_executor(None, sync_func, args)
+
+                self._async_func = run_sync_command
+                return self._async_func
+            if async_flights is not None and self.coalesce and self.kind != KIND_TRIVIAL:
+                func = _coalesced_async_command(self.name, func, async_flights)
+            if cache is not None and self.cache_ttl:
+                func = _cached_async_command(self.name, func, cache, self.cache_ttl)
+            self._async_func = func
+        return self._async_func
+
+
+def _import_target(target):
+    """A callable, or the object named by a "module:function" path"""
+    if callable(target):
+        return target
+    module_name, _, attribute = target.partition(":")
+    func = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        func = getattr(func, part)
+    return func
+
+
+def _coalesced_command(name, func, flights):
+    """Wrap a command so that concurrent calls with the same arguments share one execution"""
+
+    def coalesced_command(args=""):
+        return flights.do((name, (args or "").strip()), func, args)
+
+    coalesced_command.__wrapped__ = func
+    return coalesced_command
+
+
+def _coalesced_async_command(name, func, flights):
+    """Async counterpart of _coalesced_command (an AsyncSingleFlight, per event loop)"""
+
+    async def coalesced_command(args=""):
+        import asyncio
+        # A közös task csak a saját eseményhurkán várható
+        key = (name, (args or "").strip(), id(asyncio.get_running_loop()))
+        return await flights.do(key, lambda: func(args))
+
+    coalesced_command.__wrapped__ = func
+    return coalesced_command
+
+
+def _cached_command(name, func, cache, ttl):
+    """Wrap a command so that its successful results are reused for `ttl` seconds"""
+    from core.protocol import is_error_response
+
+    def cached_command(args=""):
+        key = (name, (args or "").strip())
+        result = cache.get(key)
+        if result is MISSING:
+            result = func(args)
+            # Hibaüzenetet nem tárolunk: a következő hívás újra próbálkozik
+            if not is_error_response(result):
+                cache.put(key, result, ttl)
+        return result
+
+    cached_command.__wrapped__ = func
+    return cached_command
+
+
+def _cached_async_command(name, func, cache, ttl):
+    """Async counterpart of _cached_command (same cache, same keys)"""
+    from core.protocol import is_error_response
+
+    async def cached_command(args=""):
+        key = (name, (args or "").strip())
+        result = cache.get(key)
+        if result is MISSING:
+            result = await func(args)
+            if not is_error_response(result):
+                cache.put(key, result, ttl)
+        return result
+
+    cached_command.__wrapped__ = func
+    return cached_command
+
+
+def _entry_points(group):
+    from importlib.metadata import entry_points
+    found = entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=group))
+    return list(found.get(group, []))  # Python 3.8/3.9
+
+
+class CommandRegistry(Mapping):
+    """
+    Read-only mapping of command id -> callable(args), filled lazily.
+
+    Args:
+        shell_runner: Callable(command, args) used by command template entries
+        entry_point_group: Entry point group of third-party command packs (None = no packs)
+        cache: ResultCache for commands that declare a cache_ttl (None = no result caching)
+        flights: SingleFlight coalescing concurrent identical calls (None = no coalescing)
+        async_shell_runner: Coroutine function(command, args) used by shell command entries when awaited
+            (None = they run on a thread)
+        async_flights: AsyncSingleFlight coalescing concurrent identical awaited calls of natively
+            async commands (None = no coalescing)
+    """
+
+    def __init__(self, shell_runner, entry_point_group=ENTRY_POINT_GROUP, cache=None, flights=None,
+                 async_shell_runner=None, async_flights=None):
+        self.shell_runner = shell_runner
+        self.async_shell_runner = async_shell_runner
+        self.cache = cache
+        self.flights = flights
+        self.async_flights = async_flights
+        self.entry_point_group = entry_point_group
+        self._specs = {}
+        self._providers = []
+        self._loaded = False
+        self._packs_loaded = entry_point_group is None
+        self._lock = threading.RLock()
+        self.packs = []
+
+    def add_provider(self, provider):
+        """Add a function(registry) that registers commands; it runs on first access"""
+        with self._lock:
+            if self._loaded:
+                provider(self)
+            else:
+                self._providers.append(provider)
+
+    def register(self, name, target=None, kind=KIND_IO, description="", command=None, replace=False,
+                 cache_ttl=CACHE_NEVER, coalesce=False, async_target=None):
+        """
+        Declare a command.
+
+        Returns:
+            True if it was added, False if the name was already taken (and replace is False)
+        """
+        with self._lock:
+            if name in self._specs and not replace:
+                return False
+            self._specs[name] = CommandSpec(name, target, kind, description, command, cache_ttl, coalesce,
+                                            async_target)
+            return True
+
+    def registered(self, name):
+        """True if the name is declared so far (no loading triggered; for use in providers)"""
+        return name in self._specs
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            # Előbb jelöljük betöltöttnek: a szolgáltatók maguk is hívhatják a regisztert
+            self._loaded = True
+            for provider in self._providers:
+                provider(self)
+            self._providers = []
+
+    def load_packs(self):
+        """Load the command packs registered under the entry point group (once)"""
+        if self._packs_loaded:
+            return
+        self._load()
+        with self._lock:
+            if self._packs_loaded:
+                return
+            self._packs_loaded = True
+            try:
+                entry_points = _entry_points(self.entry_point_group)
+            except Exception as e:
+                logger.warning(f"Cannot list command packs: {e}")
+                return
+            for entry_point in entry_points:
+                try:
+                    entry_point.load()(self)
+                    self.packs.append(entry_point.name)
+                    logger.info(f"Loaded command pack: {entry_point.name}")
+                except Exception as e:
+                    logger.error(f"Cannot load command pack {entry_point.name}: {e}")
+
+    def spec(self, name):
+        """CommandSpec of a command, or None"""
+        self._load()
+        spec = self._specs.get(name)
+        if spec is None and not self._packs_loaded:
+            self.load_packs()
+            spec = self._specs.get(name)
+        return spec
+
+    def kind(self, name):
+        spec = self.spec(name)
+        return spec.kind if spec is not None else KIND_IO
+
+    def __getitem__(self, name):
+        spec = self.spec(name)
+        if spec is None:
+            raise KeyError(name)
+        return spec.resolve(self.shell_runner, self.cache, self.flights)
+
+    def async_function(self, name):
+        """Coroutine function(args) of a command (KeyError if unknown)"""
+        spec = self.spec(name)
+        if spec is None:
+            raise KeyError(name)
+        return spec.resolve_async(self.shell_runner, self.async_shell_runner, self.cache, self.flights,
+                                  self.async_flights)
+
+    async def acall(self, name, args="", timeout=None):
+        """
+        Await a command.
+
+        Args:
+            name: Command id
+            args: Argument string
+            timeout: Seconds to wait (None = no limit); on timeout asyncio.TimeoutError is raised and
+                a running subprocess is killed
+
+        Cancelling the awaiting task cancels the command as well (a subprocess is killed; a
+        command running on a thread finishes in the background).
+        """
+        func = self.async_function(name)
+        if timeout is None:
+            return await func(args)
+        import asyncio
+        return await asyncio.wait_for(func(args), timeout)
+
+    def native_async(self, name):
+        """True if the command can be awaited without occupying a thread"""
+        spec = self.spec(name)
+        return spec is not None and (spec.async_target is not None
+                                     or (spec.command is not None and self.async_shell_runner is not None))
+
+    def __contains__(self, name):
+        return self.spec(name) is not None
+
+    def __iter__(self):
+        self.load_packs()
+        return iter(list(self._specs))
+
+    def __len__(self):
+        self.load_packs()
+        return len(self._specs)
+
+    @property
+    def stats(self):
+        stats = {"declared": len(self._specs), "resolved": sum(1 for s in self._specs.values() if s.resolved),
+                 "packs": len(self.packs)}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats
+        if self.flights is not None:
+            stats["coalescing"] = self.flights.stats
+        if self.async_flights is not None:
+            stats["async_coalescing"] = self.async_flights.stats
+        return stats
+
+
+class KindView(Mapping):
+    """Command id -> execution kind, read through a CommandRegistry"""
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getitem__(self, name):
+        spec = self._registry.spec(name)
+        if spec is None:
+            raise KeyError(name)
+        return spec.kind
+
+    def __iter__(self):
+        return iter(self._registry)
+
+    def __len__(self):
+        return len(self._registry)
@@ -1,6 +1,6 @@
 import asyncio
+import hashlib
 import websockets
-import subprocess
 import platform
 import os
 import json
@@ -8,19 +8,47 @@ import logging
 from datetime import datetime
 from io import StringIO
 import sys
-from core.command_library import COMMAND_LIBRARY  # Importáljuk a parancskönyvtárat
+import tempfile
+import time
+from contextvars import ContextVar
+from core.command_library import COMMAND_LIBRARY, RESULT_CACHE, LIBRARY_FLIGHTS, LIBRARY_ASYNC_FLIGHTS  # Importáljuk a parancskönyvtárat
+from core.execution_engine import ExecutionEngine, DEFAULT_MAX_CONCURRENCY, DEFAULT_TIMEOUT
+from core.library_executor import LibraryExecutor, DEFAULT_THREAD_WORKERS, DEFAULT_PROCESS_WORKERS
+from core.interpreter_pool import InterpreterPool, DEFAULT_POOL_SIZE
+from core.shell_pool import ShellPool, SESSION_COMMANDS, DEFAULT_POOL_SIZE as DEFAULT_SHELL_POOL_SIZE
+from core.history_store import HistoryStore, DEFAULT_HISTORY_PATH
+from core.admission import AdmissionController, AdmissionRejected, message_type
+from core.metrics import ServerMetrics, start_metrics_server
+from core.supervisor import Supervisor, reuse_port_supported, write_metrics_dump, read_aggregate_metrics
+from core.file_transfer import (FileRange, TransferError, DEFAULT_TEXT_READ_LENGTH, DEFAULT_CHUNK_SIZE,
+                                 OP_WRITE, parse_range_options, file_digest, upload_status, write_chunk,
+                                 finish_upload)
+from core.dir_listing import (list_page, walk_parallel, batched, parse_list_options, options_suffix,
+                               format_entry, DEFAULT_PAGE_SIZE)
+from core.response_cache import ResponseCache, DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES
+from core.retry_policy import RetryPolicies, run_with_retry
+from core.batch_runner import (BatchError, load_batch_document, batch_items, batch_parallelism, run_batch,
+                               MAX_PARALLELISM as MAX_BATCH_PARALLELISM)
+from core.workflow_engine import Workflow, WorkflowEngine, WorkflowError, StepCache
+from core.logging_setup import setup_logging
+from core.single_flight import AsyncSingleFlight, normalize_command, has_side_effects
+from core.system_sampler import get_sampler, DEFAULT_INTERVAL as DEFAULT_SAMPLE_INTERVAL
+from core.protocol import (ProtocolError, parse_envelope, envelope_to_legacy, make_reply,
+                           is_error_response, pack_binary_frame, parse_binary_frame, REPLY_RESULT, REPLY_ERROR,
+                           REPLY_OUTPUT, REPLY_EXIT, REPLY_BUSY, REPLY_DATA)
 
-# Configure logging with UTF-8 encoding
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("command_server.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Nem blokkoló naplózás (háttérszál írja a fájlt és a konzolt, lásd core.logging_setup)
+setup_logging("command_server.log")
 
 logger = logging.getLogger("Command_Server")
+# Üzenetenkénti (nagy gyakoriságú) sorok: PROJECT_S_LOG_SAMPLE="Command_Server.Traffic=N"
+traffic_logger = logging.getLogger("Command_Server.Traffic")
+
+# A szerver bejegyzéseinek forrása a közös előzménytárban (a REPLAY: sorszámai csak ezeket számolják)
+HISTORY_SOURCE = "server"
+
+# Az aktuális kérést küldő kliens azonosítója (shell munkamenet affinitáshoz)
+current_client = ContextVar("current_client", default=None)
 
 class CommandServer:
     """
@@ -28,36 +56,175 @@ class CommandServer:
     Handles different command types and returns responses.
     """
     
-    # Static variables for command history
-    _command_history = []  # Store command history for replay
-    _max_history_size = 10  # Maximum history size
-    
-    def __init__(self, host="localhost", port=8765):
+    def __init__(self, host="localhost", port=8765, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 command_timeout=DEFAULT_TIMEOUT, code_pool_size=DEFAULT_POOL_SIZE,
+                 code_pool_preload=(), shell_pool_size=DEFAULT_SHELL_POOL_SIZE, shell_affinity=False,
+                 library_threads=DEFAULT_THREAD_WORKERS, library_processes=DEFAULT_PROCESS_WORKERS,
+                 history_path=DEFAULT_HISTORY_PATH, admission=None, metrics_port=None,
+                 metrics_host="127.0.0.1", reuse_port=False, metrics_state_dir=None,
+                 cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, cache_ttls=None, retry_policies=None, coalesce=True,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL):
         self.host = host
         self.port = port
+        # SO_REUSEPORT: több munkásfolyamat osztozik ugyanazon a porton (lásd core.supervisor)
+        self.reuse_port = reuse_port
+        self.metrics_state_dir = metrics_state_dir
         self.code_filename = "generated_code.py"
-        self.last_command = None  # Store last command for retry
-        self.retry_in_progress = False  # Flag to prevent infinite retries
+        self.command_timeout = command_timeout
+        # Aszinkron végrehajtó: a lassú parancsok nem blokkolják az eseményhurkot.
+        # A max_concurrency korlátja közös: a BATCH:/WORKFLOW: alfolyamatok, a könyvtári
+        # parancsok aszinkron alfolyamatai, a shell munkamenetek és a CODE: workerek futásai
+        # is ennek a helyeit foglalják
+        self.engine = ExecutionEngine(max_concurrency=max_concurrency, default_timeout=command_timeout)
+        self.batch_engine = self.engine
+        # Parancskönyvtár: a blokkoló hívások szál- vagy folyamatkészleten futnak
+        self.library = LibraryExecutor(thread_workers=library_threads, process_workers=library_processes,
+                                       engine=self.engine)
+        # CODE: kérések meleg interpreter-készlete (0 = kikapcsolva, külön folyamat kérésenként)
+        self.code_pool = None
+        if code_pool_size:
+            self.code_pool = InterpreterPool(size=code_pool_size, preload=code_pool_preload,
+                                             default_timeout=command_timeout, engine=self.engine)
+        # CMD: kérések tartós shell munkamenetei (0 = kikapcsolva, új shell parancsonként)
+        self.shell_pool = None
+        if shell_pool_size:
+            env = os.environ.copy()
+            env["PYTHONIOENCODING"] = "utf-8"
+            self.shell_pool = ShellPool(size=shell_pool_size, default_timeout=command_timeout,
+                                        affinity=shell_affinity, env=env, engine=self.engine)
+        # Munkafolyamat-lépések eredményei (a "cache" élettartamú lépésekhez, futások között)
+        self.workflow_cache = StepCache()
+        # Kérésenkénti újrapróbálási szabályok parancsosztályonként
+        self.retry_policies = RetryPolicies(retry_policies)
+        # Beengedés-szabályozás (AdmissionController), túlterhelés elleni védelem
+        self.admission = admission or AdmissionController()
+        # Számlálók és késleltetés-hisztogramok (INFO:metrics és Prometheus végpont)
+        self.metrics = ServerMetrics()
+        self.metrics.registry.gauge("command_server_pending_requests",
+                                    "Admitted requests that are queued or running",
+                                    lambda: self.admission.pending)
+        self.metrics.registry.gauge("command_server_active_subprocesses",
+                                    "Subprocesses and pooled sessions currently holding an execution engine slot",
+                                    lambda: self.engine.active)
+        # Könyvtári parancsok eredmény-gyorsítótára (a szerverfolyamatban futó parancsoké)
+        for stat in ("entries", "hits", "misses", "evictions", "expirations"):
+            self.metrics.registry.gauge(f"command_library_cache_{stat}",
+                                        f"Library result cache: {stat}",
+                                        lambda stat=stat: RESULT_CACHE.stats[stat])
+        # Egyidejű azonos CMD kérések összevonása (False = minden kérés külön fut)
+        self.coalesce = coalesce
+        self.flights = AsyncSingleFlight()
+        # Háttér-mintavevő a sysinfo/processes/network/diskspace parancsokhoz (0 = indításkor nem indul)
+        self.sample_interval = sample_interval
+        self.metrics.registry.gauge("command_server_coalesced_requests",
+                                    "CMD requests answered by an identical request already running",
+                                    lambda: self.flights.coalesced)
+        self.metrics.registry.gauge("command_library_coalesced_calls",
+                                    "Library calls answered by an identical call already running",
+                                    lambda: LIBRARY_FLIGHTS.coalesced + LIBRARY_ASYNC_FLIGHTS.coalesced)
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        # Tartós parancstörténet (REPLAY:, keresés, újraindítás után is megmarad)
+        self.history = HistoryStore(history_path)
+        # Idempotens kérések válasz-gyorsítótára (0 = kikapcsolva)
+        self.cache = None
+        if cache_max_bytes:
+            self.cache = ResponseCache(ttls=cache_ttls, max_bytes=cache_max_bytes)
+            self.metrics.registry.gauge("command_server_cache_entries", "Responses in the response cache",
+                                        lambda: len(self.cache))
+            self.metrics.registry.gauge("command_server_cache_bytes",
+                                        "Approximate memory used by the response cache",
+                                        lambda: self.cache.bytes)
 
-    @classmethod
-    def add_to_history(cls, command):
-        """Add command to history if not already present"""
+    def add_to_history(self, command, response=None):
+        """
+        Add a command (and its response) to the persistent history store.
+        
+        File contents are not stored: the payload of FILE:write/append and the
+        text returned by FILE:read are replaced by their size (a REPLAY of such
+        an entry is rejected as malformed instead of writing a placeholder)
+        """
         if not command.startswith("REPLAY:"):
-            if command not in cls._command_history:
-                cls._command_history.insert(0, command)
-                if len(cls._command_history) > cls._max_history_size:
-                    cls._command_history.pop()
-            logger.info(f"Command added to history: {command[:50]}...")
+            success = not is_error_response(response)
+            command, response = self._history_record(command, response)
+            self.history.add(command, response, success=success, source=HISTORY_SOURCE)
+            traffic_logger.info(f"Command added to history: {command[:50]}...")
 
-    @classmethod
-    def get_from_history(cls, index):
-        """Get command from history by index"""
-        if 0 <= index < len(cls._command_history):
-            return cls._command_history[index]
-        return None
+    @staticmethod
+    def _history_record(command, response):
+        """The (command, response) pair to store for a message, without file contents"""
+        if command.startswith(("FILE:write ", "FILE:append ")) and "||" in command:
+            head, content = command.split("||", 1)
+            command = f"{head.rstrip()} ({len(content.strip())} bytes of content not stored)"
+        elif command.startswith("FILE:read ") and response and response.startswith("File content of "):
+            header, _, content = response.partition("\n\n")
+            response = f"{header} ({len(content)} characters not stored)"
+        return command, response
     
-    async def handle_cmd(self, cmd):
-        """Execute a shell command and return the output"""
+    async def get_from_history(self, index):
+        """Get command from history by index (0 = most recent)"""
+        # Szálon olvasunk: a sorban álló írások bevárása és az SQLite lekérdezés sem blokkolja a hurkot
+        entry = await asyncio.to_thread(self.history.nth_recent, index + 1, HISTORY_SOURCE)
+        return entry["command"] if entry else None
+    
+    async def handle_cmd(self, cmd, engine=None):
+        """
+        Execute a shell command and return the output.
+        
+        Huge output is cut to its head and tail (see core.output_capture); the
+        marker in the text names the id to fetch the full output with
+        "CMD: output <id> offset=N".
+        
+        Identical commands arriving while one is already running wait for it
+        and share its result (see core.single_flight), unless they have side
+        effects.
+        
+        Args:
+            cmd: Command text (library command, JSON library call or shell command)
+            engine: Run shell commands on this ExecutionEngine instead of the shell pool
+        """
+        key = self._coalescing_key(cmd)
+        if key is None:
+            return await self._execute_cmd(cmd, engine)
+        return await self.flights.do(key, lambda: self._execute_cmd(cmd, engine))
+    
+    def _coalescing_key(self, cmd):
+        """Single-flight key of a CMD, or None if every request must run on its own"""
+        if not self.coalesce:
+            return None
+        return self._shared_execution_key(cmd)
+    
+    def _shared_execution_key(self, cmd):
+        """Key under which identical CMDs may share one execution, or None if they have side effects"""
+        stripped = cmd.strip()
+        if stripped.startswith("{") and stripped.endswith("}"):
+            try:
+                call = json.loads(stripped)
+                name = call["parancs"].lower().strip()
+                args = call.get("paraméterek", "").strip()
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return None
+            spec = COMMAND_LIBRARY.spec(name)
+            return ("library", name, args) if spec is not None and spec.coalesce else None
+        if stripped.lower() == "diagnose network":
+            return ("diagnose network",)
+        parts = stripped.split(None, 1)
+        if not parts:
+            return None
+        base_cmd = parts[0].lower()
+        if self._use_library(base_cmd):
+            spec = COMMAND_LIBRARY.spec(base_cmd)
+            return ("library", base_cmd, parts[1].strip() if len(parts) > 1 else "") if spec.coalesce else None
+        if has_side_effects(stripped):
+            return None
+        key = ("shell",) + normalize_command(stripped)
+        if self.shell_pool is not None and self.shell_pool.affinity:
+            # Kliensenkénti munkamenet: a munkakönyvtár kliensenként eltérhet
+            key += (current_client.get(),)
+        return key
+    
+    async def _execute_cmd(self, cmd, engine=None):
+        """Execute one CMD (see handle_cmd)"""
         logger.info(f"Executing CMD: {cmd}")
         try:
             # Ellenőrizzük, hogy JSON formátumú parancs-e
@@ -73,8 +240,7 @@ class CommandServer:
                         # Ellenőrizzük, hogy a parancs megtalálható-e a parancskönyvtárban
                         if command_name in COMMAND_LIBRARY:
                             try:
-                                result = COMMAND_LIBRARY[command_name](command_args)
-                                self.add_to_history(f"CMD: {command_name} {command_args}")
+                                result = await self.library.call(command_name, command_args)
                                 return result
                             except Exception as e:
                                 return f"Hiba a parancskönyvtári parancs végrehajtásakor: {str(e)}"
@@ -104,7 +270,6 @@ class CommandServer:
                     results = diagnose_network(targets)
                     
                     # Biztosítsuk, hogy a logs könyvtár létezik
-                    import os
                     if not os.path.exists("logs"):
                         os.makedirs("logs")
                         
@@ -137,11 +302,10 @@ class CommandServer:
             base_cmd = cmd_parts[0].lower() if cmd_parts else ""
             args = cmd_parts[1] if len(cmd_parts) > 1 else ""
             
-            if base_cmd in COMMAND_LIBRARY:
+            if self._use_library(base_cmd):
                 try:
                     logger.info(f"Parancskönyvtári parancs végrehajtása: {base_cmd}")
-                    result = COMMAND_LIBRARY[base_cmd](args)
-                    self.add_to_history(f"CMD: {cmd}")
+                    result = await self.library.call(base_cmd, args)
                     return result
                 except Exception as e:
                     logger.error(f"Hiba a parancskönyvtári parancs végrehajtásakor: {e}")
@@ -152,107 +316,94 @@ class CommandServer:
             env = os.environ.copy()
             env["PYTHONIOENCODING"] = "utf-8"
             
-            result = subprocess.run(
-                cmd, 
-                shell=True, 
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                env=env,
-                timeout=60
-            )
+            async def run_once():
+                if engine is not None:
+                    return await engine.run_shell(cmd, env=env)
+                if self.shell_pool is not None:
+                    # Hosszú életű shell munkamenet: nincs fork/exec parancsonként
+                    return await self.shell_pool.run(cmd, client_id=current_client.get())
+                return await self.engine.run_shell(cmd, env=env)
+            
+            # Kérésenkénti újrapróbálás (visszalépéssel), a parancs osztályának szabálya szerint
+            result = await run_with_retry(run_once, self.retry_policies.for_command(cmd), f"CMD: {cmd[:50]}",
+                                          self._count_retry)
+            if result.timed_out:
+                return f"Command timed out after {self.command_timeout} seconds"
             
             # Check for command failure
             if result.returncode != 0:
                 error_msg = result.stderr or result.stdout or "Command failed with no output"
                 logger.error(f"Command failed with return code {result.returncode}: {error_msg}")
-                
-                # Retry handling
-                if not self.retry_in_progress and self.last_command != cmd:
-                    logger.info("parancshiba - automatikus újrapróbálás következik")
-                    self.last_command = cmd
-                    self.retry_in_progress = True
-                    return "RETRY_NEEDED"  # Special flag for retry
-                else:
-                    # Reset retry flag and return error
-                    self.retry_in_progress = False
-                    return f"Error executing command: {error_msg}"
+                return f"Error executing command: {error_msg}"
             
-            # Reset retry state on success
-            self.retry_in_progress = False
             output = result.stdout or result.stderr
             
-            # Add successful command to history
-            if output:
-                self.add_to_history(f"CMD: {cmd}")
-                
             return output or "Command executed (no output)"
             
-        except subprocess.TimeoutExpired:
-            self.retry_in_progress = False
-            return "Command timed out after 60 seconds"
         except Exception as e:
-            self.retry_in_progress = False
             logger.error(f"Error executing command: {e}")
             return f"Error executing command: {e}"
     
+    @staticmethod
+    def _write_code_file(path, code):
+        """Write a CODE block to a Python file with UTF-8 stdio setup"""
+        with open(path, "w", encoding="utf-8-sig") as f:
+            f.write("#!/usr/bin/env python\n# -*- coding: utf-8 -*-\n")
+            f.write("import sys\n")
+            f.write("sys.stdout.reconfigure(encoding='utf-8')\n")
+            f.write("sys.stderr.reconfigure(encoding='utf-8')\n")
+            f.write(code)
+    
+    @staticmethod
+    def _code_env():
+        """Environment for CODE subprocesses with explicit UTF-8 encoding"""
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONLEGACYWINDOWSSTDIO"] = "utf-8"
+        return env
+    
     async def handle_code(self, code):
-        """Write code to file and execute it, returning the output"""
+        """Execute a CODE block (on the interpreter pool if enabled) and return the output"""
         logger.info("Executing CODE block")
         try:
-            # Save code to file with UTF-8 encoding and BOM
-            with open(self.code_filename, "w", encoding="utf-8-sig") as f:
-                f.write("#!/usr/bin/env python\n# -*- coding: utf-8 -*-\n")
-                f.write("import sys\n")
-                f.write("sys.stdout.reconfigure(encoding='utf-8')\n")
-                f.write("sys.stderr.reconfigure(encoding='utf-8')\n")
-                f.write(code)
-            
-            # Execute the code with explicit UTF-8 encoding
-            env = os.environ.copy()
-            env["PYTHONIOENCODING"] = "utf-8"
-            env["PYTHONLEGACYWINDOWSSTDIO"] = "utf-8"
+            async def run_once():
+                if self.code_pool is not None:
+                    # Meleg interpreter: nincs indítási költség és közös fájl
+                    return await self.code_pool.run(code)
+                # Save code to file with UTF-8 encoding and BOM
+                self._write_code_file(self.code_filename, code)
+                
+                # Execute the code with explicit UTF-8 encoding
+                env = self._code_env()
+                
+                return await self.engine.run_exec(["python", "-X", "utf8", self.code_filename], env=env)
             
-            result = subprocess.run(
-                ["python", "-X", "utf8", self.code_filename],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                env=env,
-                timeout=60
-            )
+            result = await run_with_retry(run_once, self.retry_policies.for_code(), "CODE block",
+                                          self._count_retry)
+            if result.timed_out:
+                return f"Code execution timed out after {self.command_timeout} seconds"
             
             # Check for code execution failure
             if result.returncode != 0:
-                error_msg = f"Error:\n{result.stderr}\n\nOutput:\n{result.stdout}"
                 logger.error(f"Code execution failed with return code {result.returncode}")
-                
-                # If not already retrying, store code and trigger retry
-                if not self.retry_in_progress and self.last_command != code:
-                    logger.info("parancshiba - automatikus újrapróbálás következik")
-                    self.last_command = code
-                    self.retry_in_progress = True
-                    return "RETRY_NEEDED"
-                else:
-                    # Reset retry flag and return error
-                    self.retry_in_progress = False
-                    return error_msg
+                return f"Error:\n{result.stderr}\n\nOutput:\n{result.stdout}"
             
-            # Reset retry state on success
-            self.retry_in_progress = False
             return result.stdout or "Code executed (no output)"
             
-        except subprocess.TimeoutExpired:
-            self.retry_in_progress = False
-            return "Code execution timed out after 60 seconds"
         except Exception as e:
-            self.retry_in_progress = False
             logger.error(f"Error executing code: {e}")
             return f"Error executing code: {e}"
     
-    async def handle_info(self):
-        """Return system information"""
+    async def handle_info(self, params=""):
+        """Return system information (or server metrics for INFO:metrics)"""
+        if params.strip().lower() == "metrics":
+            registry = self.metrics.registry
+            if self.metrics_state_dir:
+                # Többfolyamatos mód: az összes munkás összesített metrikái
+                write_metrics_dump(registry, self.metrics_state_dir)
+                registry = read_aggregate_metrics(self.metrics_state_dir)
+            return json.dumps(registry.snapshot(), indent=2, ensure_ascii=False)
+        
         logger.info("Retrieving system information")
         try:
             info = {
@@ -270,38 +421,164 @@ class CommandServer:
             logger.error(f"Error retrieving system info: {e}")
             return f"Error retrieving system info: {e}"
     
+    def _count_retry(self, policy, reason):
+        """on_retry callback of run_with_retry: count the retry in the metrics"""
+        self.metrics.observe_retry(policy.name, reason)
+    
+    def _invalidate_cache(self, path):
+        """Drop cached FILE responses that depend on a path that was just written"""
+        if self.cache is not None:
+            self.cache.invalidate_path(path)
+    
+    async def run_batch_document(self, params, on_item=None):
+        """
+        Run a BATCH: document ({"parancsok": [...]} inline or a .json path) concurrently.
+        
+        Every item goes through handle_cmd, so library commands, retries and
+        timeouts apply to it as to a single CMD: request. Shell commands run as
+        separate processes on the execution engine, not on the shell pool, so
+        independent items really run in parallel: up to the document's
+        parallelism (at most MAX_PARALLELISM), within the server-wide
+        max_concurrency limit they share with every other request.
+        
+        Returns:
+            Summary dict with per-item results and the aggregate status
+        """
+        if not params.startswith("{") and self._invalid_path(params):
+            raise BatchError("Security error: Invalid file path")
+        document = load_batch_document(params)
+        items = batch_items(document)
+        logger.info(f"Running batch of {len(items)} commands")
+        
+        async def execute(command):
+            # Alfolyamatként, a közös végrehajtó helyeiért versenyezve
+            return await self.handle_cmd(command, engine=self.batch_engine)
+        
+        return await run_batch(items, execute, batch_parallelism(document), on_item)
+    
+    async def handle_batch(self, params):
+        """Run a BATCH: document and return the summary as JSON"""
+        try:
+            summary = await self.run_batch_document(params)
+        except BatchError as e:
+            return f"Error: {e}"
+        return json.dumps(summary, indent=2, ensure_ascii=False)
+    
+    async def execute_workflow_step(self, command):
+        """
+        Run one workflow step and return (exit code, output).
+        
+        Shell commands run on the execution engine with the usual retry policy and
+        report their real exit code (124 on timeout, like timeout(1)); library
+        and JSON commands go through handle_cmd and report 0 or 1.
+        """
+        if not self._runs_as_subprocess(command):
+            output = await self.handle_cmd(command, engine=self.batch_engine)
+            return (1 if is_error_response(output) else 0), output
+        
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        
+        async def run_once():
+            return await self.batch_engine.run_shell(command, env=env)
+        
+        result = await run_with_retry(run_once, self.retry_policies.for_command(command),
+                                      f"workflow step: {command[:50]}", self._count_retry)
+        if result.timed_out:
+            return 124, f"Command timed out after {self.command_timeout} seconds"
+        output = result.stdout if result.returncode == 0 else (result.stderr or result.stdout)
+        return result.returncode, output
+    
+    async def run_workflow_document(self, params, on_step=None):
+        """
+        Run a WORKFLOW: document ({"parancsok": [...]} inline or a .json path) as a dependency graph.
+        
+        Steps start as soon as their dependencies have finished and their
+        condition holds (see core.workflow_engine), so a multi-step diagnosis
+        is a single request that takes about as long as its critical path.
+        
+        Returns:
+            Summary dict with per-step results and the critical path
+        """
+        if not params.startswith("{") and self._invalid_path(params):
+            raise WorkflowError("Security error: Invalid file path")
+        try:
+            document = load_batch_document(params)
+        except BatchError as e:
+            raise WorkflowError(str(e))
+        workflow = Workflow.from_document(document)
+        workflow.parallelism = min(workflow.parallelism, MAX_BATCH_PARALLELISM)
+        logger.info(f"Running workflow of {len(workflow.steps)} steps")
+        engine = WorkflowEngine(self.execute_workflow_step, self.workflow_cache,
+                                shareable=lambda command: self._shared_execution_key(command) is not None)
+        return await engine.run(workflow, on_step)
+    
+    async def handle_workflow(self, params):
+        """Run a WORKFLOW: document and return the summary as JSON"""
+        try:
+            summary = await self.run_workflow_document(params)
+        except WorkflowError as e:
+            return f"Error: {e}"
+        return json.dumps(summary, indent=2, ensure_ascii=False)
+    
+    @staticmethod
+    def _invalid_path(path):
+        """Security check - prevent directory traversal"""
+        return ".." in path or "~" in path
+    
     async def handle_file(self, params):
         """Handle file operations (read/write)"""
         logger.info(f"Processing FILE operation: {params[:50]}...")
         try:
             # Extract operation type (read or write)
             if params.startswith("read "):
-                # Read file operation
-                filepath = params[5:].strip()
+                # Read file operation (optional byte range: offset=N length=N)
+                filepath, options = parse_range_options(params[5:].strip())
                 logger.info(f"Reading file: {filepath}")
                 
                 # Security check - prevent directory traversal
-                if ".." in filepath or "~" in filepath:
+                if self._invalid_path(filepath):
                     return "Security error: Invalid file path"
                 
                 # Read file content
                 try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        content = f.read()
+                    offset = options.get("offset", 0)
+                    length = min(options.get("length", DEFAULT_TEXT_READ_LENGTH), DEFAULT_TEXT_READ_LENGTH)
+                    with FileRange(filepath, offset, length) as file_range:
+                        content = file_range.read().decode("utf-8", errors="replace")
                     
-                    # Truncate if too large
-                    if len(content) > 5000:
-                        content = content[:5000] + "\n...(truncated)..."
-                    
-                    return f"File content of {filepath}:\n\n{content}"
+                    result = f"File content of {filepath}:\n\n{content}"
+                    remaining = file_range.size - (offset + file_range.length)
+                    if remaining > 0:
+                        # Nincs csonkolás: a folytatás helyét megadjuk
+                        result += (f"\n...({remaining} more bytes, continue with "
+                                   f"FILE:read {filepath} offset={offset + file_range.length})...")
+                    return result
                 except FileNotFoundError:
                     return f"Error: File not found: {filepath}"
                 except Exception as e:
                     return f"Error reading file: {e}"
+            
+            elif params.startswith("stat "):
+                # Size of a file and of its unfinished chunked upload (for resuming)
+                filepath = params[5:].strip()
+                if self._invalid_path(filepath):
+                    return "Security error: Invalid file path"
+                return json.dumps(upload_status(filepath), ensure_ascii=False)
+            
+            elif params.startswith("checksum "):
+                filepath = params[9:].strip()
+                if self._invalid_path(filepath):
+                    return "Security error: Invalid file path"
+                if not os.path.isfile(filepath):
+                    return f"Error: File not found: {filepath}"
+                digest = await asyncio.to_thread(file_digest, filepath)
+                return f"sha256 {digest}  {filepath}"
                 
-            elif params.startswith("write "):
-                # Write file operation
-                params = params[6:]
+            elif params.startswith(("write ", "append ")):
+                # Write/append file operation
+                append = params.startswith("append ")
+                params = params[7:] if append else params[6:]
                 
                 # Split by || delimiter between path and content
                 if "||" in params:
@@ -310,27 +587,32 @@ class CommandServer:
                     content = content.strip()
                     
                     # Security check
-                    if ".." in filepath or "~" in filepath:
+                    if self._invalid_path(filepath):
                         return "Security error: Invalid file path"
                     
-                    logger.info(f"Writing to file: {filepath}")
+                    logger.info(f"{'Appending' if append else 'Writing'} to file: {filepath}")
                     # Create directory if it doesn't exist
                     os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
                     
                     # Write content to file
-                    with open(filepath, "w", encoding="utf-8") as f:
+                    with open(filepath, "a" if append else "w", encoding="utf-8") as f:
                         f.write(content)
+                    self._invalidate_cache(filepath)
                     
+                    if append:
+                        return f"Successfully appended {len(content)} bytes to {filepath}"
                     return f"Successfully wrote {len(content)} bytes to {filepath}"
                 else:
-                    return "Error: Invalid FILE:write format. Use 'FILE:write path/to/file || content'"
+                    operation = "append" if append else "write"
+                    return (f"Error: Invalid FILE:{operation} format. "
+                            f"Use 'FILE:{operation} path/to/file || content'")
                 
             elif params.startswith("list "):
-                # List directory contents
-                directory = params[5:].strip()
+                # List directory contents (options: depth=N glob=PATTERN limit=N page=TOKEN format=json)
+                directory, options = parse_list_options(params[5:].strip())
                 
                 # Security check
-                if ".." in directory or "~" in directory:
+                if self._invalid_path(directory):
                     return "Security error: Invalid directory path"
                 
                 if not os.path.exists(directory):
@@ -339,17 +621,22 @@ class CommandServer:
                 if not os.path.isdir(directory):
                     return f"Error: Not a directory: {directory}"
                 
-                # List directory contents
-                files = os.listdir(directory)
-                result = f"Contents of {directory}:\n"
+                # Egy oldalnyi bejegyzés, szálon olvasva (nagy könyvtár sem blokkolja a hurkot)
+                entries, next_page = await asyncio.to_thread(
+                    list_page, directory, options.get("limit", DEFAULT_PAGE_SIZE), options.get("page"),
+                    options.get("depth", 1), options.get("glob"))
                 
-                for f in files:
-                    full_path = os.path.join(directory, f)
-                    if os.path.isdir(full_path):
-                        f += "/"
-                    result += f"- {f}\n"
+                if options.get("format") == "json":
+                    return json.dumps({"directory": directory, "entries": entries, "next_page": next_page},
+                                      ensure_ascii=False)
                 
-                return result
+                lines = [f"Contents of {directory}:"]
+                lines.extend(f"- {format_entry(info)}" for info in entries)
+                if next_page:
+                    options["page"] = next_page
+                    lines.append(f"...(more entries, continue with FILE:list {directory}"
+                                 f"{options_suffix(options)})...")
+                return "\n".join(lines) + "\n"
             else:
                 return f"Unsupported FILE operation: {params}"
                 
@@ -357,103 +644,500 @@ class CommandServer:
             logger.error(f"Error in FILE operation: {e}")
             return f"Error in FILE operation: {e}"
     
+    async def process_message(self, message):
+        """Process one legacy text message, answering idempotent requests from the response cache"""
+        request_key = self.cache.request_key(message) if self.cache is not None else None
+        if request_key is not None:
+            response = self.cache.get(request_key)
+            self.metrics.observe_cache(request_key.msg_type, response is not None)
+            if response is not None:
+                self.add_to_history(message, response)
+                return response
+        
+        response = await self.execute_message(message)
+        if request_key is not None:
+            self.cache.put(request_key, response)
+        return response
+    
+    async def execute_message(self, message):
+        """Execute one legacy text message and return the response (retries happen per request)"""
+        response = "Unknown command format"
+        
+        # Process different command types
+        if message.startswith("CMD:"):
+            cmd = message[4:].strip()
+            response = await self.handle_cmd(cmd)
+            # Add finished command to history
+            self.add_to_history(message, response)
+            
+        elif message.startswith("CODE:"):
+            code = message[5:].strip()
+            response = await self.handle_code(code)
+            # Add finished command to history
+            self.add_to_history(message, response)
+            
+        elif message.startswith("INFO:"):
+            response = await self.handle_info(message[5:])
+            self.add_to_history(message, response)
+            
+        elif message.startswith("FILE:"):
+            params = message[5:].strip()
+            response = await self.handle_file(params)
+            # Add finished command to history
+            self.add_to_history(message, response)
+        
+        elif message.startswith("BATCH:"):
+            response = await self.handle_batch(message[6:].strip())
+            self.add_to_history(message, response)
+        
+        elif message.startswith("WORKFLOW:"):
+            response = await self.handle_workflow(message[9:].strip())
+            self.add_to_history(message, response)
+        
+        elif message.startswith("REPLAY:"):
+            try:
+                # Get command index from history (1-based)
+                index = int(message[7:].strip()) - 1
+                
+                # Get original command (None if the index is out of range)
+                original_command = await self.get_from_history(index) if index >= 0 else None
+                if original_command is not None:
+                    logger.info(f"Replaying command: {original_command}")
+                    
+                    # Execute original command based on its type
+                    if original_command.startswith("CMD:"):
+                        response = await self.handle_cmd(original_command[4:].strip())
+                    elif original_command.startswith("CODE:"):
+                        response = await self.handle_code(original_command[5:].strip())
+                    elif original_command.startswith("FILE:"):
+                        response = await self.handle_file(original_command[5:].strip())
+                    elif original_command.startswith("INFO:"):
+                        response = await self.handle_info(original_command[5:])
+                    elif original_command.startswith("BATCH:"):
+                        response = await self.handle_batch(original_command[6:].strip())
+                    elif original_command.startswith("WORKFLOW:"):
+                        response = await self.handle_workflow(original_command[9:].strip())
+                else:
+                    size = await asyncio.to_thread(self.history.count, HISTORY_SOURCE)
+                    response = f"Invalid REPLAY index: {index + 1}. History size: {size}"
+                    logger.error(response)
+            except ValueError:
+                response = f"Invalid REPLAY format. Expected number, got: {message[7:]}"
+                logger.error(response)
+            except Exception as e:
+                response = f"Error executing REPLAY: {str(e)}"
+                logger.error(response)
+
+        return response
+    
+    def _use_library(self, base_cmd):
+        """True if a CMD base command is answered from the command library"""
+        if self.shell_pool is not None and base_cmd in SESSION_COMMANDS:
+            # A munkamenet állapotát (cd, export) a shell munkamenet kezeli
+            return False
+        return base_cmd in COMMAND_LIBRARY
+    
+    def _runs_as_subprocess(self, cmd):
+        """True if a CMD is executed as a subprocess (not a JSON, library or diagnose command)"""
+        stripped = cmd.strip()
+        if stripped.startswith("{") and stripped.endswith("}"):
+            return False
+        if stripped.lower() == "diagnose network":
+            return False
+        parts = stripped.split(None, 1)
+        return bool(parts) and not self._use_library(parts[0].lower())
+    
+    def _request_path(self, message):
+        """Execution path label used in the metrics: library, subprocess or builtin"""
+        if message.startswith("CMD:"):
+            return "subprocess" if self._runs_as_subprocess(message[4:].strip()) else "library"
+        if message.startswith("CODE:"):
+            return "subprocess"
+        return "builtin"
+    
+    async def run_request(self, ticket, message):
+        """Run an admitted legacy-format message in its concurrency slot and record metrics"""
+        async with self.admission.slot(ticket):
+            started = time.monotonic()
+            response = await self.process_message(message)
+            duration = time.monotonic() - started
+        self.metrics.observe_request(ticket.msg_type, self._request_path(message), ticket.queue_wait,
+                                     duration, len(response.encode("utf-8")))
+        return response
+    
+    async def handle_stream(self, websocket, envelope):
+        """
+        Run a CMD/CODE/FILE/BATCH/WORKFLOW envelope in streaming mode.
+        
+        Output frames are sent while the process runs (read in bounded chunks,
+        so nothing is buffered), followed by a final exit frame. FILE read
+        requests are sent as binary frames (see stream_file), FILE list
+        requests as batches of entries (see stream_listing), BATCH and WORKFLOW
+        requests as one frame per finished item or step (see stream_batch,
+        stream_workflow).
+        
+        Returns:
+            Number of output bytes sent
+        """
+        request_id = envelope["id"]
+        msg_type = envelope["type"]
+        payload = envelope_to_legacy(envelope)[len(msg_type) + 1:].strip()
+        if msg_type == "BATCH":
+            return await self.stream_batch(websocket, request_id, payload)
+        if msg_type == "WORKFLOW":
+            return await self.stream_workflow(websocket, request_id, payload)
+        if msg_type == "FILE" and payload.startswith("list "):
+            return await self.stream_listing(websocket, request_id, payload)
+        if msg_type == "FILE":
+            return await self.stream_file(websocket, request_id, payload)
+        seq = 0
+        sent = 0
+        
+        async def send_output(stream_name, text):
+            nonlocal seq, sent
+            await websocket.send(make_reply(request_id, REPLY_OUTPUT, text, seq=seq, stream=stream_name))
+            seq += 1
+            sent += len(text.encode("utf-8"))
+        
+        if msg_type == "CMD" and not self._runs_as_subprocess(payload):
+            # Parancskönyvtári parancs: egyetlen kimeneti keret
+            response = await self.process_message(f"CMD:{payload}")
+            await send_output("stdout", response)
+            returncode, timed_out = 0, False
+        elif msg_type == "CMD":
+            logger.info(f"Streaming CMD: {payload}")
+            env = os.environ.copy()
+            env["PYTHONIOENCODING"] = "utf-8"
+            result = await self.engine.stream_shell(payload, send_output, env=env)
+            returncode, timed_out = result.returncode, result.timed_out
+            self.add_to_history(f"CMD: {payload}")
+        else:
+            logger.info("Streaming CODE block")
+            # Kérésenként saját fájl, így a párhuzamos kérések nem írják felül egymást
+            fd, path = tempfile.mkstemp(prefix="generated_code_", suffix=".py")
+            os.close(fd)
+            try:
+                self._write_code_file(path, payload)
+                result = await self.engine.stream_exec(["python", "-X", "utf8", path], send_output,
+                                                       env=self._code_env())
+            finally:
+                os.remove(path)
+            returncode, timed_out = result.returncode, result.timed_out
+            self.add_to_history(f"CODE: {payload}")
+        
+        await websocket.send(make_reply(request_id, REPLY_EXIT, returncode, seq=seq, timed_out=timed_out))
+        return sent
+    
+    async def stream_file(self, websocket, request_id, params):
+        """
+        Send a file range ("read <path> offset=N length=N") as binary frames.
+        
+        The range is read and sent chunk by chunk, so memory use does not
+        depend on the file size; a file truncated meanwhile ends the request
+        with an error. The exit frame carries the number of
+        bytes sent and their SHA-256.
+        
+        Returns:
+            Number of file bytes sent
+        """
+        if not params.startswith("read "):
+            raise ProtocolError("Only FILE read and list requests can be streamed", request_id)
+        filepath, options = parse_range_options(params[5:].strip())
+        if self._invalid_path(filepath):
+            raise ProtocolError("Security error: Invalid file path", request_id)
+        
+        logger.info(f"Streaming file: {filepath}")
+        seq = 0
+        sent = 0
+        digest = hashlib.sha256()
+        with FileRange(filepath, options.get("offset", 0), options.get("length")) as file_range:
+            for offset, chunk in file_range.chunks(DEFAULT_CHUNK_SIZE):
+                digest.update(chunk)
+                header = {"id": request_id, "type": REPLY_DATA, "seq": seq, "offset": offset}
+                await websocket.send(pack_binary_frame(header, chunk))
+                seq += 1
+                sent += len(chunk)
+        
+        await websocket.send(make_reply(request_id, REPLY_EXIT, 0, seq=seq, size=sent,
+                                        sha256=digest.hexdigest()))
+        self.add_to_history(f"FILE:{params}")
+        return sent
+    
+    async def stream_batch(self, websocket, request_id, params):
+        """
+        Run a BATCH: document, sending each item's result as soon as it finishes.
+        
+        The exit frame carries the aggregate summary (without the items) and is
+        0 if every item succeeded, 1 otherwise.
+        
+        Returns:
+            Number of payload bytes sent
+        """
+        seq = 0
+        sent = 0
+        
+        async def send_item(result):
+            nonlocal seq, sent
+            frame = make_reply(request_id, REPLY_OUTPUT, result, seq=seq, stream="item")
+            await websocket.send(frame)
+            seq += 1
+            sent += len(frame)
+        
+        try:
+            summary = await self.run_batch_document(params, send_item)
+        except BatchError as e:
+            raise ProtocolError(str(e), request_id)
+        summary.pop("items")
+        await websocket.send(make_reply(request_id, REPLY_EXIT, 0 if summary["status"] == "ok" else 1,
+                                        seq=seq, summary=summary))
+        self.add_to_history(f"BATCH:{params}", json.dumps(summary, ensure_ascii=False))
+        return sent
+    
+    async def stream_workflow(self, websocket, request_id, params):
+        """
+        Run a WORKFLOW: document, sending each step's result as soon as it finishes.
+        
+        The exit frame carries the summary without the step results and is 0
+        if no step failed, 1 otherwise.
+        
+        Returns:
+            Number of payload bytes sent
+        """
+        seq = 0
+        sent = 0
+        
+        async def send_step(step_id, result):
+            nonlocal seq, sent
+            payload = dict(result.to_dict(), id=step_id)
+            frame = make_reply(request_id, REPLY_OUTPUT, payload, seq=seq, stream="step")
+            await websocket.send(frame)
+            seq += 1
+            sent += len(frame)
+        
+        try:
+            summary = await self.run_workflow_document(params, send_step)
+        except WorkflowError as e:
+            raise ProtocolError(str(e), request_id)
+        summary.pop("steps")
+        await websocket.send(make_reply(request_id, REPLY_EXIT, 0 if summary["status"] == "ok" else 1,
+                                        seq=seq, summary=summary))
+        self.add_to_history(f"WORKFLOW:{params}", json.dumps(summary, ensure_ascii=False))
+        return sent
+    
+    async def stream_listing(self, websocket, request_id, params):
+        """
+        Send a directory listing ("list <dir> depth=N glob=PATTERN") as output frames.
+        
+        The tree is walked on a thread pool (walk_parallel) and entries are sent
+        in batches as they are read, in completion order. The exit frame carries
+        the number of entries.
+        
+        Returns:
+            Number of payload bytes sent
+        """
+        directory, options = parse_list_options(params[5:].strip())
+        if self._invalid_path(directory):
+            raise ProtocolError("Security error: Invalid directory path", request_id)
+        if not os.path.isdir(directory):
+            raise ProtocolError(f"Not a directory: {directory}", request_id)
+        
+        logger.info(f"Streaming directory listing: {directory}")
+        batches = batched(walk_parallel(directory, options.get("depth", 1), options.get("glob")),
+                          options.get("limit", DEFAULT_PAGE_SIZE))
+        seq = 0
+        sent = 0
+        count = 0
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                frame = make_reply(request_id, REPLY_OUTPUT, batch, seq=seq, stream="entries")
+                await websocket.send(frame)
+                seq += 1
+                sent += len(frame)
+                count += len(batch)
+        finally:
+            try:
+                batches.close()
+            except ValueError:
+                pass  # Megszakítás közben a bejárás még fut a szálon
+        
+        await websocket.send(make_reply(request_id, REPLY_EXIT, 0, seq=seq, count=count))
+        return sent
+    
+    async def apply_upload_chunk(self, header, data):
+        """Write one chunk of a binary FILE upload and return the reply envelope"""
+        request_id = header.get("id")
+        filepath = str(header.get("path", "")).strip()
+        op = header.get("op", OP_WRITE)
+        if not filepath or self._invalid_path(filepath):
+            return make_reply(request_id, REPLY_ERROR, "Security error: Invalid file path")
+        
+        try:
+            offset = int(header.get("offset", 0))
+            # A lemezművelet szálon fut, az eseményhurok szabad marad
+            size = await asyncio.to_thread(write_chunk, filepath, op, offset, data, header.get("sha256"))
+            if op != OP_WRITE:
+                self._invalidate_cache(filepath)
+            result = {"path": filepath, "size": size}
+            if header.get("final"):
+                result = await asyncio.to_thread(finish_upload, filepath, op, header.get("file_sha256"))
+                self._invalidate_cache(filepath)
+                self.add_to_history(f"FILE:{op} {filepath} (chunked upload, {result['size']} bytes)",
+                                    f"sha256 {result['sha256']}")
+            return make_reply(request_id, REPLY_RESULT, result)
+        except TransferError as e:
+            return make_reply(request_id, REPLY_ERROR, str(e), **e.details)
+        except (ValueError, OSError) as e:
+            logger.error(f"Error in FILE upload {request_id}: {e}")
+            return make_reply(request_id, REPLY_ERROR, f"Error in FILE upload: {e}")
+    
+    async def handle_binary(self, websocket, frame, client_info):
+        """
+        Handle one binary frame (a FILE upload chunk).
+        
+        Chunks are processed in arrival order on the connection's receive loop,
+        which also throttles a fast uploader to the speed of the disk.
+        """
+        try:
+            header, data = parse_binary_frame(frame)
+        except ProtocolError as e:
+            await websocket.send(make_reply(None, REPLY_ERROR, str(e)))
+            return
+        
+        try:
+            ticket = self.admission.reserve(client_info, "FILE")
+        except AdmissionRejected as e:
+            self.metrics.observe_rejection("FILE", e.reason)
+            await websocket.send(make_reply(header.get("id"), REPLY_BUSY, str(e),
+                                            retry_after_ms=e.retry_after_ms))
+            return
+        
+        async with self.admission.slot(ticket):
+            started = time.monotonic()
+            reply = await self.apply_upload_chunk(header, data)
+            duration = time.monotonic() - started
+        self.metrics.observe_request("FILE", "builtin", ticket.queue_wait, duration, len(reply))
+        await websocket.send(reply)
+    
+    async def handle_envelope(self, websocket, envelope, client_info, ticket):
+        """Process one admitted JSON envelope request and send back a reply tagged with its id"""
+        request_id = envelope["id"]
+        try:
+            message = envelope_to_legacy(envelope)
+            if envelope["stream"]:
+                async with self.admission.slot(ticket):
+                    started = time.monotonic()
+                    sent = await self.handle_stream(websocket, envelope)
+                    duration = time.monotonic() - started
+                self.metrics.observe_request(ticket.msg_type, self._request_path(message),
+                                             ticket.queue_wait, duration, sent)
+                return
+            response = await self.run_request(ticket, message)
+            reply = make_reply(request_id, REPLY_RESULT, response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing request {request_id} from {client_info}: {e}")
+            reply = make_reply(request_id, REPLY_ERROR, str(e))
+        
+        try:
+            await websocket.send(reply)
+            traffic_logger.info(f"Sent reply {request_id} to {client_info}: {reply[:50]}...")
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"Connection closed before reply {request_id} could be sent to {client_info}")
+    
     async def command_handler(self, websocket):
         """Handles incoming WebSocket connections and commands"""
         client_info = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
         logger.info(f"New connection from {client_info}")
+        current_client.set(client_info)
+        
+        # Folyamatban lévő JSON kérések (egy kapcsolaton párhuzamosan futnak)
+        pending = set()
         
         try:
             async for message in websocket:
-                logger.info(f"Received message from {client_info}: {message[:50]}...")
+                if isinstance(message, bytes):
+                    # Bináris keret: darabolt FILE feltöltés
+                    await self.handle_binary(websocket, message, client_info)
+                    continue
                 
-                response = "Unknown command format"
-                retry_count = 0
+                traffic_logger.info(f"Received message from {client_info}: {message[:50]}...")
                 
-                while (retry_count < 2):  # Maximum 1 retry (original + 1 retry)
-                    # Process different command types
-                    if message.startswith("CMD:"):
-                        cmd = message[4:].strip()
-                        response = await self.handle_cmd(cmd)
-                        # Add successful command to history
-                        if response != "RETRY_NEEDED":
-                            self.add_to_history(message)
-                        
-                    elif message.startswith("CODE:"):
-                        code = message[5:].strip()
-                        response = await self.handle_code(code)
-                        # Add successful command to history
-                        if response != "RETRY_NEEDED":
-                            self.add_to_history(message)
-                        
-                    elif message.startswith("INFO:"):
-                        response = await self.handle_info()
-                        self.add_to_history(message)
-                        
-                    elif message.startswith("FILE:"):
-                        params = message[5:].strip()
-                        response = await self.handle_file(params)
-                        # Add successful command to history
-                        if response != "RETRY_NEEDED":
-                            self.add_to_history(message)
-                    
-                    elif message.startswith("REPLAY:"):
-                        try:
-                            # Get command index from history (1-based)
-                            index = int(message[7:].strip()) - 1
-                            
-                            # Check if index is valid
-                            if 0 <= index < len(self._command_history):
-                                # Get original command
-                                original_command = self.get_from_history(index)
-                                logger.info(f"Replaying command: {original_command}")
-                                
-                                # Execute original command based on its type
-                                if original_command.startswith("CMD:"):
-                                    response = await self.handle_cmd(original_command[4:].strip())
-                                elif original_command.startswith("CODE:"):
-                                    response = await self.handle_code(original_command[5:].strip())
-                                elif original_command.startswith("FILE:"):
-                                    response = await self.handle_file(original_command[5:].strip())
-                                elif original_command.startswith("INFO:"):
-                                    response = await self.handle_info()
-                            else:
-                                response = f"Invalid REPLAY index: {index + 1}. History size: {len(self._command_history)}"
-                                logger.error(response)
-                        except ValueError:
-                            response = f"Invalid REPLAY format. Expected number, got: {message[7:]}"
-                            logger.error(response)
-                        except Exception as e:
-                            response = f"Error executing REPLAY: {str(e)}"
-                            logger.error(response)
-                    
-                    # Check if retry is needed
-                    if response == "RETRY_NEEDED" and retry_count == 0:
-                        logger.info("replay_triggered - Attempting automatic retry")
-                        retry_count += 1
-                        continue
-                    
-                    break
+                try:
+                    envelope = parse_envelope(message)
+                except ProtocolError as e:
+                    await websocket.send(make_reply(e.request_id, REPLY_ERROR, str(e)))
+                    continue
+                
+                msg_type = envelope["type"] if envelope is not None else message_type(message)
+                try:
+                    # Beengedés: sebességkorlát és a függő kérések felső határa
+                    ticket = self.admission.reserve(client_info, msg_type)
+                except AdmissionRejected as e:
+                    logger.warning(f"Rejected {msg_type} request from {client_info}: {e}")
+                    self.metrics.observe_rejection(msg_type, e.reason)
+                    if envelope is not None:
+                        await websocket.send(make_reply(envelope["id"], REPLY_BUSY, str(e),
+                                                        retry_after_ms=e.retry_after_ms))
+                    else:
+                        await websocket.send(f"BUSY: {e}")
+                    continue
+                
+                if envelope is not None:
+                    # Correlation-ID kérés: külön taskban fut, a válasz sorrendje tetszőleges
+                    task = asyncio.create_task(self.handle_envelope(websocket, envelope, client_info, ticket))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    # A még sorban álló (slot() előtt leállított) task jegye is felszabadul
+                    task.add_done_callback(lambda _, ticket=ticket: self.admission.release(ticket))
+                    continue
+                
+                response = await self.run_request(ticket, message)
                 
                 # Send final response back to client
                 await websocket.send(response)
-                logger.info(f"Sent response to {client_info}: {response[:50]}...")
+                traffic_logger.info(f"Sent response to {client_info}: {response[:50]}...")
                 
         except websockets.exceptions.ConnectionClosed:
             logger.info(f"Connection closed with {client_info}")
         except Exception as e:
             logger.error(f"Error handling connection from {client_info}: {e}")
+        finally:
+            # A lezárt kapcsolat függő kéréseit leállítjuk (a folyamatcsoportokkal együtt)
+            for task in list(pending):
+                task.cancel()
+            if self.shell_pool is not None:
+                self.shell_pool.release_client(client_info)
+            self.admission.release_client(client_info)
     
     async def start_server(self):
         """Start the WebSocket server"""
         max_retries = 3
         retry_delay = 2
         
+        if self.code_pool is not None:
+            await self.code_pool.start()
+        if self.shell_pool is not None:
+            await self.shell_pool.start()
+        if self.metrics_port:
+            await start_metrics_server(self.metrics.registry, self.metrics_host, self.metrics_port)
+        if self.sample_interval:
+            try:
+                # Az első pillanatkép elkészül, mire az első kérés megérkezik
+                await asyncio.get_running_loop().run_in_executor(None, get_sampler, self.sample_interval)
+            except ImportError:
+                logger.warning("psutil is not available, the system sampler is not started")
+        
         for attempt in range(max_retries):
             try:
                 logger.info(f"Starting WebSocket server on {self.host}:{self.port}")
                 
                 # Try to start the server
-                async with websockets.serve(self.command_handler, self.host, self.port):
+                async with websockets.serve(self.command_handler, self.host, self.port,
+                                            reuse_port=self.reuse_port):
                     logger.info("Server started. Press Ctrl+C to stop.")
                     await asyncio.Future()  # Run forever
                     
@@ -470,7 +1154,8 @@ class CommandServer:
                         if alternative_port:
                             logger.info(f"Using alternative port: {alternative_port}")
                             self.port = alternative_port
-                            async with websockets.serve(self.command_handler, self.host, self.port):
+                            async with websockets.serve(self.command_handler, self.host, self.port,
+                                            reuse_port=self.reuse_port):
                                 logger.info("Server started on alternative port. Press Ctrl+C to stop.")
                                 await asyncio.Future()
                         else:
@@ -542,26 +1227,43 @@ class CommandServer:
                 return "Command executed (no output)"
             
             # Execute command and capture output
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
+            result = await self.engine.run_shell(command)
+            if result.timed_out:
+                return f"Command timed out after {self.command_timeout} seconds"
             
-            if stdout:
-                return stdout.decode()
-            if stderr:
-                return stderr.decode()
+            if result.stdout:
+                return result.stdout
+            if result.stderr:
+                return result.stderr
             return "Command executed (no output)"
             
         except Exception as e:
             return f"Error executing command: {str(e)}"
 
 def main():
-    server = CommandServer()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Project-S command server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes sharing the port via SO_REUSEPORT (0 = one per CPU)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if workers > 1 and not reuse_port_supported():
+        logger.warning("SO_REUSEPORT is not supported on this platform, running a single process")
+        workers = 1
+
+    if workers > 1:
+        runner = Supervisor(workers=workers, host=args.host, port=args.port,
+                            metrics_port=args.metrics_port).run()
+    else:
+        runner = CommandServer(host=args.host, port=args.port, metrics_port=args.metrics_port).start_server()
     try:
-        asyncio.run(server.start_server())
+        asyncio.run(runner)
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Directory Listing Module
+
+Listing engine for FILE:list and the dir/ls library commands, built on
+os.scandir: the entry type comes from the directory read itself and file
+sizes from the DirEntry's cached stat, so each entry costs at most one
+extra syscall instead of isdir() + getsize().
+
+    - scan(): ordered, depth-limited, glob-filtered generator; entries are
+      produced as they are read, nothing is collected first
+    - list_page(): one page of scan() plus an opaque token for the next
+      page; resuming skips whole subtrees instead of re-reading them
+    - walk_parallel(): unordered recursive walk that reads directories
+      concurrently on a thread pool, for large trees
+"""
+
+import base64
+import fnmatch
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from core.file_transfer import parse_options
+
+logger = logging.getLogger("Dir_Listing")
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_WALK_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+class ListingError(ValueError):
+    """Invalid page token or listing options"""
+
+
+def _depth(value):
+    depth = int(value)
+    return None if depth <= 0 else depth
+
+
+LIST_OPTIONS = {"depth": _depth, "glob": str, "limit": int, "page": str, "format": str}
+
+
+def parse_list_options(params):
+    """
+    Split trailing listing options off a FILE:list / dir argument.
+
+    "logs depth=2 glob=*.log limit=100 page=<token> format=json"
+    (depth=0 means unlimited)
+    """
+    path, options = parse_options(params, LIST_OPTIONS)
+    return path or ".", options
+
+
+def options_suffix(options):
+    """The options back in key=value form (for "continue with ..." hints)"""
+    return "".join(f" {key}={value if value is not None else 0}" for key, value in options.items())
+
+
+def _entry_info(entry, rel_path, depth):
+    """Entry dict from a DirEntry (stat is only needed for files)"""
+    try:
+        is_dir = entry.is_dir()
+        info = {"name": entry.name, "path": rel_path, "is_dir": is_dir, "depth": depth}
+        if not is_dir:
+            stat = entry.stat()
+            info["size"] = stat.st_size
+            info["mtime"] = stat.st_mtime
+    except OSError:
+        # Közben törölt vagy elérhetetlen bejegyzés
+        info = {"name": entry.name, "path": rel_path, "is_dir": False, "depth": depth}
+    return info
+
+
+def _matches(pattern, info):
+    if pattern is None:
+        return True
+    # Perjeles minta a relatív útvonalra, egyébként a névre illesztünk
+    target = info["path"] if "/" in pattern else info["name"]
+    return fnmatch.fnmatch(target, pattern)
+
+
+def _read_dir(path):
+    with os.scandir(path) as it:
+        return list(it)
+
+
+def scan(root, max_depth=1, pattern=None, after=None):
+    """
+    Walk a directory tree in a stable order (sorted names, parents before children).
+
+    Args:
+        root: Directory to list
+        max_depth: 1 = only the directory itself, None = unlimited
+        pattern: Optional glob filter (on the name, or on the relative path if it contains "/")
+        after: Relative path of the last entry already returned (resume point)
+
+    Yields:
+        Entry dicts: name, path (relative, "/"-separated), is_dir, depth, and size/mtime for files
+    """
+    after_parts = tuple(after.split("/")) if after else None
+    yield from _scan_dir(root, (), 1, max_depth, pattern, after_parts)
+
+
+def _scan_dir(path, parts, depth, max_depth, pattern, after):
+    try:
+        entries = sorted(_read_dir(path), key=lambda e: e.name)
+    except OSError as e:
+        logger.warning(f"Cannot read directory {path}: {e}")
+        return
+
+    for entry in entries:
+        entry_parts = parts + (entry.name,)
+        descend = (max_depth is None or depth < max_depth) and entry.is_dir(follow_symlinks=False)
+        if after is not None:
+            prefix = after[:len(entry_parts)]
+            if entry_parts < prefix:
+                continue  # A teljes részfa a folytatási pont előtt van
+            if entry_parts == prefix:
+                # Ez a bejegyzés már elment; a gyerekei közül folytatjuk
+                resume = after if len(after) > len(entry_parts) else None
+                after = None
+                if descend:
+                    yield from _scan_dir(entry.path, entry_parts, depth + 1, max_depth, pattern, resume)
+                continue
+            after = None
+
+        info = _entry_info(entry, "/".join(entry_parts), depth)
+        if _matches(pattern, info):
+            yield info
+        if descend:
+            yield from _scan_dir(entry.path, entry_parts, depth + 1, max_depth, pattern, None)
+
+
+def encode_page_token(rel_path):
+    return base64.urlsafe_b64encode(json.dumps({"after": rel_path}).encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))["after"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ListingError(f"Invalid page token: {e}")
+
+
+def list_page(root, page_size=DEFAULT_PAGE_SIZE, page_token=None, max_depth=1, pattern=None):
+    """
+    One page of scan().
+
+    Returns:
+        (list of entry dicts, token for the next page or None)
+    """
+    after = decode_page_token(page_token) if page_token else None
+    entries = []
+    for info in scan(root, max_depth, pattern, after):
+        if len(entries) == page_size:
+            return entries, encode_page_token(entries[-1]["path"])
+        entries.append(info)
+    return entries, None
+
+
+def walk_parallel(root, max_depth=None, pattern=None, workers=DEFAULT_WALK_WORKERS):
+    """
+    Recursive walk that reads directories concurrently on a thread pool.
+
+    Yields:
+        Entry dicts (like scan()) in completion order, not sorted
+    """
+    def read(path, parts, depth):
+        infos, subdirs = [], []
+        try:
+            entries = _read_dir(path)
+        except OSError as e:
+            logger.warning(f"Cannot read directory {path}: {e}")
+            return infos, subdirs
+        for entry in entries:
+            entry_parts = parts + (entry.name,)
+            infos.append(_entry_info(entry, "/".join(entry_parts), depth))
+            if (max_depth is None or depth < max_depth) and entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, entry_parts, depth + 1))
+        return infos, subdirs
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dir-walk") as pool:
+        running = {pool.submit(read, root, (), 1)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                infos, subdirs = future.result()
+                for subdir in subdirs:
+                    running.add(pool.submit(read, *subdir))
+                for info in infos:
+                    if _matches(pattern, info):
+                        yield info
+
+
+def format_entry(info):
+    """One line of the text listing: "name/" for directories, "name (N bytes)" for files"""
+    if info["is_dir"]:
+        return f"{info['path']}/"
+    if "size" in info:
+        return f"{info['path']} ({info['size']} bytes)"
+    return info["path"]
+
+
+def batched(entries, size):
+    """Group an entry iterator into lists of at most `size` entries"""
+    batch = []
+    for info in entries:
+        batch.append(info)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Execution Engine Module
+
+Non-blocking subprocess execution for the command server. Commands run as
+asyncio subprocesses, so a slow CMD: or CODE: request no longer freezes the
+event loop (and every other WebSocket client) while it runs.
+
+A global semaphore limits how many subprocesses run at once (slot() lets
+the shell pool, the interpreter pool and the command library share it),
+and every request gets its own timeout. On timeout or cancellation the
+whole process group is killed, so shell pipelines and grandchildren do
+not outlive the request.
+
+Output is captured with a bounded head and tail (see core.output_capture):
+huge output is spilled to a compressed temp file instead of memory, and
+ExecutionResult.output_ids holds the id of every spilled stream.
+run_blocking() does the same for synchronous callers (command library).
+
+run_exec() and run_blocking() accept a line_filter (see core.argv_pipeline):
+stdout then goes through the in-process pipeline stages before it is
+captured.
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+
+from core.output_capture import OutputCapture, DEFAULT_HEAD_BYTES, DEFAULT_TAIL_BYTES
+
+logger = logging.getLogger("Execution_Engine")
+
+# Alapértelmezett beállítások
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 60
+DEFAULT_CHUNK_SIZE = 4096  # Streamelésnél egyszerre olvasott bájtok száma
+
+# A hívó közös végrehajtója: a parancskönyvtár alfolyamatai ennek a helyeit foglalják
+# (a LibraryExecutor állítja be, lásd engine_slot())
+shared_engine = ContextVar("shared_engine", default=None)
+
+
+class ExecutionResult:
+    """Result of a finished (or killed) subprocess"""
+
+    def __init__(self, returncode, stdout="", stderr="", timed_out=False, duration=0.0, output_ids=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.duration = duration
+        # Stream neve -> a lemezre kiírt teljes kimenet azonosítója
+        self.output_ids = output_ids or {}
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+    def __repr__(self):
+        return (f"ExecutionResult(returncode={self.returncode}, timed_out={self.timed_out}, "
+                f"duration={self.duration:.3f})")
+
+
+class ExecutionEngine:
+    """
+    Runs shell commands and argv lists as asyncio subprocesses.
+
+    Args:
+        max_concurrency: Maximum number of subprocesses running at the same time
+        default_timeout: Timeout in seconds used when a request does not set one
+        head_bytes, tail_bytes: Output kept in memory per stream (the rest is spilled to disk)
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, default_timeout=DEFAULT_TIMEOUT,
+                 head_bytes=DEFAULT_HEAD_BYTES, tail_bytes=DEFAULT_TAIL_BYTES):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the engine's concurrency slots.
+
+        The engine's own subprocesses run inside a slot; pools that keep
+        their processes running (shell sessions, interpreter workers) and
+        the command library take one per request, so max_concurrency
+        bounds them all.
+        """
+        async with self._semaphore:
+            self.active += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+
+    @staticmethod
+    def _spawn_kwargs(env=None, cwd=None, limit=None):
+        """Keyword arguments that put the child into its own process group"""
+        kwargs = {
+            "stdout": asyncio.subprocess.PIPE,
+            "stderr": asyncio.subprocess.PIPE,
+            "stdin": asyncio.subprocess.DEVNULL,
+            "env": env,
+            "cwd": cwd,
+        }
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        if limit:
+            # Kis olvasási puffer: a pipe visszanyomást ad, a memória nem nő
+            kwargs["limit"] = limit
+        return kwargs
+
+    @staticmethod
+    def kill_process_group(proc):
+        """
+        Kill a subprocess together with every process in its group.
+
+        The group is killed even if the leader has already exited: its
+        background children may still be running and holding the pipes.
+        """
+        try:
+            if os.name == "nt":
+                # A taskkill /T a teljes folyamatfát leállítja
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                               capture_output=True, timeout=10)
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            # A csoport már üres: nincs mit leállítani
+            pass
+        except (PermissionError, OSError, subprocess.TimeoutExpired):
+            pass
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+
+    async def run_shell(self, cmd, timeout=None, env=None, cwd=None):
+        """Run a command line through the shell and return an ExecutionResult"""
+        async def spawn():
+            return await asyncio.create_subprocess_shell(cmd, **self._spawn_kwargs(env, cwd))
+        return await self._run(spawn, timeout, cmd)
+
+    async def run_exec(self, argv, timeout=None, env=None, cwd=None, line_filter=None):
+        """Run an argv list directly (no shell) and return an ExecutionResult"""
+        async def spawn():
+            return await asyncio.create_subprocess_exec(*argv, **self._spawn_kwargs(env, cwd))
+        return await self._run(spawn, timeout, " ".join(argv), line_filter)
+
+    async def stream_shell(self, cmd, on_output, timeout=None, env=None, cwd=None,
+                           chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Run a command line through the shell, streaming its output.
+
+        Args:
+            cmd: Command line to run
+            on_output: Coroutine function called as on_output(stream_name, text) for
+                every chunk read from stdout or stderr
+            chunk_size: Maximum number of bytes read (and buffered) per chunk
+
+        Returns:
+            ExecutionResult without stdout/stderr (they were already delivered)
+        """
+        async def spawn():
+            return await asyncio.create_subprocess_shell(
+                cmd, **self._spawn_kwargs(env, cwd, limit=chunk_size))
+        return await self._stream(spawn, on_output, timeout, chunk_size, cmd)
+
+    async def stream_exec(self, argv, on_output, timeout=None, env=None, cwd=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+        """Run an argv list directly (no shell), streaming its output like stream_shell"""
+        async def spawn():
+            return await asyncio.create_subprocess_exec(
+                *argv, **self._spawn_kwargs(env, cwd, limit=chunk_size))
+        return await self._stream(spawn, on_output, timeout, chunk_size, " ".join(argv))
+
+    @staticmethod
+    async def _pump(reader, name, on_output, chunk_size):
+        """Forward one pipe to on_output in bounded chunks"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await reader.read(chunk_size)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                await on_output(name, text)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            await on_output(name, tail)
+
+    async def _stream(self, spawn, on_output, timeout, chunk_size, label):
+        timeout = self.default_timeout if timeout is None else timeout
+
+        async with self.slot():
+            start = time.monotonic()
+            proc = None
+            try:
+                proc = await spawn()
+                pumps = asyncio.gather(
+                    self._pump(proc.stdout, "stdout", on_output, chunk_size),
+                    self._pump(proc.stderr, "stderr", on_output, chunk_size),
+                )
+                try:
+                    await asyncio.wait_for(pumps, timeout)
+                    await proc.wait()
+                except asyncio.TimeoutError:
+                    logger.warning(f"Timeout after {timeout}s, killing process group: {label[:50]}")
+                    self.kill_process_group(proc)
+                    await proc.wait()
+                    return ExecutionResult(proc.returncode, timed_out=True,
+                                           duration=time.monotonic() - start)
+                return ExecutionResult(proc.returncode, duration=time.monotonic() - start)
+            except BaseException:
+                # Megszakítás vagy hibás on_output (pl. bontott kapcsolat): a folyamat se fusson tovább
+                if proc is not None:
+                    pumps.cancel()
+                    self.kill_process_group(proc)
+                raise
+
+    @staticmethod
+    async def _capture(reader, capture, line_filter=None):
+        """Read one pipe into an OutputCapture in bounded chunks (through the line filter, if any)"""
+        while True:
+            data = await reader.read(DEFAULT_CHUNK_SIZE * 16)
+            if not data:
+                break
+            # A lemezre menő darabok munkaszálon íródnak ki
+            await capture.awrite(line_filter.feed(data) if line_filter is not None else data)
+        if line_filter is not None:
+            await capture.awrite(line_filter.close())
+
+    async def _run(self, spawn, timeout, label, line_filter=None):
+        timeout = self.default_timeout if timeout is None else timeout
+
+        async with self.slot():
+            start = time.monotonic()
+            proc = None
+            captures = (OutputCapture(self.head_bytes, self.tail_bytes),
+                        OutputCapture(self.head_bytes, self.tail_bytes))
+            try:
+                proc = await spawn()
+                gathered = asyncio.gather(self._capture(proc.stdout, captures[0], line_filter),
+                                          self._capture(proc.stderr, captures[1]),
+                                          proc.wait())
+                # Megszakításkor a kimenet már senkit nem érdekel: ne legyen "never retrieved" figyelmeztetés
+                gathered.add_done_callback(lambda f: f.cancelled() or f.exception())
+                try:
+                    # Korlátos olvasás: csak az eleje és a vége marad a memóriában
+                    await asyncio.wait_for(gathered, timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Timeout after {timeout}s, killing process group: {label[:50]}")
+                    self.kill_process_group(proc)
+                    await proc.wait()
+                    for capture in captures:
+                        capture.abort()
+                    return ExecutionResult(proc.returncode, timed_out=True,
+                                           duration=time.monotonic() - start)
+
+                texts = [await capture.atext() for capture in captures]
+                return _finish(proc.returncode, captures, texts, time.monotonic() - start)
+            except BaseException:
+                # A kérés megszakadt (pl. a kliens bontotta a kapcsolatot)
+                if proc is not None:
+                    self.kill_process_group(proc)
+                for capture in captures:
+                    capture.abort()
+                raise
+
+
+def engine_slot(engine=None):
+    """engine.slot() (default: the caller's shared_engine), or a no-op context without an engine"""
+    if engine is None:
+        engine = shared_engine.get()
+    return engine.slot() if engine is not None else nullcontext()
+
+
+def _finish(returncode, captures, texts, duration):
+    """ExecutionResult from the stdout/stderr captures of a finished process and their texts"""
+    output_ids = {name: capture.output_id for name, capture in zip(("stdout", "stderr"), captures)
+                  if capture.output_id}
+    return ExecutionResult(returncode, texts[0], texts[1], duration=duration, output_ids=output_ids)
+
+
+def run_blocking(cmd, timeout=DEFAULT_TIMEOUT, shell=True, env=None, cwd=None,
+                 head_bytes=DEFAULT_HEAD_BYTES, tail_bytes=DEFAULT_TAIL_BYTES, line_filter=None):
+    """
+    Blocking counterpart of ExecutionEngine.run_shell/run_exec with the same bounded capture.
+
+    The pipes are drained by two reader threads, so neither stream can fill
+    up and block the child. On timeout the process group is killed and an
+    ExecutionResult with timed_out=True (and no output) is returned.
+    """
+    start = time.monotonic()
+    kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE, "stdin": subprocess.DEVNULL,
+              "env": env, "cwd": cwd, "shell": shell}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    captures = (OutputCapture(head_bytes, tail_bytes), OutputCapture(head_bytes, tail_bytes))
+    proc = subprocess.Popen(cmd, **kwargs)
+
+    def drain(pipe, capture, line_filter=None):
+        with pipe:
+            for data in iter(lambda: pipe.read1(DEFAULT_CHUNK_SIZE * 16), b""):
+                capture.write(line_filter.feed(data) if line_filter is not None else data)
+        if line_filter is not None:
+            capture.write(line_filter.close())
+
+    readers = [threading.Thread(target=drain, args=(pipe, capture, stage_filter), daemon=True)
+               for pipe, capture, stage_filter in zip((proc.stdout, proc.stderr), captures, (line_filter, None))]
+    for reader in readers:
+        reader.start()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"Timeout after {timeout}s, killing process group: {str(cmd)[:50]}")
+        ExecutionEngine.kill_process_group(proc)
+        proc.wait()
+        for capture in captures:
+            capture.abort()
+        return ExecutionResult(proc.returncode, timed_out=True, duration=time.monotonic() - start)
+    for reader in readers:
+        reader.join()
+    return _finish(proc.returncode, captures, [capture.text() for capture in captures],
+                   time.monotonic() - start)
+
+
+async def load_test(count=10, delay=1.0, max_concurrency=None):
+    """
+    Run `count` slow commands at once and compare the wall time with a single run.
+
+    With enough concurrency the batch should finish in roughly the time of one
+    command instead of `count` times that.
+    """
+    engine = ExecutionEngine(max_concurrency=max_concurrency or count)
+    cmd = f'"{sys.executable}" -c "import time; time.sleep({delay})"'
+
+    start = time.monotonic()
+    await engine.run_shell(cmd)
+    single = time.monotonic() - start
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(engine.run_shell(cmd) for _ in range(count)))
+    batch = time.monotonic() - start
+
+    return {
+        "count": count,
+        "single_seconds": round(single, 3),
+        "batch_seconds": round(batch, 3),
+        "all_ok": all(r.ok for r in results),
+    }
+
+
+def main():
+    """Load test: N concurrent slow commands should take about as long as one"""
+    stats = asyncio.run(load_test())
+    print(f"1 parancs: {stats['single_seconds']} s, "
+          f"{stats['count']} párhuzamos parancs: {stats['batch_seconds']} s")
+    assert stats["all_ok"], "Not every command succeeded"
+    assert stats["batch_seconds"] < stats["single_seconds"] * 2, "Commands did not run concurrently"
+    return stats
+
+
+if __name__ == "__main__":
+    main()
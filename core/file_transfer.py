@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - File Transfer Module
+
+Range-based file reads and chunked, resumable file writes for FILE:
+requests, with flat memory use regardless of file size.
+
+Reads go chunk by chunk into one reusable buffer (positioned reads), so
+memory use does not depend on the size of the requested window.
+
+Writes arrive in chunks, each placed at an explicit file offset:
+
+    - "write" chunks go to <path>.part, which replaces <path> once the
+      final chunk arrives (and the optional whole-file SHA-256 matches)
+    - "append" chunks go straight to <path>
+
+A chunk is accepted if its offset is not beyond the current size, so a
+resent chunk simply overwrites the same bytes; after a disconnect the
+client asks for the current size (upload_status) and continues from
+there. Every chunk may carry its own SHA-256, checked before it is
+written.
+"""
+
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger("File_Transfer")
+
+DEFAULT_CHUNK_SIZE = 256 * 1024       # Bináris keretek mérete
+DEFAULT_TEXT_READ_LENGTH = 256 * 1024  # Szöveges FILE:read válasz legfeljebb ennyi bájt
+PART_SUFFIX = ".part"
+
+OP_WRITE = "write"
+OP_APPEND = "append"
+
+
+class TransferError(Exception):
+    """Invalid range, offset or checksum; `details` is sent back to the client"""
+
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.details = details
+
+
+class FileRange:
+    """
+    Read-only window [offset, offset + length) of a file, read in chunks
+    into one reusable buffer.
+
+    The file is never mapped: if another process truncates it while it is
+    being read (e.g. logrotate copytruncate), the read comes back short and
+    a TransferError is raised for this request only.
+
+    Usage:
+        with FileRange(path, offset, length) as file_range:
+            for chunk in file_range.chunks():
+                ...  # memoryview, only valid until the next iteration
+    """
+
+    def __init__(self, path, offset=0, length=None):
+        if offset < 0 or (length is not None and length < 0):
+            raise TransferError("Offset and length must not be negative")
+        self.path = path
+        self.size = os.path.getsize(path)
+        if offset > self.size:
+            raise TransferError(f"Offset {offset} is beyond the end of the file", size=self.size)
+        self.offset = offset
+        available = self.size - offset
+        self.length = available if length is None else min(length, available)
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "rb", buffering=0)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def _read_into(self, view, position):
+        """Fill `view` from `position`; a short read means the file shrank"""
+        filled = 0
+        if hasattr(os, "preadv"):
+            while filled < len(view):
+                n = os.preadv(self._file.fileno(), [view[filled:]], position + filled)
+                if not n:
+                    break
+                filled += n
+        else:
+            # Windows: nincs preadv, a fájlobjektum saját pozícióját használjuk
+            self._file.seek(position)
+            while filled < len(view):
+                n = self._file.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+        if filled < len(view):
+            raise TransferError(f"File changed while reading: {self.path} is shorter than expected",
+                                offset=position + filled)
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield (file_offset, memoryview) pairs covering the range"""
+        buffer = bytearray(min(chunk_size, self.length))
+        with memoryview(buffer) as view:
+            for start in range(0, self.length, chunk_size):
+                size = min(chunk_size, self.length - start)
+                self._read_into(view[:size], self.offset + start)
+                with view[:size] as chunk:
+                    yield self.offset + start, chunk
+
+    def read(self):
+        """The whole range as bytes (callers keep it small)"""
+        buffer = bytearray(self.length)
+        if self.length:
+            self._read_into(memoryview(buffer), self.offset)
+        return bytes(buffer)
+
+
+def parse_options(params, spec):
+    """
+    Split trailing key=value options off a FILE: argument.
+
+    Args:
+        params: Argument text, e.g. "logs/app.log offset=100 length=50"
+        spec: Dict of option name -> converter (e.g. {"offset": int})
+
+    Returns:
+        (remaining text, dict of converted options)
+    """
+    options = {}
+    parts = params.split()
+    while parts and "=" in parts[-1]:
+        key, value = parts[-1].split("=", 1)
+        if key not in spec:
+            break
+        try:
+            options[key] = spec[key](value)
+        except ValueError:
+            raise TransferError(f"Invalid value for {key}: {value}")
+        parts.pop()
+    return " ".join(parts), options
+
+
+def parse_range_options(params):
+    """
+    Split trailing offset=/length= options off a FILE: argument.
+
+    "logs/app.log offset=100 length=50" -> ("logs/app.log", {"offset": 100, "length": 50})
+    """
+    return parse_options(params, {"offset": int, "length": int})
+
+
+def file_digest(path, algorithm="sha256", chunk_size=DEFAULT_CHUNK_SIZE):
+    """Hex digest of a file, read in fixed-size chunks"""
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _target_path(path, op):
+    if op == OP_WRITE:
+        return path + PART_SUFFIX
+    if op == OP_APPEND:
+        return path
+    raise TransferError(f"Unknown upload operation: {op}")
+
+
+def _size_or_zero(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def upload_status(path):
+    """Current sizes of a file and of its unfinished upload, for resuming"""
+    return {"path": path, "size": _size_or_zero(path), "part_size": _size_or_zero(path + PART_SUFFIX)}
+
+
+def write_chunk(path, op, offset, data, sha256=None):
+    """
+    Place one upload chunk at `offset` of the target file.
+
+    Returns:
+        Size of the target file after the write
+
+    Raises:
+        TransferError: Checksum mismatch, or the offset leaves a gap
+    """
+    if sha256 is not None and hashlib.sha256(data).hexdigest() != sha256.lower():
+        raise TransferError("Chunk checksum mismatch", offset=offset)
+
+    target = _target_path(path, op)
+    size = _size_or_zero(target)
+    if offset < 0 or offset > size:
+        raise TransferError(f"Unexpected offset {offset}, expected at most {size}", expected_offset=size)
+
+    directory = os.path.dirname(os.path.abspath(target))
+    os.makedirs(directory, exist_ok=True)
+    with open(target, "r+b" if os.path.exists(target) else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        return max(size, offset + len(data))
+
+
+def finish_upload(path, op, sha256=None):
+    """
+    Complete a chunked upload and verify the optional whole-file checksum.
+
+    For "write" the finished <path>.part is moved into place; for "append"
+    the checksum covers the whole file after the last chunk.
+
+    Returns:
+        Dict with the final size and SHA-256 of the file
+    """
+    if _target_path(path, op) == path:
+        digest = file_digest(path) if os.path.exists(path) else hashlib.sha256().hexdigest()
+        if sha256 is not None and digest != sha256.lower():
+            raise TransferError("File checksum mismatch", sha256=digest)
+        return {"path": path, "size": _size_or_zero(path), "sha256": digest}
+
+    part = path + PART_SUFFIX
+    if not os.path.exists(part):
+        # Üres fájl feltöltése: egyetlen üres, záró keret
+        open(part, "wb").close()
+    digest = file_digest(part)
+    if sha256 is not None and digest != sha256.lower():
+        # A hibás részfájlt eldobjuk, a feltöltés elölről kezdhető
+        os.remove(part)
+        raise TransferError("File checksum mismatch, upload discarded", sha256=digest)
+    os.replace(part, path)
+    return {"path": path, "size": os.path.getsize(path), "sha256": digest}
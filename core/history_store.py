@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - History Store Module
+
+Durable command history shared by CommandServer, ReplayManager and
+AICommandHandler. Entries live in an SQLite database in WAL mode, so
+several processes can append and read at the same time and the history
+survives restarts.
+
+Lookups are indexed:
+    - by id (primary key)
+    - by prefix (index on the command text, range scan)
+    - by substring (FTS5 trigram index when SQLite supports it, LIKE otherwise)
+    - by time range (index on the timestamp)
+    - by writer (index on source, id): each component numbers its own
+      entries for REPLAY:, so writers sharing one database do not shift
+      each other's indices
+
+add() never touches the database on the caller's thread: entries go to a
+queue and a dedicated writer thread inserts and commits them in batches,
+so a slow disk or a locked database cannot stall the event loop. Reads
+wait (up to FLUSH_TIMEOUT) for queued writes, so a just-added entry is
+visible to REPLAY; they block the calling thread, so async callers run
+them with asyncio.to_thread (as CommandServer does). Responses are capped
+at max_response_chars and the history keeps at most max_entries entries.
+"""
+
+import atexit
+import contextlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger("History_Store")
+
+DEFAULT_HISTORY_PATH = "command_history.db"
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_RESPONSE_CHARS = 4096
+# Ennyi beszúrásonként fut a régi bejegyzések törlése
+PRUNE_INTERVAL = 1000
+# Olvasás előtt legfeljebb ennyit várunk a sorban álló írásokra
+FLUSH_TIMEOUT = 1.0
+# Egy commitba ennyi bejegyzés kerülhet
+WRITE_BATCH_SIZE = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    command TEXT NOT NULL,
+    response TEXT,
+    success INTEGER NOT NULL DEFAULT 1,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON history(ts);
+CREATE INDEX IF NOT EXISTS idx_history_command ON history(command);
+CREATE INDEX IF NOT EXISTS idx_history_source ON history(source, id);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    command, content='history', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts(rowid, command) VALUES (new.id, new.command);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts(history_fts, rowid, command) VALUES ('delete', old.id, old.command);
+END;
+"""
+
+_COLUMNS = "id, ts, command, response, success, source"
+
+# Fájlalapú adatbázisnál az író szálnak saját kapcsolata van, zár nem kell
+_NO_LOCK = contextlib.nullcontext()
+
+
+def _row_to_entry(row):
+    entry_id, ts, command, response, success, source = row
+    return {
+        "id": entry_id,
+        "ts": ts,
+        "timestamp": datetime.fromtimestamp(ts).isoformat(),
+        "command": command,
+        "response": response,
+        "success": bool(success),
+        "source": source,
+    }
+
+
+def cap_response(response, max_chars=DEFAULT_MAX_RESPONSE_CHARS):
+    """Cut a response to `max_chars` characters, noting how much was dropped"""
+    if response is None or not max_chars or len(response) <= max_chars:
+        return response
+    dropped = len(response) - max_chars
+    return f"{response[:max_chars]}\n...({dropped} more characters not stored)..."
+
+
+class HistoryStore:
+    """
+    Persistent, indexed command history.
+
+    Args:
+        path: SQLite database file (":memory:" for a throwaway store)
+        max_entries: Retention limit; the oldest entries beyond it are pruned (None keeps everything)
+        max_response_chars: Longer responses are stored cut to this size (None stores them whole)
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_response_chars=DEFAULT_MAX_RESPONSE_CHARS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_response_chars = max_response_chars
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.fts = self._init_fts()
+        # Memóriabeli adatbázis csak egy kapcsolaton látszik, ott közös a kapcsolat
+        self._shared = path == ":memory:"
+        self._writer_conn = self._conn if self._shared else self._connect()
+        self._inserts = 0
+        self._pending = 0
+        self._written = threading.Condition()
+        self._queue = queue.Queue()
+        self._closed = False
+        if self.max_entries:
+            self._prune(self._conn)
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        # Kilépéskor a sorban álló bejegyzések is kiíródnak
+        atexit.register(self.close)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+
+    def _init_fts(self):
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            # Régebbi SQLite: nincs fts5/trigram, LIKE keresés marad
+            logger.info(f"Full-text index unavailable, substring search uses LIKE: {e}")
+            return False
+
+    def add(self, command, response=None, success=True, source=None, timestamp=None):
+        """Queue an entry for the writer thread (returns at once, without touching the database)"""
+        if self._closed:
+            raise RuntimeError("HistoryStore is closed")
+        ts = time.time() if timestamp is None else timestamp
+        row = (ts, command, cap_response(response, self.max_response_chars), int(bool(success)), source)
+        with self._written:
+            self._pending += 1
+        self._queue.put(row)
+
+    def _write_loop(self):
+        while True:
+            row = self._queue.get()
+            if row is None:
+                return
+            rows = [row]
+            stop = False
+            while len(rows) < WRITE_BATCH_SIZE:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+            self._write(rows)
+            if stop:
+                return
+
+    def _write(self, rows):
+        try:
+            with self._lock if self._shared else _NO_LOCK:
+                self._writer_conn.executemany(
+                    "INSERT INTO history (ts, command, response, success, source) VALUES (?, ?, ?, ?, ?)",
+                    rows)
+                self._writer_conn.commit()
+                before = self._inserts
+                self._inserts += len(rows)
+                if self.max_entries and before // PRUNE_INTERVAL != self._inserts // PRUNE_INTERVAL:
+                    self._prune(self._writer_conn)
+        except sqlite3.Error as e:
+            # Az előzmény elvesztése nem állíthatja le a szervert
+            logger.error(f"Failed to store {len(rows)} history entries: {e}")
+        finally:
+            with self._written:
+                self._pending -= len(rows)
+                self._written.notify_all()
+
+    def _prune(self, conn):
+        conn.execute(
+            "DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?", (self.max_entries,))
+        conn.commit()
+
+    def flush(self, timeout=None):
+        """Wait until queued entries are written; returns False if `timeout` ran out first"""
+        with self._written:
+            return self._written.wait_for(lambda: self._pending == 0, timeout)
+
+    def _query(self, sql, params=()):
+        self.flush(FLUSH_TIMEOUT)
+        with self._lock:
+            return [_row_to_entry(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def get(self, entry_id):
+        """Return the entry with the given id, or None"""
+        rows = self._query(f"SELECT {_COLUMNS} FROM history WHERE id = ?", (entry_id,))
+        return rows[0] if rows else None
+
+    def recent(self, limit=10, offset=0, source=None):
+        """Most recent entries first (only those written by `source`, if given)"""
+        if source is not None:
+            return self._query(
+                f"SELECT {_COLUMNS} FROM history WHERE source = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (source, limit, offset))
+        return self._query(f"SELECT {_COLUMNS} FROM history ORDER BY id DESC LIMIT ? OFFSET ?",
+                           (limit, offset))
+
+    def nth_recent(self, n, source=None):
+        """The n-th most recent entry (1-based, as used by REPLAY:), or None"""
+        if n < 1:
+            return None
+        rows = self.recent(limit=1, offset=n - 1, source=source)
+        return rows[0] if rows else None
+
+    def search_prefix(self, prefix, limit=100):
+        """Entries whose command starts with `prefix`, most recent first"""
+        # Tartomány-lekérdezés, így az idx_history_command indexet használja
+        upper = prefix + "\U0010ffff"
+        return self._query(
+            f"SELECT {_COLUMNS} FROM history WHERE command >= ? AND command < ? ORDER BY id DESC LIMIT ?",
+            (prefix, upper, limit))
+
+    def search(self, substring, limit=100):
+        """Entries whose command contains `substring`, most recent first"""
+        if self.fts and len(substring) >= 3:
+            quoted = '"' + substring.replace('"', '""') + '"'
+            return self._query(
+                f"SELECT {_COLUMNS} FROM history WHERE id IN "
+                f"(SELECT rowid FROM history_fts WHERE history_fts MATCH ?) ORDER BY id DESC LIMIT ?",
+                (quoted, limit))
+        escaped = substring.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return self._query(
+            f"SELECT {_COLUMNS} FROM history WHERE command LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+            (f"%{escaped}%", limit))
+
+    def time_range(self, start=None, end=None, limit=1000):
+        """Entries with start <= timestamp < end (epoch seconds or datetime), oldest first"""
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        if isinstance(end, datetime):
+            end = end.timestamp()
+        return self._query(
+            f"SELECT {_COLUMNS} FROM history WHERE ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+            (start if start is not None else float("-inf"),
+             end if end is not None else float("inf"), limit))
+
+    def count(self, source=None):
+        self.flush(FLUSH_TIMEOUT)
+        with self._lock:
+            if source is not None:
+                return self._conn.execute("SELECT COUNT(*) FROM history WHERE source = ?",
+                                          (source,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def clear(self):
+        self.flush(FLUSH_TIMEOUT)
+        with self._lock:
+            self._conn.execute("DELETE FROM history")
+            self._conn.commit()
+
+    def close(self):
+        """Write the queued entries, stop the writer thread and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            if not self._shared:
+                self._writer_conn.close()
+            self._conn.close()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Interpreter Pool Module
+
+Pool of warm Python interpreters for CODE: requests. Instead of writing
+generated_code.py and starting a fresh `python -X utf8` for every request,
+the server hands the code to an idle, already started worker
+(core/code_worker.py) over a pipe. The worker runs it in a fresh namespace,
+so dispatch costs a pipe write instead of interpreter startup and imports,
+and concurrent requests no longer share one file on disk.
+
+Workers are recycled after a configurable number of runs, when their
+resident memory grows past a threshold, or when a snippet left state the
+worker cannot reset (see core.code_worker for what is reset between runs
+and the isolation limits); a replacement is started in the background so
+the pool stays warm. max_runs=1 gives every snippet a fresh interpreter.
+A worker that hits the timeout is killed together with its process group.
+
+A request waits at most its timeout for an idle worker. If a replacement
+worker cannot be started, the waiting request tries to start one itself
+and fails with WorkerUnavailable if that does not work either, so requests
+never hang on an empty pool.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from core.execution_engine import ExecutionEngine, ExecutionResult, DEFAULT_TIMEOUT, engine_slot
+
+logger = logging.getLogger("Interpreter_Pool")
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+
+# Alapértelmezett beállítások
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_RUNS = 100
+DEFAULT_MAX_MEMORY_MB = 256
+DEFAULT_MAX_OUTPUT = 1024 * 1024
+_PIPE_LIMIT = 8 * DEFAULT_MAX_OUTPUT  # A válaszsor (JSON) maximális hossza
+
+
+class WorkerUnavailable(RuntimeError):
+    """No code worker could be obtained (none became idle in time, or workers fail to start)"""
+
+
+# A sikertelen pótlás jelzése a várakozó kérésnek (a tétlen sorban)
+class _SpawnFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+class _Worker:
+    """One warm interpreter process"""
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.runs = 0
+        self.rss = 0
+
+    @property
+    def alive(self):
+        return self.proc.returncode is None
+
+    async def execute(self, code):
+        self.proc.stdin.write((json.dumps({"code": code}, ensure_ascii=False) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+        line = await self.proc.stdout.readline()
+        if not line:
+            raise ConnectionError("Worker exited unexpectedly")
+        self.runs += 1
+        reply = json.loads(line)
+        self.rss = reply.get("rss", 0)
+        return reply
+
+    async def stop(self):
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), 2)
+        except (asyncio.TimeoutError, OSError):
+            ExecutionEngine.kill_process_group(self.proc)
+            await self.proc.wait()
+
+
+class InterpreterPool:
+    """
+    Pool of pre-started Python worker interpreters.
+
+    Args:
+        size: Number of warm workers kept ready
+        max_runs: Recycle a worker after this many executions
+        max_memory_mb: Recycle a worker once its RSS exceeds this many megabytes
+        preload: Module names imported by every worker at startup
+        default_timeout: Timeout in seconds used when a request does not set one
+        max_output: Maximum number of stdout/stderr bytes returned per run
+        python: Interpreter executable used for the workers
+        engine: ExecutionEngine whose concurrency slots the runs share (None = only `size` limits them)
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_runs=DEFAULT_MAX_RUNS,
+                 max_memory_mb=DEFAULT_MAX_MEMORY_MB, preload=(), default_timeout=DEFAULT_TIMEOUT,
+                 max_output=DEFAULT_MAX_OUTPUT, python=None, engine=None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.max_runs = max_runs
+        self.max_memory_mb = max_memory_mb
+        self.preload = list(preload)
+        self.default_timeout = default_timeout
+        self.max_output = max_output
+        self.python = python or sys.executable
+        self.engine = engine
+
+        self._idle = None
+        self._workers = set()
+        self._background = set()
+        self._started = False
+        self.stats = {"runs": 0, "recycled": 0, "timeouts": 0, "crashed": 0, "spawn_failures": 0}
+
+    async def _spawn(self):
+        """Start one worker and wait until it reports ready"""
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONLEGACYWINDOWSSTDIO"] = "utf-8"
+
+        kwargs = ExecutionEngine._spawn_kwargs(env=env, limit=_PIPE_LIMIT)
+        kwargs["stdin"] = asyncio.subprocess.PIPE
+        kwargs["stderr"] = asyncio.subprocess.DEVNULL
+        proc = await asyncio.create_subprocess_exec(
+            self.python, "-X", "utf8", WORKER_SCRIPT,
+            "--preload", ",".join(self.preload), "--max-output", str(self.max_output),
+            **kwargs
+        )
+        line = await proc.stdout.readline()
+        if not line or not json.loads(line).get("ready"):
+            ExecutionEngine.kill_process_group(proc)
+            await proc.wait()
+            raise RuntimeError("Code worker failed to start")
+
+        worker = _Worker(proc)
+        self._workers.add(worker)
+        logger.info(f"Code worker started (PID: {proc.pid})")
+        return worker
+
+    async def _replace(self, old_worker=None):
+        """Stop a retired worker, then start its replacement and make it available"""
+        if old_worker is not None:
+            await old_worker.stop()
+        try:
+            self._idle.put_nowait(await self._spawn())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["spawn_failures"] += 1
+            logger.error(f"Could not start replacement code worker: {e}")
+            # A helyére váró kérés maga próbál indítani egyet (vagy hibát kap)
+            self._idle.put_nowait(_SpawnFailed(e))
+
+    def _schedule_replacement(self, old_worker=None):
+        task = asyncio.create_task(self._replace(old_worker))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def start(self):
+        """Start the warm workers (called automatically on first use)"""
+        if self._started:
+            return
+        self._started = True
+        self._idle = asyncio.Queue()
+        workers = await asyncio.gather(*(self._spawn() for _ in range(self.size)), return_exceptions=True)
+        for worker in workers:
+            if isinstance(worker, BaseException):
+                self.stats["spawn_failures"] += 1
+                logger.error(f"Could not start code worker: {worker}")
+                worker = _SpawnFailed(worker)
+            self._idle.put_nowait(worker)
+        logger.info(f"Interpreter pool ready with {self.size} workers")
+
+    def _retire(self, worker, reason):
+        self.stats["recycled"] += 1
+        self._workers.discard(worker)
+        logger.info(f"Recycling code worker (PID: {worker.proc.pid}): {reason}")
+        self._schedule_replacement(worker)
+
+    async def _acquire(self, timeout):
+        """An idle worker, waiting at most `timeout` seconds"""
+        try:
+            item = await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            raise WorkerUnavailable(f"No code worker became available within {timeout} seconds")
+        if isinstance(item, _SpawnFailed):
+            try:
+                return await asyncio.wait_for(self._spawn(), timeout)
+            except asyncio.CancelledError:
+                self._idle.put_nowait(item)  # A következő kérés próbálkozik
+                raise
+            except Exception as e:
+                self.stats["spawn_failures"] += 1
+                self._idle.put_nowait(item)
+                raise WorkerUnavailable(f"Code worker failed to start: {e}")
+        return item
+
+    async def run(self, code, timeout=None):
+        """
+        Execute a CODE block on an idle worker.
+
+        Returns:
+            ExecutionResult with the captured stdout/stderr
+
+        Raises:
+            WorkerUnavailable: No worker became idle within the timeout, or none could be started
+        """
+        async with engine_slot(self.engine):
+            return await self._run(code, timeout)
+
+    async def _run(self, code, timeout):
+        await self.start()
+        timeout = self.default_timeout if timeout is None else timeout
+
+        worker = await self._acquire(timeout)
+        start = time.monotonic()
+        try:
+            reply = await asyncio.wait_for(worker.execute(code), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._workers.discard(worker)
+            ExecutionEngine.kill_process_group(worker.proc)
+            await worker.proc.wait()
+            self._schedule_replacement()
+            return ExecutionResult(worker.proc.returncode, timed_out=True,
+                                   duration=time.monotonic() - start)
+        except asyncio.CancelledError:
+            self._workers.discard(worker)
+            ExecutionEngine.kill_process_group(worker.proc)
+            self._schedule_replacement()
+            raise
+        except Exception as e:
+            # A worker összeomlott (pl. os._exit a kódban) vagy túl hosszú választ adott
+            self.stats["crashed"] += 1
+            self._workers.discard(worker)
+            ExecutionEngine.kill_process_group(worker.proc)
+            await worker.proc.wait()
+            self._schedule_replacement()
+            return ExecutionResult(worker.proc.returncode if worker.proc.returncode is not None else 1,
+                                   stderr=f"Code worker failed: {e}",
+                                   duration=time.monotonic() - start)
+
+        self.stats["runs"] += 1
+        duration = time.monotonic() - start
+
+        if reply.get("recycle"):
+            # A kód olyan állapotot hagyott maga után, amit a worker nem tud visszaállítani
+            self._retire(worker, reply["recycle"])
+        elif worker.runs >= self.max_runs:
+            self._retire(worker, f"{worker.runs} runs")
+        elif self.max_memory_mb and worker.rss > self.max_memory_mb * 1024 * 1024:
+            self._retire(worker, f"RSS {worker.rss / (1024 * 1024):.1f} MB")
+        else:
+            self._idle.put_nowait(worker)
+
+        return ExecutionResult(reply.get("returncode", 1), reply.get("stdout", ""),
+                               reply.get("stderr", ""), duration=duration)
+
+    async def close(self):
+        """Stop every worker"""
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)),
+                             return_exceptions=True)
+        self._workers.clear()
+        self._started = False
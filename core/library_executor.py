@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Library Executor Module
+
+Dispatches COMMAND_LIBRARY calls away from the event loop. Every library
+entry declares an execution kind in core.command_library:
+
+    KIND_TRIVIAL - returns immediately, runs inline on the event loop
+    KIND_IO      - blocking I/O or subprocess, runs on a thread pool
+    KIND_CPU     - CPU-bound pure Python, runs on a process pool
+
+I/O commands with a native async implementation (shell command entries,
+async_target commands) are awaited on the event loop instead, so hundreds
+of them can run at once without a thread each. Their subprocesses take a
+slot of the executor's ExecutionEngine (the server's), so they count
+against its max_concurrency.
+
+No built-in command is CPU-bound (the psutil walks moved to the background
+system sampler); KIND_CPU is there for command packs (see
+core.command_registry), e.g. a pack that parses or scores large data in
+pure Python and would otherwise hold the GIL for the whole server. The
+worker resolves the command by name in its own copy of COMMAND_LIBRARY,
+so the command must be importable there: registered by a pack, or
+registered before the pool starts when processes are forked.
+
+Pool sizes are configurable. The process pool is created on first use and
+falls back to the thread pool if it cannot be used on this host.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.command_library import COMMAND_LIBRARY, get_command_kind, KIND_TRIVIAL, KIND_CPU
+from core.execution_engine import shared_engine
+
+logger = logging.getLogger("Library_Executor")
+
+# Alapértelmezett készletméretek
+DEFAULT_THREAD_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_PROCESS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+def _call_library(command_id, args):
+    """Run a library command by name (module level, so process pool workers can pickle it)"""
+    return COMMAND_LIBRARY[command_id](args)
+
+
+class LibraryExecutor:
+    """
+    Runs library commands inline, on a thread pool or on a process pool.
+
+    Args:
+        thread_workers: Size of the thread pool for I/O-bound commands
+        process_workers: Size of the process pool for CPU-bound commands (0 = use threads)
+        engine: ExecutionEngine whose concurrency slots awaited subprocesses take (None = no shared limit)
+    """
+
+    def __init__(self, thread_workers=DEFAULT_THREAD_WORKERS, process_workers=DEFAULT_PROCESS_WORKERS,
+                 engine=None):
+        self.engine = engine
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._threads = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="library")
+        self._processes = None
+
+    def _process_pool(self):
+        if self._processes is None and self.process_workers:
+            self._processes = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._processes
+
+    async def call(self, command_id, args="", timeout=None):
+        """
+        Run COMMAND_LIBRARY[command_id](args) according to its declared kind.
+
+        Args:
+            timeout: Seconds to wait for a natively async command (asyncio.TimeoutError after it)
+        """
+        kind = get_command_kind(command_id)
+
+        if kind == KIND_TRIVIAL:
+            return COMMAND_LIBRARY[command_id](args)
+
+        if kind != KIND_CPU and COMMAND_LIBRARY.native_async(command_id):
+            token = shared_engine.set(self.engine)
+            try:
+                return await COMMAND_LIBRARY.acall(command_id, args, timeout)
+            finally:
+                shared_engine.reset(token)
+
+        loop = asyncio.get_running_loop()
+        if kind == KIND_CPU:
+            pool = self._process_pool()
+            if pool is not None:
+                try:
+                    return await loop.run_in_executor(pool, _call_library, command_id, args)
+                except (BrokenProcessPool, OSError) as e:
+                    # Pl. korlátozott környezet: szálkészletre váltunk
+                    logger.warning(f"Process pool unavailable, using threads for {command_id}: {e}")
+                    self.process_workers = 0
+                    self._processes = None
+
+        return await loop.run_in_executor(self._threads, COMMAND_LIBRARY[command_id], args)
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Logging Setup Module
+
+Central, non-blocking logging configuration shared by the command server,
+the AI command handler and the replay manager.
+
+Loggers only put records on an in-memory queue (QueueHandler); a single
+background thread (QueueListener) formats them and writes them to the
+console and to the log file. A logger.info() on the event loop therefore
+never waits on disk or terminal I/O.
+
+    - the log file rotates by size and by age (numbered backups: .1, .2, ...)
+    - optional JSON-lines output, one object per record
+    - per-logger sampling: only every Nth record below WARNING of a noisy
+      logger is kept; warnings and errors always pass
+
+The first setup_logging() call of a process wins (like logging.basicConfig),
+so modules can call it at import time. Settings can be overridden with
+environment variables:
+
+    PROJECT_S_LOG_LEVEL=DEBUG
+    PROJECT_S_LOG_JSON=1
+    PROJECT_S_LOG_SAMPLE="Command_Server.Traffic=10,Replay_Manager=5"
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+from multiprocessing import util as multiprocessing_util
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_ROTATE_INTERVAL = 24 * 60 * 60  # másodperc
+
+_listener = None
+_queue_handler = None
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that also rotates every `interval` seconds.
+
+    Several worker processes may write the same file: if another process
+    has already rotated it, the handler reopens the new file instead of
+    rotating again.
+    """
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 interval=DEFAULT_ROTATE_INTERVAL, encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval
+        self.rollover_at = self._next_rollover()
+
+    def _next_rollover(self):
+        return time.time() + self.interval if self.interval else None
+
+    def _rotated_elsewhere(self):
+        if self.stream is None:
+            return False
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def shouldRollover(self, record):
+        if self._rotated_elsewhere():
+            # Egy másik munkásfolyamat már forgatott: az új fájlba írunk tovább
+            self.stream.close()
+            self.stream = self._open()
+            self.rollover_at = self._next_rollover()
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message (and exception)"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only every Nth record below WARNING of the configured loggers.
+
+    Args:
+        rates: Dict of logger name -> N; child loggers inherit their parent's rate
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counters = {}
+        self.dropped = 0
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        if next(counter) % rate == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+def parse_sample_rates(text):
+    """"Logger=N,Other=M" -> {"Logger": N, "Other": M} (invalid items are ignored)"""
+    rates = {}
+    for item in (text or "").split(","):
+        name, _, rate = item.strip().partition("=")
+        try:
+            rates[name.strip()] = max(1, int(rate))
+        except ValueError:
+            continue
+    return rates
+
+
+def setup_logging(log_file=None, level=logging.INFO, json_lines=False, max_bytes=DEFAULT_MAX_BYTES,
+                  backup_count=DEFAULT_BACKUP_COUNT, rotate_interval=DEFAULT_ROTATE_INTERVAL,
+                  sample_rates=None, console=True):
+    """
+    Configure non-blocking logging for the process (only the first call has an effect).
+
+    Args:
+        log_file: Log file path (None = console only)
+        level: Root logger level
+        json_lines: Write JSON lines instead of the text format
+        max_bytes: Rotate the log file at this size (0 = never by size)
+        backup_count: Number of rotated files to keep
+        rotate_interval: Rotate the log file after this many seconds (0 = never by age)
+        sample_rates: Dict of logger name -> keep every Nth record below WARNING
+        console: Also log to stderr
+
+    Returns:
+        The QueueListener writing the records
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    level = os.environ.get("PROJECT_S_LOG_LEVEL", level)
+    if "PROJECT_S_LOG_JSON" in os.environ:
+        json_lines = os.environ["PROJECT_S_LOG_JSON"].lower() not in ("", "0", "false", "no")
+    rates = dict(sample_rates or {})
+    rates.update(parse_sample_rates(os.environ.get("PROJECT_S_LOG_SAMPLE")))
+
+    formatter = JsonLinesFormatter() if json_lines else logging.Formatter(DEFAULT_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(SizeAndTimeRotatingFileHandler(log_file, max_bytes, backup_count, rotate_interval))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Korlátlan sor: a naplózó hívás sosem vár
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    if rates:
+        _queue_handler.addFilter(SamplingFilter(rates))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_listener)
+    # A multiprocessing munkás os._exit()-tel lép ki, ott az atexit nem fut le
+    multiprocessing_util.register_after_fork(shutdown_logging, _finalize_in_worker)
+    return _listener
+
+
+def _restart_listener():
+    """After fork() the listener thread does not exist in the child: start a new one"""
+    global _listener
+    if _listener is None:
+        return
+    _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers,
+                                               respect_handler_level=True)
+    _listener.start()
+
+
+def _finalize_in_worker(_):
+    multiprocessing_util.Finalize(None, shutdown_logging, exitpriority=100)
+
+
+def shutdown_logging():
+    """Write out the queued records and stop the listener thread (safe to call more than once)"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    try:
+        listener.stop()
+    except Exception:
+        pass
+    for handler in listener.handlers:
+        handler.flush()
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
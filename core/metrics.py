@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Metrics Module
+
+Lightweight counters, gauges and latency histograms for the command server,
+with no external dependencies. Metrics are labelled (e.g. by message type
+and by library vs subprocess path) and can be read in two ways:
+
+    - snapshot(): JSON-friendly dict with count/sum/p50/p90/p99 per label set,
+      returned by the INFO:metrics command
+    - to_prometheus(): Prometheus text exposition format, served over HTTP
+      by start_metrics_server() on a side port
+
+Percentiles are estimated from fixed histogram buckets by linear
+interpolation, so recording a value is O(log buckets) and memory does not
+grow with traffic.
+"""
+
+import asyncio
+import bisect
+import logging
+
+logger = logging.getLogger("Metrics")
+
+# Késleltetés vödrök (másodperc) és bájt vödrök
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + list(extra or [])
+    if not items:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"'.replace("\n", " ") for name, value in items)
+    return "{" + body + "}"
+
+
+class Counter:
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, labels=None, amount=1):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        return [{"labels": dict(key), "value": value} for key, value in self.values.items()]
+
+    def prometheus_lines(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Gauge:
+    """Current value, read from a callable (or set explicitly) when metrics are collected"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.values = {}
+
+    def set(self, value, labels=None):
+        self.values[_label_key(labels)] = value
+
+    def _current(self):
+        if self.func is not None:
+            try:
+                return {(): self.func()}
+            except Exception as e:
+                logger.error(f"Gauge {self.name} failed: {e}")
+                return {}
+        return self.values
+
+    def snapshot(self):
+        return [{"labels": dict(key), "value": value} for key, value in self._current().items()]
+
+    def prometheus_lines(self):
+        for key, value in self._current().items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)  # utolsó: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram:
+    """Bucketed distribution per label set with percentile estimates"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, labels=None):
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _HistogramSeries(len(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.count += 1
+        series.sum += value
+        if value > series.max:
+            series.max = value
+
+    def _quantile(self, series, q):
+        if series.count == 0:
+            return 0.0
+        rank = q * series.count
+        cumulative = 0
+        for i, bucket_count in enumerate(series.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else series.max
+                upper = min(upper, series.max)
+                fraction = (rank - cumulative) / bucket_count
+                return lower + (max(upper, lower) - lower) * fraction
+            cumulative += bucket_count
+        return series.max
+
+    def merge_series(self, labels, counts, count, total, maximum):
+        """Add another process's raw series (same buckets) into this histogram"""
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _HistogramSeries(len(self.buckets))
+        for i, bucket_count in enumerate(counts):
+            series.counts[i] += bucket_count
+        series.count += count
+        series.sum += total
+        series.max = max(series.max, maximum)
+
+    def snapshot(self):
+        result = []
+        for key, series in self.series.items():
+            entry = {"labels": dict(key), "count": series.count, "sum": round(series.sum, 6),
+                     "max": round(series.max, 6)}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = round(self._quantile(series, q), 6)
+            result.append(entry)
+        return result
+
+    def prometheus_lines(self):
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series.counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series.count}"
+            yield f"{self.name}_sum{_format_labels(key)} {series.sum}"
+            yield f"{self.name}_count{_format_labels(key)} {series.count}"
+
+
+class MetricsRegistry:
+    """Named collection of metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, func=None):
+        return self._register(Gauge(name, help_text, func))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def snapshot(self):
+        return {name: {"type": m.kind, "help": m.help, "values": m.snapshot()}
+                for name, m in self.metrics.items()}
+
+    def dump(self):
+        """Raw, mergeable state (used to aggregate metrics across worker processes)"""
+        result = {}
+        for name, metric in self.metrics.items():
+            data = {"kind": metric.kind, "help": metric.help}
+            if metric.kind == "histogram":
+                data["buckets"] = list(metric.buckets)
+                data["series"] = [{"labels": dict(key), "counts": s.counts, "count": s.count,
+                                   "sum": s.sum, "max": s.max} for key, s in metric.series.items()]
+            else:
+                data["values"] = metric.snapshot()
+            result[name] = data
+        return result
+
+    @classmethod
+    def merged(cls, dumps):
+        """Build a registry that sums several dump() results (counters, gauges and histograms)"""
+        registry = cls()
+        for dump in dumps:
+            for name, data in dump.items():
+                if data["kind"] == "histogram":
+                    metric = registry.histogram(name, data["help"], data["buckets"])
+                    for series in data["series"]:
+                        metric.merge_series(series["labels"], series["counts"], series["count"],
+                                            series["sum"], series["max"])
+                elif data["kind"] == "counter":
+                    metric = registry.counter(name, data["help"])
+                    for value in data["values"]:
+                        metric.inc(value["labels"], value["value"])
+                else:
+                    metric = registry.gauge(name, data["help"])
+                    for value in data["values"]:
+                        key = _label_key(value["labels"])
+                        metric.values[key] = metric.values.get(key, 0) + value["value"]
+        return registry
+
+    def to_prometheus(self):
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+
+class ServerMetrics:
+    """The command server's standard instruments"""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter("command_server_requests_total",
+                                  "Processed requests by message type and execution path")
+        self.rejected = r.counter("command_server_rejected_total",
+                                  "Requests rejected by admission control")
+        self.queue_wait = r.histogram("command_server_queue_wait_seconds",
+                                      "Time spent waiting for a concurrency slot")
+        self.execution = r.histogram("command_server_execution_seconds",
+                                     "Request execution time")
+        self.bytes_out = r.histogram("command_server_response_bytes",
+                                     "Response size in bytes", BYTES_BUCKETS)
+        self.retries = r.counter("command_server_retries_total",
+                                 "Automatic retries by retry policy and failure reason")
+        self.cache = r.counter("command_server_cache_lookups_total",
+                               "Response cache lookups by message type and result (hit/miss)")
+
+    def observe_request(self, msg_type, path, queue_wait, duration, bytes_out):
+        labels = {"type": msg_type, "path": path}
+        self.requests.inc(labels)
+        self.queue_wait.observe(queue_wait, labels)
+        self.execution.observe(duration, labels)
+        self.bytes_out.observe(bytes_out, labels)
+
+    def observe_rejection(self, msg_type, reason):
+        self.rejected.inc({"type": msg_type, "reason": reason})
+
+    def observe_retry(self, policy, reason):
+        self.retries.inc({"policy": policy, "reason": reason})
+
+    def observe_cache(self, msg_type, hit):
+        self.cache.inc({"type": msg_type, "result": "hit" if hit else "miss"})
+
+
+async def start_metrics_server(registry, host="127.0.0.1", port=9108):
+    """
+    Serve registry.to_prometheus() over plain HTTP (GET /metrics).
+
+    Returns:
+        The asyncio server object (close() it to stop serving)
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # A fejléceket eldobjuk az üres sorig
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                body = registry.to_prometheus().encode("utf-8")
+                status = "200 OK"
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body = b"Not Found\n"
+                status = "404 Not Found"
+                content_type = "text/plain; charset=utf-8"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Output Capture Module
+
+Bounded capture of command output. Instead of buffering everything and
+truncating afterwards, a capture keeps only the first `head_bytes` and the
+last `tail_bytes` in memory. Once the output outgrows them, the whole stream
+is also written to a spill file, so memory use stays flat even for commands
+that print gigabytes. The spill file is written raw while the command runs
+and gzip-compressed on a background thread once the capture is closed.
+Coroutines use awrite() and atext(): once the output reaches the disk,
+opening the spill file (with the cleanup of expired ones), every write and
+the final flush run on a worker thread, so a slow disk cannot stall the
+event loop.
+
+The text of a truncated capture names its spill file by id:
+
+    <head>
+    ... [123456789 bytes omitted, full output: output 3f2a...] ...
+    <tail>
+
+and the full output can be fetched later, page by page, with read_output()
+(the "output <id> offset=N length=N" library command). Spill files live in
+a per-user temp directory (mode 0700, files 0600), shared by the worker
+processes of the same user, and are removed after DEFAULT_OUTPUT_TTL seconds.
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("Output_Capture")
+
+DEFAULT_HEAD_BYTES = 256 * 1024
+DEFAULT_TAIL_BYTES = 256 * 1024
+DEFAULT_READ_LENGTH = 256 * 1024
+DEFAULT_OUTPUT_TTL = 60 * 60  # másodperc
+# Felhasználónkénti könyvtár: más helyi felhasználó nem olvashatja és nem hozhatja létre előre
+DEFAULT_OUTPUT_DIR = os.path.join(tempfile.gettempdir(),
+                                  f"project_s_output-{os.getuid()}" if hasattr(os, "getuid") else "project_s_output")
+SPILL_SUFFIX = ".gz"
+RAW_SUFFIX = ".out"   # Tömörítetlen kimenet, amíg a háttérszál be nem tömöríti
+DIR_MODE = 0o700
+FILE_MODE = 0o600
+# A lejárt fájlok takarítása legfeljebb ilyen gyakran fut (másodperc)
+CLEANUP_INTERVAL = 60
+
+_OUTPUT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Egyetlen háttérszál tömörít (első használatkor indul)
+_compressor = None
+_compressor_lock = threading.Lock()
+_last_cleanup = {}
+
+
+class OutputNotFound(LookupError):
+    """Unknown or expired output id"""
+
+
+def output_path(output_id, directory=DEFAULT_OUTPUT_DIR, suffix=SPILL_SUFFIX):
+    """Spill file of an output id (the id is validated, so it cannot escape the directory)"""
+    if not _OUTPUT_ID.match(output_id or ""):
+        raise OutputNotFound(f"Invalid output id: {output_id!r}")
+    return os.path.join(directory, output_id + suffix)
+
+
+def ensure_output_dir(directory=DEFAULT_OUTPUT_DIR):
+    """
+    Create the spill directory with mode 0700, or check an existing one.
+
+    Raises:
+        PermissionError: The directory is a symlink, belongs to another user or cannot be made private
+    """
+    os.makedirs(directory, mode=DIR_MODE, exist_ok=True)
+    if os.name == "nt":
+        return  # A felhasználói TEMP könyvtár eleve csak a felhasználóé
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"Output directory {directory} is not a directory owned by this user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(directory, DIR_MODE)
+
+
+def _create_private(path):
+    """Open a new file for writing with mode 0600 (fails if it exists)"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), FILE_MODE)
+    return os.fdopen(fd, "wb")
+
+
+def _compress_spill(raw_path, path):
+    """Compress a finished raw spill file into `path` and remove the raw file (background thread)"""
+    try:
+        with open(raw_path, "rb") as src, _create_private(path + ".part") as dst:
+            # Gyors tömörítés: a háttérszál ne maradjon le a parancsok mögött
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=1) as gz:
+                shutil.copyfileobj(src, gz, 1024 * 1024)
+        os.replace(path + ".part", path)
+        os.remove(raw_path)
+    except OSError as e:
+        # A tömörítetlen fájl megmarad és olvasható
+        logger.warning(f"Cannot compress output spill file {raw_path}: {e}")
+        try:
+            os.remove(path + ".part")
+        except OSError:
+            pass
+
+
+def _submit_compression(raw_path, path):
+    global _compressor
+    if _compressor is None:
+        with _compressor_lock:
+            if _compressor is None:
+                _compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="output-compress")
+    return _compressor.submit(_compress_spill, raw_path, path)
+
+
+def cleanup_outputs(directory=DEFAULT_OUTPUT_DIR, ttl=DEFAULT_OUTPUT_TTL):
+    """Remove spill files older than `ttl` seconds; returns the number removed"""
+    removed = 0
+    cutoff = time.time() - ttl
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return removed
+
+
+def _cleanup_due(directory):
+    """True at most once per CLEANUP_INTERVAL for a directory (the first spill file of a command asks)"""
+    now = time.monotonic()
+    with _compressor_lock:
+        last = _last_cleanup.get(directory)
+        if last is not None and now - last < CLEANUP_INTERVAL:
+            return False
+        _last_cleanup[directory] = now
+        return True
+
+
+class OutputCapture:
+    """
+    Head + tail capture of one output stream with spill-to-disk.
+
+    Args:
+        head_bytes: Bytes kept from the beginning of the stream
+        tail_bytes: Bytes kept from the end of the stream
+        spill: Write the full stream to a compressed spill file once it is truncated
+        directory: Directory of the spill files
+    """
+
+    def __init__(self, head_bytes=DEFAULT_HEAD_BYTES, tail_bytes=DEFAULT_TAIL_BYTES, spill=True,
+                 directory=DEFAULT_OUTPUT_DIR):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill = spill
+        self.directory = directory
+        self.total = 0
+        self.output_id = None
+        self._head = bytearray()
+        self._tail = deque()
+        self._tail_size = 0
+        self._spill_file = None
+        self._spill_path = None
+        # A fájlműveletek munkaszálon futhatnak, a megszakítás (abort) közben érkezhet
+        self._lock = threading.Lock()
+
+    def _touches_disk(self, size):
+        """True if writing `size` more bytes goes to (or opens) the spill file"""
+        return self._spill_file is not None or (
+            self.spill and self.total + size > self.head_bytes + self.tail_bytes)
+
+    def write(self, data):
+        """Add a chunk of raw output"""
+        if not data:
+            return
+        if self._touches_disk(len(data)):
+            with self._lock:
+                if self._spill_file is None and self.spill:
+                    self._start_spill()
+                if self._spill_file is not None:
+                    self._spill_file.write(data)
+        self.total += len(data)
+
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes > 0:
+            # Darabok sora: a régi darabok eldobása nem mozgatja a megtartott bájtokat
+            self._tail.append(bytes(data))
+            self._tail_size += len(data)
+            while self._tail and self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+                self._tail_size -= len(self._tail.popleft())
+
+    def _start_spill(self):
+        """Open the spill file and write everything kept so far (nothing was dropped yet)"""
+        try:
+            ensure_output_dir(self.directory)
+            if _cleanup_due(self.directory):
+                cleanup_outputs(self.directory)
+            self.output_id = uuid.uuid4().hex
+            self._spill_path = output_path(self.output_id, self.directory, RAW_SUFFIX)
+            # Tömörítetlen írás: a tömörítés a parancs után, háttérszálon történik
+            self._spill_file = _create_private(self._spill_path + ".part")
+            self._spill_file.write(self._head)
+            for chunk in self._tail:
+                self._spill_file.write(chunk)
+        except OSError as e:
+            logger.warning(f"Cannot create output spill file, the full output will not be kept: {e}")
+            self.spill = False
+            self.output_id = None
+            self._spill_file = None
+
+    async def awrite(self, data):
+        """write() for coroutines: a chunk that goes to the spill file is written on a worker thread"""
+        import asyncio  # A szálas hívók (run_blocking) ne töltsék be az asyncio-t
+
+        if data and self._touches_disk(len(data)):
+            await asyncio.to_thread(self.write, data)
+        else:
+            self.write(data)
+
+    async def atext(self, encoding="utf-8"):
+        """text() for coroutines: finishing a spill file (flush, rename) runs on a worker thread"""
+        import asyncio
+
+        if self._spill_file is not None:
+            return await asyncio.to_thread(self.text, encoding)
+        return self.text(encoding)
+
+    def close(self):
+        """Finish the spill file (if any) and queue its compression; returns the output id or None"""
+        with self._lock:
+            if self._spill_file is not None:
+                try:
+                    self._spill_file.close()
+                    os.replace(self._spill_path + ".part", self._spill_path)
+                    _submit_compression(self._spill_path, output_path(self.output_id, self.directory))
+                except (OSError, RuntimeError) as e:
+                    logger.warning(f"Cannot finish output spill file: {e}")
+                    self.output_id = None
+                self._spill_file = None
+        return self.output_id
+
+    def abort(self):
+        """Drop the spill file (e.g. the command was cancelled)"""
+        with self._lock:
+            if self._spill_file is not None:
+                try:
+                    self._spill_file.close()
+                    os.remove(self._spill_path + ".part")
+                except OSError:
+                    pass
+                self._spill_file = None
+            self.output_id = None
+            # Egy még futó munkaszálas írás se nyisson új fájlt
+            self.spill = False
+
+    def text(self, encoding="utf-8"):
+        """Captured output as text, with a marker (and the output id) where bytes were left out"""
+        tail = b"".join(self._tail)
+        if self.total == len(self._head) + len(tail):
+            # Minden bájt a memóriában maradt: a kiírt fájlra nincs szükség
+            self.abort()
+            return (bytes(self._head) + tail).decode(encoding, errors="replace")
+        self.close()
+        tail = tail[max(0, len(tail) - self.tail_bytes):]
+        omitted = self.total - len(self._head) - len(tail)
+        where = f", full output: output {self.output_id}" if self.output_id else ""
+        return (self._head.decode(encoding, errors="replace")
+                + f"\n... [{omitted} bytes omitted{where}] ...\n"
+                + tail.decode(encoding, errors="replace"))
+
+
+def read_output(output_id, offset=0, length=DEFAULT_READ_LENGTH, directory=DEFAULT_OUTPUT_DIR):
+    """
+    Read a range of a spilled output.
+
+    Returns:
+        (data, more): the bytes read and whether the output continues after them
+    """
+    path = output_path(output_id, directory)
+    raw_path = output_path(output_id, directory, RAW_SUFFIX)
+    # A tömörítés közben a nyers fájl eltűnhet: ilyenkor a tömörítettet olvassuk
+    for opener, candidate in ((gzip.open, path), (open, raw_path), (gzip.open, path)):
+        try:
+            with opener(candidate, "rb") as f:
+                if offset:
+                    f.seek(offset)  # Tömörített fájl: előre kicsomagolva
+                data = f.read(length + 1)
+            return data[:length], len(data) > length
+        except FileNotFoundError:
+            continue
+    raise OutputNotFound(f"Output not found or expired: {output_id}")
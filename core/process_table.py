@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Process Table Module
+
+Incremental process table with per-process CPU accounting and top-N
+ranking, used by the system sampler and the "processes" command.
+
+The table keeps one entry per PID across refreshes:
+
+    - entries are keyed on (PID, creation time), so a reused PID is a new
+      entry; the user is read once per entry
+    - each refresh reads the counters (CPU times, RSS, I/O bytes) and the
+      name (it changes on exec()) in one oneshot() block, and the CPU % and
+      I/O rate are the deltas since the previous refresh (100% = one full core)
+    - entries of exited processes are dropped
+
+Ranking never sorts the whole table: top_processes() filters the records
+(user, name regex) and keeps the N largest with a heap.
+
+    table = ProcessTable()
+    records = table.refresh()
+    top_processes(records, 10, sort="cpu", user="root", name="python")
+"""
+
+import heapq
+import logging
+import re
+import time
+
+logger = logging.getLogger("Process_Table")
+
+DEFAULT_TOP = 25
+SORT_KEYS = ("cpu", "rss", "io")
+
+_SORT_FIELDS = {"cpu": "cpu_percent", "rss": "rss", "io": "io_rate"}
+
+
+class _ProcessEntry:
+    __slots__ = ("username", "cpu_time", "io_bytes", "sampled")
+
+    def __init__(self, username):
+        self.username = username
+        self.cpu_time = None
+        self.io_bytes = None
+        self.sampled = None
+
+
+class ProcessTable:
+    """
+    (PID, creation time) -> process cache with CPU and I/O deltas between refreshes.
+
+    Args:
+        collect_io: Also read the per-process I/O counters (not available on every platform)
+    """
+
+    def __init__(self, collect_io=True):
+        self.collect_io = collect_io
+        self._entries = {}
+        self.refreshes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _read(self, psutil, pid):
+        """(key, name, cpu time, rss, I/O bytes, username of a new entry) of one process"""
+        process = psutil.Process(pid)
+        with process.oneshot():
+            key = (pid, process.create_time())
+            username = None
+            if key not in self._entries:
+                # Állandó adat: folyamatonként egyszer
+                try:
+                    username = process.username()
+                except (psutil.AccessDenied, KeyError):
+                    pass
+            cpu = process.cpu_times()
+            rss = process.memory_info().rss
+            io_bytes = None
+            if self.collect_io:
+                try:
+                    io = process.io_counters()
+                    io_bytes = io.read_bytes + io.write_bytes
+                except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                    pass
+            # A név exec() után megváltozik: minden frissítéskor újraolvassuk
+            name = process.name()
+        return key, name, cpu.user + cpu.system, rss, io_bytes, username
+
+    def refresh(self):
+        """
+        Read the counters of every process.
+
+        Returns:
+            List of dicts: pid, name, username, rss, cpu_percent, io_rate
+            (the rates are 0.0 for processes seen for the first time)
+        """
+        import psutil
+
+        entries = {}
+        records = []
+        for pid in psutil.pids():
+            try:
+                key, name, cpu_time, rss, io_bytes, username = self._read(psutil, pid)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+            now = time.monotonic()
+
+            # Újrahasznosított PID: más a létrehozás ideje, új bejegyzés előző minta nélkül
+            entry = self._entries.get(key) or _ProcessEntry(username)
+            entries[key] = entry
+            cpu_percent = io_rate = 0.0
+            if entry.sampled is not None and now > entry.sampled:
+                elapsed = now - entry.sampled
+                cpu_percent = max(0.0, (cpu_time - entry.cpu_time) / elapsed * 100)
+                if io_bytes is not None and entry.io_bytes is not None:
+                    io_rate = max(0.0, (io_bytes - entry.io_bytes) / elapsed)
+            entry.cpu_time = cpu_time
+            entry.io_bytes = io_bytes
+            entry.sampled = now
+            records.append({"pid": pid, "name": name, "username": entry.username, "rss": rss,
+                            "cpu_percent": cpu_percent, "io_rate": io_rate})
+        # A kilépett folyamatok bejegyzései kimaradnak
+        self._entries = entries
+        self.refreshes += 1
+        return records
+
+
+def parse_process_options(args):
+    """
+    Options of the processes command: "sort=cpu|rss|io n=10 user=root name=regex".
+
+    Raises:
+        ValueError: Unknown option, sort key, count or invalid regex
+    """
+    options = {"sort": "cpu", "n": DEFAULT_TOP, "user": None, "name": None}
+    for token in (args or "").split():
+        key, sep, value = token.partition("=")
+        key = key.lower()
+        if not sep or key not in options:
+            raise ValueError(f"Unknown option: {token} (sort=cpu|rss|io n=N user=NAME name=REGEX)")
+        options[key] = value
+    options["sort"] = options["sort"].lower()
+    if options["sort"] not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {options['sort']} (cpu, rss or io)")
+    try:
+        options["n"] = max(1, int(options["n"]))
+    except ValueError:
+        raise ValueError(f"Invalid count: {options['n']}")
+    if options["name"] is not None:
+        try:
+            options["name"] = re.compile(options["name"], re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid name pattern: {e}")
+    return options
+
+
+def top_processes(records, n=DEFAULT_TOP, sort="cpu", user=None, name=None):
+    """
+    The N heaviest records by CPU %, RSS or I/O rate, heaviest first.
+
+    Args:
+        records: Output of ProcessTable.refresh()
+        user: Keep only processes of this user (case-insensitive, domain prefix ignored)
+        name: Keep only processes whose name matches this regex (str or compiled)
+    """
+    field = _SORT_FIELDS[sort]
+    if isinstance(name, str):
+        name = re.compile(name, re.IGNORECASE)
+    user = user.lower() if user else None
+
+    def selected(record):
+        if user is not None:
+            owner = (record["username"] or "").lower()
+            if owner != user and owner.rpartition("\\")[2] != user:
+                return False
+        return name is None or bool(name.search(record["name"] or ""))
+
+    candidates = records if user is None and name is None else filter(selected, records)
+    # Kupac: O(n log N) a teljes rendezés helyett; azonos értéknél a kisebb memória / PID a sorrend
+    return heapq.nlargest(n, candidates, key=lambda r: (r[field], r["rss"], -r["pid"]))
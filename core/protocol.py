@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - WebSocket Protocol Module
+
+Optional JSON envelope for the command server, used next to the legacy
+text prefixes (CMD:, CODE:, FILE:, INFO:, REPLAY:, BATCH:, WORKFLOW:).
+
+Request:  {"id": "42", "type": "CMD", "payload": "echo hello"}
+Reply:    {"id": "42", "type": "result", "payload": "hello"}
+
+Envelope requests on one connection run concurrently and their replies
+come back in completion order, tagged with the request id.
+
+CMD and CODE requests may set "stream": true. The server then sends
+incremental output frames while the process runs, followed by one exit
+frame, all tagged with the request id and a per-request sequence number:
+
+    {"id": "7", "type": "output", "seq": 0, "stream": "stdout", "payload": "..."}
+    {"id": "7", "type": "exit", "seq": 5, "payload": 0, "timed_out": false}
+
+FILE requests with "stream": true ("read <path> offset=N length=N") get the
+file range as binary frames, followed by the exit frame. Binary frames
+(both directions) start with a 4-byte big-endian header length, then a
+JSON header, then the raw bytes:
+
+    <len>{"id": "9", "type": "data", "seq": 0, "offset": 0}<bytes>
+
+Clients upload files the same way: each binary frame carries one chunk,
+
+    <len>{"id": "10", "op": "write", "path": "a.log", "offset": 0,
+          "sha256": "<chunk digest>", "final": false}<bytes>
+
+and gets a result reply with the new size (see core.file_transfer). A
+frame must stay below the server's 1 MiB message limit, so chunks of
+256-512 KiB are a good choice.
+
+FILE "list <dir> depth=N glob=PATTERN" requests with "stream": true get
+output frames whose payload is a batch of entry dicts (stream "entries"),
+then an exit frame with the entry count.
+
+BATCH requests with "stream": true get one output frame per finished
+item (stream "item"), then an exit frame with the aggregate summary.
+WORKFLOW requests stream the same way, one frame per finished step
+(stream "step", the payload carries the step id).
+
+A request rejected by admission control gets a busy reply right away:
+
+    {"id": "8", "type": "busy", "payload": "Server busy, retry after 40 ms", "retry_after_ms": 40}
+"""
+
+import json
+import struct
+
+# Támogatott kéréstípusok (a régi szöveges előtagok megfelelői)
+MESSAGE_TYPES = ("CMD", "CODE", "FILE", "INFO", "REPLAY", "BATCH", "WORKFLOW")
+
+# Választípusok
+REPLY_RESULT = "result"
+REPLY_ERROR = "error"
+REPLY_OUTPUT = "output"
+REPLY_EXIT = "exit"
+REPLY_BUSY = "busy"
+REPLY_DATA = "data"
+
+# Streamelhető kéréstípusok
+STREAMABLE_TYPES = ("CMD", "CODE", "FILE", "BATCH", "WORKFLOW")
+
+_HEADER_LENGTH = struct.Struct(">I")
+
+# A régi szöveges válaszok hibát jelző előtagjai
+ERROR_PREFIXES = ("Error", "Hiba", "Security error", "Unsupported", "Invalid", "BUSY", "Ismeretlen",
+                  "Hibás", "Rendszerparancs hiba", "Command timed out", "Code execution timed out")
+
+
+class ProtocolError(ValueError):
+    """Raised when a message looks like an envelope but is not a valid one"""
+
+    def __init__(self, message, request_id=None):
+        super().__init__(message)
+        self.request_id = request_id
+
+
+def is_envelope(message):
+    """Quick check whether a raw message should be parsed as a JSON envelope"""
+    return isinstance(message, str) and message.lstrip().startswith("{")
+
+
+def parse_envelope(message):
+    """
+    Parse a JSON envelope.
+
+    Args:
+        message: Raw text frame received from the client
+
+    Returns:
+        Dict with "id", "type", "payload" and "stream" keys, or None for legacy
+        text messages
+
+    Raises:
+        ProtocolError: The message is JSON but not a valid envelope
+    """
+    if not is_envelope(message):
+        return None
+
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError as e:
+        raise ProtocolError(f"Invalid JSON envelope: {e}")
+
+    if not isinstance(data, dict):
+        raise ProtocolError("Envelope must be a JSON object")
+
+    request_id = data.get("id")
+    if request_id is None or isinstance(request_id, (dict, list)):
+        raise ProtocolError("Envelope is missing a scalar 'id'")
+
+    msg_type = str(data.get("type", "")).upper()
+    if msg_type not in MESSAGE_TYPES:
+        raise ProtocolError(f"Unknown message type: {data.get('type')}", request_id)
+
+    payload = data.get("payload", "")
+    if payload is None:
+        payload = ""
+
+    stream = bool(data.get("stream", False))
+    if stream and msg_type not in STREAMABLE_TYPES:
+        raise ProtocolError(f"Streaming is not supported for {msg_type} requests", request_id)
+
+    return {"id": request_id, "type": msg_type, "payload": payload, "stream": stream}
+
+
+def envelope_to_legacy(envelope):
+    """Convert a parsed envelope into the equivalent legacy text message"""
+    payload = envelope["payload"]
+    if not isinstance(payload, str):
+        # Pl. CMD esetén {"parancs": ..., "paraméterek": ...} objektum
+        payload = json.dumps(payload, ensure_ascii=False)
+    return f"{envelope['type']}:{payload}"
+
+
+def is_error_response(response):
+    """True if a legacy text response reports a failure"""
+    return not isinstance(response, str) or response.startswith(ERROR_PREFIXES)
+
+
+def make_reply(request_id, reply_type, payload, **extra):
+    """Serialize a reply envelope"""
+    reply = {"id": request_id, "type": reply_type, "payload": payload}
+    reply.update(extra)
+    return json.dumps(reply, ensure_ascii=False)
+
+
+def pack_binary_frame(header, data=b""):
+    """
+    Build a binary frame as a list of fragments (header, data).
+
+    The data is not copied; websockets sends the fragments as one message.
+    """
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return [_HEADER_LENGTH.pack(len(encoded)) + encoded, data]
+
+
+def parse_binary_frame(frame):
+    """
+    Split a binary frame into its JSON header and data.
+
+    Returns:
+        (header dict, memoryview of the data)
+
+    Raises:
+        ProtocolError: Truncated frame or invalid header
+    """
+    view = memoryview(frame)
+    if len(view) < _HEADER_LENGTH.size:
+        raise ProtocolError("Binary frame is too short")
+    (length,) = _HEADER_LENGTH.unpack(view[:_HEADER_LENGTH.size])
+    end = _HEADER_LENGTH.size + length
+    if len(view) < end:
+        raise ProtocolError("Binary frame header is truncated")
+    try:
+        header = json.loads(bytes(view[_HEADER_LENGTH.size:end]).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f"Invalid binary frame header: {e}")
+    if not isinstance(header, dict):
+        raise ProtocolError("Binary frame header must be a JSON object")
+    return header, view[end:]
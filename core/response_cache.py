@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Response Cache Module
+
+Server-side cache for the responses of idempotent requests, shared by all
+connections:
+
+    - INFO: system information
+    - FILE: read / list / stat / checksum
+    - CMD: read-only library commands (sysinfo, diskspace, ...)
+
+Requests are normalized before lookup (whitespace, absolute paths, option
+order), so equivalent requests from different clients share one entry.
+Entries expire after a per-type TTL and the least recently used entries
+are evicted once the memory cap is reached.
+
+FILE entries remember the path they depend on. A FILE:write/append (or a
+chunked upload) to that path drops them, together with the listings of
+its parent directories; on a hit the file's mtime and size are compared
+with the cached ones, so changes made outside the server are noticed too.
+"""
+
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from core.dir_listing import parse_list_options
+from core.file_transfer import TransferError, parse_range_options
+from core.protocol import is_error_response
+
+logger = logging.getLogger("Response_Cache")
+
+# Élettartam típusonként (másodperc); ami nincs itt, az nem kerül a gyorsítótárba
+DEFAULT_TTLS = {
+    "INFO": 5.0,
+    "FILE": 30.0,
+    "CMD": 10.0,
+}
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 2 * 1024 * 1024
+
+# Csak olvasó, mellékhatás nélküli könyvtári parancsok
+DEFAULT_CACHEABLE_COMMANDS = ("sysinfo", "diskspace", "hostname", "whoami", "help")
+
+_FILE_READ_OPS = ("read", "list", "stat", "checksum")
+
+
+def _file_validator(path):
+    """(mtime_ns, size) of a path, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _CacheEntry:
+    __slots__ = ("response", "expires", "size", "msg_type", "path", "validator")
+
+    def __init__(self, response, expires, size, msg_type, path, validator):
+        self.response = response
+        self.expires = expires
+        self.size = size
+        self.msg_type = msg_type
+        self.path = path
+        self.validator = validator
+
+
+class RequestKey:
+    """
+    Normalized cache key of a request, with its type and the file path it depends on.
+
+    The path is stat'ed once, before the request runs; the result is both
+    stored with a new entry and compared with the stored one on a hit.
+    """
+
+    __slots__ = ("key", "msg_type", "path", "validator")
+
+    def __init__(self, key, msg_type, path=None):
+        self.key = key
+        self.msg_type = msg_type
+        self.path = path
+        self.validator = _file_validator(path) if path is not None else None
+
+
+class ResponseCache:
+    """
+    TTL + LRU response cache with a memory cap and path-based invalidation.
+
+    Args:
+        ttls: Dict of message type -> TTL in seconds (types not listed are not cached)
+        max_bytes: Approximate memory cap for all cached responses
+        max_entry_bytes: Larger responses are not cached
+        cacheable_commands: CMD base commands whose output may be cached
+    """
+
+    def __init__(self, ttls=None, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=DEFAULT_MAX_ENTRY_BYTES,
+                 cacheable_commands=DEFAULT_CACHEABLE_COMMANDS):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.cacheable_commands = set(cacheable_commands)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def request_key(self, message):
+        """
+        Normalized key of a legacy text message, or None if it must not be cached.
+        """
+        msg_type, _, params = message.partition(":")
+        msg_type = msg_type.strip().upper()
+        if msg_type not in self.ttls:
+            return None
+        params = params.strip()
+
+        if msg_type == "INFO":
+            params = params.lower()
+            if params == "metrics":
+                return None
+            return RequestKey(("INFO", params), msg_type)
+
+        if msg_type == "FILE":
+            op, _, rest = params.partition(" ")
+            if op not in _FILE_READ_OPS:
+                return None
+            try:
+                if op == "read":
+                    path, options = parse_range_options(rest.strip())
+                elif op == "list":
+                    path, options = parse_list_options(rest.strip())
+                else:
+                    path, options = rest.strip(), {}
+            except (TransferError, ValueError):
+                return None  # Hibás opciók: a kezelő adja a hibaüzenetet
+            if not path:
+                return None
+            path = os.path.abspath(path)
+            return RequestKey(("FILE", op, path, tuple(sorted(options.items()))), msg_type, path)
+
+        if msg_type == "CMD":
+            parts = params.split()
+            if not parts or parts[0].lower() not in self.cacheable_commands:
+                return None
+            return RequestKey(("CMD", parts[0].lower()) + tuple(parts[1:]), msg_type)
+
+        return None
+
+    def get(self, request_key):
+        """Cached response for a RequestKey, or None (counted as a miss)"""
+        entry = self._entries.get(request_key.key)
+        if entry is not None:
+            if entry.expires <= time.monotonic() or entry.validator != request_key.validator:
+                # Lejárt, vagy a fájl a szerveren kívül megváltozott
+                self._remove(request_key.key)
+                entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(request_key.key)
+        self.stats["hits"] += 1
+        return entry.response
+
+    def put(self, request_key, response):
+        """Store a successful response (errors and oversized responses are skipped)"""
+        if is_error_response(response):
+            return
+        size = sys.getsizeof(response)
+        if size > self.max_entry_bytes:
+            return
+        if request_key.key in self._entries:
+            self._remove(request_key.key)
+        expires = time.monotonic() + self.ttls[request_key.msg_type]
+        self._entries[request_key.key] = _CacheEntry(response, expires, size, request_key.msg_type,
+                                                     request_key.path, request_key.validator)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            # LRU: a legrégebben használt bejegyzés megy először
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def invalidate_path(self, path):
+        """Drop entries for a written path and for listings of its parent directories"""
+        path = os.path.abspath(path)
+        affected = {path}
+        parent = os.path.dirname(path)
+        while parent not in affected:
+            affected.add(parent)
+            parent = os.path.dirname(parent)
+        stale = [key for key, entry in self._entries.items() if entry.path in affected]
+        for key in stale:
+            self._remove(key)
+        self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
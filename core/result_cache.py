@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Result Cache Module
+
+Thread-safe LRU + TTL cache for the results of library commands. Every
+operation is O(1): entries live in an OrderedDict in least recently used
+order, a hit moves the entry to the end and a full cache drops the first
+one.
+
+The TTL is given per entry, so each command can declare its own policy
+(see CommandRegistry.register(cache_ttl=...)):
+
+    CACHE_NEVER    (0)   the result is never stored (date, tasklist, ...)
+    5.0                  the result is reused for 5 seconds (sysinfo)
+    CACHE_FOREVER        the result is kept until evicted (ver)
+
+Expired entries are dropped when they are looked up (or evicted as the
+least recently used ones).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("Result_Cache")
+
+CACHE_NEVER = 0
+CACHE_FOREVER = float("inf")
+DEFAULT_MAX_ENTRIES = 256
+
+# Hiányzó érték jelölése (a None is lehet tárolt eredmény)
+MISSING = object()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache shared by threads.
+
+    Args:
+        max_entries: Maximum number of stored results
+        clock: Monotonic time source (seconds)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=MISSING):
+        """Cached value of a key, or `default` if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl):
+        """Store a value for `ttl` seconds (CACHE_NEVER = not stored, CACHE_FOREVER = until evicted)"""
+        if not ttl or ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                # LRU: a legrégebben használt bejegyzés megy
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop one entry; returns True if it was stored"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def stats(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions, "expirations": self.expirations}
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Retry Policy Module
+
+Per-request automatic retries for CMD: and CODE: executions. Every request
+keeps its own attempt counter, so concurrent connections cannot disturb
+each other's retries, and the wait between attempts is an asyncio sleep
+with exponential backoff and jitter, which leaves the event loop free.
+
+A failed ExecutionResult is classified before it is retried:
+
+    - exit codes / stderr patterns that never get better on a second try
+      (command not found, permission denied, syntax errors, ...) stop at once
+    - transient ones (connection refused, resource temporarily unavailable,
+      database is locked, killed by a signal, ...) are retried
+    - anything else follows the policy's `retry_unclassified` setting
+
+Policies are chosen per command class: read-only shell commands, read-only
+network tools and CODE blocks each have their own defaults (see
+DEFAULT_POLICIES). Commands that may change state - package managers,
+git, curl, and every shell command not known to be read-only (see
+core.single_flight.is_read_only) - get the "state_changing" policy: a
+`git push` or `apt-get install` that failed or timed out half-way is only
+rerun for a recognised transient error (DNS, connection errors, HTTP 5xx),
+never for a timeout, a signal or an unclassified failure.
+
+Only the "network" policy retries unclassified failures (an unreachable
+host is often back a moment later); a plain shell command that exits
+non-zero - grep without a match, `test -f` on a missing file - is an
+answer, not a failure, and runs once. No default policy retries a
+timeout: a command that ran into it (a `ping -t` or a `tail -f` that never
+ends by design) would only run into it again. Every policy also has a
+total time budget (max_elapsed), so retries of slow failures cannot
+stretch one request far beyond a single attempt.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+
+from core.single_flight import has_side_effects
+
+logger = logging.getLogger("Retry_Policy")
+
+# Soha nem javul újrapróbálással
+NON_RETRYABLE_EXIT_CODES = (126, 127)
+NON_RETRYABLE_PATTERNS = (
+    r"command not found",
+    r"is not recognized as an internal or external command",
+    r"no such file or directory",
+    r"permission denied",
+    r"access is denied",
+    r"syntaxerror",
+    r"nameerror",
+    r"invalid (option|argument)",
+    r"usage:",
+)
+# Átmeneti hibák
+RETRYABLE_PATTERNS = (
+    r"resource temporarily unavailable",
+    r"connection (refused|reset|timed out)",
+    r"temporary failure in name resolution",
+    r"could not resolve host",
+    r"name or service not known",
+    r"\b50[0234]\b[^\n]*(internal server error|bad gateway|service unavailable|gateway time-?out)",
+    r"returned error: 5\d\d",
+    r"http error 5\d\d",
+    r"network is unreachable",
+    r"too many open files",
+    r"device or resource busy",
+    r"database is locked",
+    r"try again",
+)
+
+# Csak olvasó hálózati eszközök: saját, türelmesebb szabály
+NETWORK_COMMANDS = ("ping", "nslookup", "dig", "tracert", "traceroute", "netstat")
+# Állapotot módosító eszközök: csak felismert átmeneti hibára próbáljuk újra
+STATE_CHANGING_COMMANDS = ("curl", "wget", "ssh", "scp", "git", "pip", "pip3", "apt", "apt-get", "npm")
+
+# Ennyi másodperc után (az első próbálkozás kezdetétől) nem indul újabb próbálkozás
+DEFAULT_MAX_ELAPSED = 60.0
+
+
+class RetryPolicy:
+    """
+    When and how often a failed execution is retried.
+
+    Args:
+        name: Policy name (shown in logs and metrics)
+        max_attempts: Total attempts including the first one (1 = no retry)
+        base_delay: Wait before the first retry, in seconds
+        multiplier: Backoff factor between consecutive retries
+        max_delay: Upper bound of a single wait
+        jitter: Fraction of the wait that is randomized (0 = none, 1 = full jitter)
+        retry_on_timeout: Whether timed-out executions are retried
+        retry_unclassified: Whether failures matching no pattern are retried
+        retry_on_signal: Whether executions killed by a signal are retried
+        retryable_exit_codes: Exit codes that are always retried
+        max_elapsed: No retry is started once this many seconds have passed since the
+            first attempt began (None = no limit)
+    """
+
+    def __init__(self, name, max_attempts=2, base_delay=0.2, multiplier=2.0, max_delay=5.0, jitter=0.5,
+                 retry_on_timeout=False, retry_unclassified=False, retry_on_signal=True, retryable_exit_codes=(),
+                 retryable_patterns=RETRYABLE_PATTERNS, non_retryable_patterns=NON_RETRYABLE_PATTERNS,
+                 non_retryable_exit_codes=NON_RETRYABLE_EXIT_CODES, max_elapsed=DEFAULT_MAX_ELAPSED):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = min(1.0, max(0.0, jitter))
+        self.retry_on_timeout = retry_on_timeout
+        self.retry_unclassified = retry_unclassified
+        self.retry_on_signal = retry_on_signal
+        self.retryable_exit_codes = set(retryable_exit_codes)
+        self.max_elapsed = max_elapsed
+        self.non_retryable_exit_codes = set(non_retryable_exit_codes)
+        self._retryable = re.compile("|".join(retryable_patterns), re.I) if retryable_patterns else None
+        self._non_retryable = (re.compile("|".join(non_retryable_patterns), re.I)
+                               if non_retryable_patterns else None)
+
+    def classify(self, result):
+        """
+        Decide whether a failed result is worth another attempt.
+
+        Returns:
+            (retryable, reason), reason being a short category (used as a metrics label)
+        """
+        if result.timed_out:
+            return self.retry_on_timeout, "timeout"
+        if result.returncode in self.non_retryable_exit_codes:
+            return False, "exit code"
+        output = f"{result.stderr}\n{result.stdout}"
+        if self._non_retryable is not None and self._non_retryable.search(output):
+            return False, "permanent error"
+        if result.returncode in self.retryable_exit_codes:
+            return True, "exit code"
+        if result.returncode < 0:
+            return self.retry_on_signal, "signal"
+        if self._retryable is not None and self._retryable.search(output):
+            return True, "transient error"
+        return self.retry_unclassified, "unclassified failure"
+
+    def delay(self, retry):
+        """Wait before the given retry (1 = first retry): exponential backoff with jitter"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (retry - 1))
+        return delay * (1.0 - self.jitter * random.random())
+
+
+DEFAULT_POLICIES = {
+    # Shell parancsok: csak felismert átmeneti hibára (a nem nulla kilépési kód többnyire válasz)
+    "shell": RetryPolicy("shell", max_attempts=2),
+    # Csak olvasó hálózati eszközök: több próbálkozás, hosszabb várakozás, de időtúllépésre nem
+    "network": RetryPolicy("network", max_attempts=3, base_delay=0.5, max_delay=10.0,
+                           retry_unclassified=True, max_elapsed=30.0),
+    # Állapotot módosító parancsok: a félbeszakadt futást csak felismert átmeneti hibánál ismételjük
+    "state_changing": RetryPolicy("state_changing", max_attempts=3, base_delay=0.5, max_delay=10.0,
+                                  retry_on_signal=False),
+    # Python kód: a hibák többnyire determinisztikusak, csak átmeneti hibára
+    "code": RetryPolicy("code", max_attempts=2),
+}
+
+
+class RetryPolicies:
+    """Chooses the retry policy of a request by its command class"""
+
+    def __init__(self, policies=None, network_commands=NETWORK_COMMANDS,
+                 state_changing_commands=STATE_CHANGING_COMMANDS):
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.network_commands = set(network_commands)
+        self.state_changing_commands = set(state_changing_commands)
+
+    def for_command(self, cmd):
+        parts = cmd.strip().split(None, 1)
+        base_cmd = parts[0].lower() if parts else ""
+        if base_cmd in self.state_changing_commands or has_side_effects(cmd):
+            return self.policies["state_changing"]
+        return self.policies["network" if base_cmd in self.network_commands else "shell"]
+
+    def for_code(self):
+        return self.policies["code"]
+
+
+async def run_with_retry(operation, policy, description="", on_retry=None):
+    """
+    Run an async operation returning an ExecutionResult, retrying failures per policy.
+
+    Args:
+        operation: Async callable without arguments; called once per attempt
+        policy: RetryPolicy to apply
+        description: Text for the log messages
+        on_retry: Optional callback(policy, reason) called before every retry
+
+    Returns:
+        The result of the last attempt
+    """
+    attempt = 1
+    start = time.monotonic()
+    while True:
+        result = await operation()
+        if result.ok or attempt >= policy.max_attempts:
+            return result
+        retryable, reason = policy.classify(result)
+        if not retryable:
+            return result
+        delay = policy.delay(attempt)
+        if policy.max_elapsed is not None and time.monotonic() - start + delay >= policy.max_elapsed:
+            logger.info(f"Not retrying {description} ({reason}): {policy.max_elapsed:.0f}s retry budget "
+                        f"used up [{policy.name}]")
+            return result
+        logger.info(f"Retrying {description} ({reason}, exit code {result.returncode}), "
+                    f"attempt {attempt + 1}/{policy.max_attempts} in {delay:.2f}s [{policy.name}]")
+        if on_retry is not None:
+            on_retry(policy, reason)
+        # Nem blokkoló várakozás: közben az eseményhurok más kéréseket szolgál ki
+        await asyncio.sleep(delay)
+        attempt += 1
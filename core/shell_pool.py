@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Shell Pool Module
+
+Pool of long-lived shell sessions for CMD: requests that are not in the
+command library. Instead of starting a new subprocess from the server for
+every command (with its pipes and asyncio transport), the command is
+written to an already running shell over its stdin pipe and the output
+is read back until a per-command sentinel line, which also carries the
+exit code:
+
+    setsid /bin/sh -c 'echo hello' </dev/null 2>&1 &
+    __pj=$!; printf '%sP%d\\n' '__PS_<token>__' "$__pj"
+    wait "$__pj"; __ps=$?; kill -9 -"$__pj" 2>/dev/null
+    printf '%s%d\\n' '__PS_<token>__' "$__ps"
+
+The command is always passed as one quoted string (to `sh -c` or
+`eval`), so an unterminated quote or a trailing backslash is a syntax
+error of that command (exit code 2) instead of swallowing the sentinel.
+
+Shared sessions run every command in a child shell of its own (on
+Windows in a child cmd.exe), so nothing a command changes - cwd, exported
+variables, shell options, aliases, functions - is visible to the next
+client. Where setsid(1) is available the child shell also gets its own
+process group, which is killed as soon as the command exits: background
+jobs it left behind cannot write into the next client's output. (Without
+setsid the command runs in a subshell and such jobs are not killed.)
+
+Sessions may instead be pinned to a client (session affinity): their
+commands run in the session shell itself, so `cd` and exported variables
+persist between that client's commands; the command is parsed in a
+subshell first, so a syntax error does not kill the session. Sessions
+that died (e.g. after `exit`), timed out or were killed with a cancelled
+request are replaced automatically and never reused.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import signal
+import time
+import uuid
+from collections import OrderedDict
+
+from core.execution_engine import ExecutionEngine, ExecutionResult, DEFAULT_TIMEOUT, engine_slot
+from core.output_capture import OutputCapture, DEFAULT_HEAD_BYTES, DEFAULT_TAIL_BYTES
+
+logger = logging.getLogger("Shell_Pool")
+
+# Alapértelmezett beállítások
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_AFFINITY_SESSIONS = 32
+_READ_CHUNK = 4096
+_UNSET = object()
+_SETSID = _UNSET
+
+# Munkamenet-állapotot módosító/olvasó parancsok: ezeket mindig a shell kapja
+SESSION_COMMANDS = ("cd", "pwd", "export", "unset", "set", "chdir")
+
+
+def _setsid_path():
+    """Absolute path of setsid(1), or None (computed once)"""
+    global _SETSID
+    if _SETSID is _UNSET:
+        _SETSID = None if os.name == "nt" else shutil.which("setsid")
+    return _SETSID
+
+
+class ShellSession:
+    """One long-lived shell process driven over pipes"""
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.lock = asyncio.Lock()
+        self.runs = 0
+        # A futó (setsid-del indított) parancs folyamatcsoportja
+        self.command_group = None
+        self.killed = False
+
+    @property
+    def alive(self):
+        # A leállított, de még be nem gyűjtött shell sem használható újra
+        return not self.killed and self.proc.returncode is None
+
+    def kill(self):
+        """Kill the shell and the command it runs; the session is never reused afterwards"""
+        self.killed = True
+        if self.command_group is not None:
+            try:
+                os.killpg(self.command_group, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError, OSError):
+                pass
+        ExecutionEngine.kill_process_group(self.proc)
+
+    @classmethod
+    async def start(cls, env=None, cwd=None):
+        kwargs = ExecutionEngine._spawn_kwargs(env=env, cwd=cwd)
+        kwargs["stdin"] = asyncio.subprocess.PIPE
+        kwargs["stderr"] = asyncio.subprocess.STDOUT
+        if os.name == "nt":
+            proc = await asyncio.create_subprocess_exec("cmd.exe", "/Q", "/D", "/K", "prompt=", **kwargs)
+        else:
+            proc = await asyncio.create_subprocess_exec("/bin/sh", **kwargs)
+        return cls(proc)
+
+    @staticmethod
+    def _script(cmd, marker, isolated=False):
+        """Shell input that runs `cmd` and then prints the sentinel with its exit code"""
+        if os.name == "nt":
+            if isolated:
+                # Gyermek cmd.exe: a "cd" és a "set" nem marad meg a munkamenetben
+                cmd = f'cmd /d /s /c "{cmd}"'
+            return f"{cmd} <NUL 2>&1\r\nset __ps=%ERRORLEVEL%\r\necho {marker}%__ps%\r\n"
+        quoted = "'" + cmd.replace("'", "'\\''") + "'"
+        setsid = _setsid_path() if isolated else None
+        if setsid:
+            # Saját folyamatcsoport: a csoport azonosítóját egy jelölősor adja meg,
+            # a parancs végeztével a csoport maradékát (háttérfeladatokat) leállítjuk
+            run = (f"{setsid} /bin/sh -c {quoted} </dev/null 2>&1 &\n"
+                   f"__pj=$!\nprintf '%sP%d\\n' '{marker}' \"$__pj\"\n"
+                   f"wait \"$__pj\"; __ps=$?\nkill -9 -\"$__pj\" 2>/dev/null\n")
+        elif isolated:
+            run = f"( eval {quoted}\n) </dev/null 2>&1\n__ps=$?\n"
+        else:
+            # Szintaxis-ellenőrzés alhéjban (függvénydefinícióként, végrehajtás nélkül):
+            # az eval szintaktikai hibája a munkamenet shelljét is leállítaná
+            check = "'__ps_check() { '" + quoted + "'\n\n}'"
+            run = (f"if ( eval {check} ) </dev/null 2>&1; then\n"
+                   f"{{ eval {quoted}\n}} </dev/null 2>&1; __ps=$?\nelse __ps=2; fi\n")
+        return f"{run}printf '%s%d\\n' '{marker}' \"$__ps\"\n"
+
+    async def run(self, cmd, timeout, head_bytes=DEFAULT_HEAD_BYTES, tail_bytes=DEFAULT_TAIL_BYTES,
+                  isolated=False):
+        """
+        Run one command in this session.
+
+        If isolated is set the command runs in a child shell (in its own
+        process group where setsid is available), so nothing it changes in
+        the shell (cwd, variables, aliases) and no background job it leaves
+        behind leaks to the next client of a shared session.
+
+        Returns:
+            ExecutionResult with the merged stdout/stderr (head and tail kept in
+            memory, the rest spilled to disk, see core.output_capture). On timeout
+            the session is killed; if the shell exits (e.g. `exit`) the collected
+            output is returned.
+        """
+        marker = f"__PS_{uuid.uuid4().hex}__"
+        pattern = re.compile(re.escape(marker.encode()) + rb"(-?\d+)\r?\n")
+        group_pattern = re.compile(re.escape(marker.encode()) + rb"P(\d+)\n")
+        self.command_group = None
+        start = time.monotonic()
+
+        self.proc.stdin.write(self._script(cmd, marker, isolated).encode("utf-8"))
+        await self.proc.stdin.drain()
+        self.runs += 1
+
+        capture = OutputCapture(head_bytes, tail_bytes)
+        buffer = b""
+
+        async def collect():
+            nonlocal buffer
+            while True:
+                data = await self.proc.stdout.read(_READ_CHUNK)
+                if not data:
+                    return None
+                buffer += data
+                if self.command_group is None:
+                    # A csoportazonosító sora a parancs kimenetébe ékelődhet
+                    group = group_pattern.search(buffer)
+                    if group:
+                        self.command_group = int(group.group(1))
+                        buffer = buffer[:group.start()] + buffer[group.end():]
+                match = pattern.search(buffer)
+                if match:
+                    out, code = buffer[:match.start()], int(match.group(1))
+                    buffer = b""
+                else:
+                    # A jelölő darabjait a puffer végén tartjuk, a többi mehet a kimenetbe
+                    keep = len(marker) + 16
+                    out, buffer = buffer[:-keep], buffer[-keep:]
+                    code = None
+                await capture.awrite(out)
+                if code is not None:
+                    return code
+
+        try:
+            returncode = await asyncio.wait_for(collect(), timeout)
+        except asyncio.TimeoutError:
+            self.kill()
+            await self.proc.wait()
+            capture.abort()
+            return ExecutionResult(self.proc.returncode, timed_out=True,
+                                   duration=time.monotonic() - start)
+        except BaseException:
+            capture.abort()
+            raise
+
+        if returncode is None:
+            # A shell kilépett a parancs közben
+            await capture.awrite(buffer)
+            returncode = await self.proc.wait()
+
+        output = await capture.atext()
+        output_ids = {"stdout": capture.output_id} if capture.output_id else None
+        return ExecutionResult(returncode, output, "", duration=time.monotonic() - start, output_ids=output_ids)
+
+    async def close(self):
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), 2)
+        except (asyncio.TimeoutError, OSError):
+            ExecutionEngine.kill_process_group(self.proc)
+            await self.proc.wait()
+
+
+class ShellPool:
+    """
+    Pool of persistent shell sessions.
+
+    Args:
+        size: Number of shared sessions (also the concurrency limit of the shared pool)
+        default_timeout: Timeout in seconds used when a request does not set one
+        affinity: Pin one dedicated session to each client id, so `cd` and
+            exported variables persist within that client
+        max_affinity_sessions: Maximum number of dedicated sessions; the least
+            recently used one is closed beyond this
+        head_bytes, tail_bytes: Output kept in memory per command (the rest is spilled to disk)
+        engine: ExecutionEngine whose concurrency slots the commands share (None = only `size` limits them)
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, default_timeout=DEFAULT_TIMEOUT, affinity=True,
+                 max_affinity_sessions=DEFAULT_MAX_AFFINITY_SESSIONS, head_bytes=DEFAULT_HEAD_BYTES,
+                 tail_bytes=DEFAULT_TAIL_BYTES, env=None, cwd=None, engine=None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.default_timeout = default_timeout
+        self.affinity = affinity
+        self.max_affinity_sessions = max_affinity_sessions
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.env = env
+        self.cwd = cwd
+        self.engine = engine
+
+        self._idle = None
+        self._affinity_sessions = OrderedDict()
+        self.stats = {"runs": 0, "respawned": 0, "timeouts": 0}
+
+    async def _new_session(self):
+        return await ShellSession.start(env=self.env, cwd=self.cwd)
+
+    async def start(self):
+        """Start the shared sessions (called automatically on first use)"""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for session in await asyncio.gather(*(self._new_session() for _ in range(self.size))):
+            self._idle.put_nowait(session)
+        logger.info(f"Shell pool ready with {self.size} sessions")
+
+    async def _affinity_session(self, client_id):
+        session = self._affinity_sessions.get(client_id)
+        if session is None or not session.alive:
+            if session is not None:
+                self.stats["respawned"] += 1
+            session = await self._new_session()
+            self._affinity_sessions[client_id] = session
+            while len(self._affinity_sessions) > self.max_affinity_sessions:
+                _, oldest = self._affinity_sessions.popitem(last=False)
+                asyncio.create_task(oldest.close())
+        self._affinity_sessions.move_to_end(client_id)
+        return session
+
+    async def run(self, cmd, timeout=None, client_id=None):
+        """Run a command on a pooled (or the client's pinned) session"""
+        async with engine_slot(self.engine):
+            return await self._run(cmd, timeout, client_id)
+
+    async def _run(self, cmd, timeout, client_id):
+        timeout = self.default_timeout if timeout is None else timeout
+        self.stats["runs"] += 1
+
+        if self.affinity and client_id is not None:
+            session = await self._affinity_session(client_id)
+            async with session.lock:
+                result = await self._run_on(session, cmd, timeout, isolated=False)
+            if not session.alive:
+                self._affinity_sessions.pop(client_id, None)
+            return result
+
+        await self.start()
+        session = await self._idle.get()
+        try:
+            if not session.alive:
+                self.stats["respawned"] += 1
+                session = await self._new_session()
+            return await self._run_on(session, cmd, timeout, isolated=True)
+        finally:
+            if not session.alive:
+                # Elhalt munkamenet helyett újat indítunk a következő kéréshez
+                self.stats["respawned"] += 1
+                try:
+                    session = await self._new_session()
+                except Exception as e:
+                    logger.error(f"Could not respawn shell session: {e}")
+            self._idle.put_nowait(session)
+
+    async def _run_on(self, session, cmd, timeout, isolated):
+        try:
+            result = await session.run(cmd, timeout, self.head_bytes, self.tail_bytes, isolated)
+        except asyncio.CancelledError:
+            session.kill()
+            # Megvárjuk a leállást: a megölt munkamenet nem kerülhet vissza a sorba
+            await asyncio.shield(session.proc.wait())
+            raise
+        except (ConnectionError, BrokenPipeError) as e:
+            return ExecutionResult(1, stderr=f"Shell session failed: {e}")
+        if result.timed_out:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Shell session timed out after {timeout}s: {cmd[:50]}")
+        return result
+
+    def release_client(self, client_id):
+        """Close the session pinned to a client (e.g. when it disconnects)"""
+        session = self._affinity_sessions.pop(client_id, None)
+        if session is not None:
+            asyncio.create_task(session.close())
+
+    async def close(self):
+        sessions = list(self._affinity_sessions.values())
+        self._affinity_sessions.clear()
+        if self._idle is not None:
+            while not self._idle.empty():
+                sessions.append(self._idle.get_nowait())
+            self._idle = None
+        await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
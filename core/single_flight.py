@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Single Flight Module
+
+Coalescing of identical concurrent executions. When a call arrives while an
+identical one (same key) is still running, it does not start a second
+execution: it waits for the running one and gets the same result (or the
+same exception).
+
+    - SingleFlight: for threads (library commands on the executor threads)
+    - AsyncSingleFlight: for coroutines (CMD requests on the event loop)
+
+Only calls that overlap in time are merged; nothing is remembered after the
+execution finishes (that is the job of core.result_cache). Commands with
+side effects must not be coalesced: two "del x" requests mean two deletions.
+So a shell command line is only coalesced if it is known to be read-only
+(READ_ONLY_SHELL_COMMANDS, without pipes, redirection or chaining);
+anything else - "python deploy.py", "make install", "curl -X POST" - runs
+once per request.
+"""
+
+import logging
+import os
+import shlex
+import threading
+
+logger = logging.getLogger("Single_Flight")
+
+# Csak olvasó shell parancsok, bármilyen argumentummal: csak ezeket vonjuk össze
+READ_ONLY_SHELL_COMMANDS = frozenset((
+    "echo", "printf", "cat", "type", "head", "tail", "wc", "grep", "egrep", "fgrep", "findstr",
+    "ls", "dir", "tree", "stat", "file", "pwd", "whoami", "id", "groups", "uname", "ver", "uptime",
+    "ps", "tasklist", "df", "du", "free", "vmstat", "netstat", "ss", "lsblk", "lscpu", "nproc",
+    "ping", "traceroute", "tracert", "nslookup", "dig", "which", "where", "systeminfo",
+))
+
+# Argumentum nélkül olvasó, argumentummal állapotot is módosíthat ("hostname x", "date -s", "ipconfig /release")
+READ_ONLY_BARE_COMMANDS = frozenset(("hostname", "date", "time", "ipconfig", "ifconfig", "arp"))
+
+# Átirányítás, csővezeték, háttérfuttatás vagy parancsfűzés: nem vonjuk össze
+_SIDE_EFFECT_MARKERS = (">", "<", "|", "&", ";", "`", "$(", "\n")
+
+
+def normalize_command(command):
+    """
+    Coalescing key of a command line: its tokens, so extra whitespace does not
+    matter (quoted arguments are kept as they are).
+    """
+    try:
+        return tuple(shlex.split(command, posix=False))
+    except ValueError:
+        return (command.strip(),)
+
+
+def is_read_only(command):
+    """True if a shell command line is known not to change state (an allowlisted command, no shell operators)"""
+    command = command.strip()
+    if any(marker in command for marker in _SIDE_EFFECT_MARKERS):
+        return False
+    parts = command.split(None, 1)
+    if not parts:
+        return False
+    base = os.path.basename(parts[0].lower().replace("\\", "/"))
+    if base.endswith(".exe"):
+        base = base[:-4]
+    if base in READ_ONLY_BARE_COMMANDS:
+        return len(parts) == 1 or (base == "arp" and parts[1].strip() == "-a")
+    return base in READ_ONLY_SHELL_COMMANDS
+
+
+def has_side_effects(command):
+    """True unless a shell command line is known to be read-only (see is_read_only)"""
+    return not is_read_only(command)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe coalescing of identical concurrent function calls"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        """Run func(*args), or wait for the running call with the same key and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    @property
+    def stats(self):
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalescing of identical concurrent coroutines on one event loop.
+
+    The execution runs as a shared task. A caller that is cancelled stops
+    waiting, but the execution goes on for the others; it is only cancelled
+    when no caller is waiting for it any more.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        """Await factory(), or the running execution with the same key"""
+        import asyncio  # A szálas változat (parancskönyvtár) ne töltse be az asyncio-t
+
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _, key=key, entry=entry: self._finished(key, entry))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                # Senki más nem vár rá: a végrehajtás is leállítható
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _finished(self, key, entry):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+        task = entry[0]
+        if not task.cancelled():
+            task.exception()  # Ne legyen "exception was never retrieved" figyelmeztetés
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    @property
+    def stats(self):
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Supervisor Module
+
+Multi-core mode for the command server. The supervisor starts N worker
+processes, each running its own CommandServer and asyncio loop, all bound
+to the same port with SO_REUSEPORT; the kernel spreads incoming
+connections across them, so JSON parsing, logging and dispatch scale with
+the number of cores.
+
+    - crashed workers are restarted (with a back-off if they keep crashing)
+    - every worker periodically dumps its raw metrics into a shared state
+      directory; the supervisor merges them and serves the aggregate on its
+      own Prometheus endpoint, and INFO:metrics on any worker returns the
+      same aggregate
+    - history is shared through the common SQLite (WAL) history database
+
+SO_REUSEPORT is not available on Windows; there the server runs as a
+single process.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from core.metrics import MetricsRegistry, start_metrics_server
+
+logger = logging.getLogger("Supervisor")
+
+DEFAULT_METRICS_INTERVAL = 2.0  # Munkások metrika-mentési időköze (másodperc)
+_MAX_RESTART_DELAY = 30.0
+
+
+def reuse_port_supported():
+    """True if this platform can bind several sockets to one port (SO_REUSEPORT)"""
+    return hasattr(socket, "SO_REUSEPORT") and os.name != "nt"
+
+
+def metrics_dump_path(state_dir, pid=None):
+    return os.path.join(state_dir, f"metrics-{pid or os.getpid()}.json")
+
+
+def write_metrics_dump(registry, state_dir):
+    """Atomically write this process's raw metrics into the state directory"""
+    path = metrics_dump_path(state_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry.dump(), f)
+    os.replace(tmp_path, path)
+
+
+def read_aggregate_metrics(state_dir):
+    """Merge every worker's metrics dump into one registry"""
+    dumps = []
+    for path in glob.glob(os.path.join(state_dir, "metrics-*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            # Éppen cserélt vagy sérült fájl: a következő körben újra olvassuk
+            continue
+    return MetricsRegistry.merged(dumps)
+
+
+def _worker_main(index, host, port, server_kwargs, state_dir, metrics_interval):
+    """Entry point of one worker process"""
+    from core.command_server import CommandServer
+
+    server = CommandServer(host=host, port=port, reuse_port=True, metrics_state_dir=state_dir,
+                           **server_kwargs)
+
+    async def dump_metrics():
+        while True:
+            try:
+                write_metrics_dump(server.metrics.registry, state_dir)
+            except OSError as e:
+                logger.error(f"Worker {index}: could not write metrics: {e}")
+            await asyncio.sleep(metrics_interval)
+
+    async def run():
+        dumper = asyncio.create_task(dump_metrics())
+        try:
+            await server.start_server()
+        finally:
+            dumper.cancel()
+
+    logger.info(f"Worker {index} started (PID: {os.getpid()})")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+class _WorkerSlot:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+
+
+class Supervisor:
+    """
+    Runs and supervises N CommandServer worker processes on one port.
+
+    Args:
+        workers: Number of worker processes (defaults to the CPU count)
+        host, port: Address shared by every worker
+        metrics_port: Port of the aggregated Prometheus endpoint (None = off)
+        state_dir: Directory for the workers' metrics dumps (temp dir by default)
+        server_kwargs: Extra CommandServer arguments for every worker
+    """
+
+    def __init__(self, workers=None, host="localhost", port=8765, metrics_port=None,
+                 metrics_host="127.0.0.1", state_dir=None, metrics_interval=DEFAULT_METRICS_INTERVAL,
+                 **server_kwargs):
+        if not reuse_port_supported():
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.state_dir = state_dir or tempfile.mkdtemp(prefix="project_s_metrics_")
+        self.metrics_interval = metrics_interval
+        self.server_kwargs = server_kwargs
+        self._slots = [_WorkerSlot(i) for i in range(self.workers)]
+        self._stopping = False
+
+    def _start_worker(self, slot):
+        slot.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(slot.index, self.host, self.port, self.server_kwargs, self.state_dir,
+                  self.metrics_interval),
+            name=f"command-server-{slot.index}",
+            daemon=True,
+        )
+        slot.process.start()
+        slot.started = time.monotonic()
+        logger.info(f"Started worker {slot.index} (PID: {slot.process.pid})")
+
+    def _check_worker(self, slot):
+        """Restart a worker that exited; back off if it keeps crashing right after start"""
+        if slot.process is not None and slot.process.is_alive():
+            return
+        now = time.monotonic()
+        if slot.process is not None:
+            exitcode = slot.process.exitcode
+            logger.warning(f"Worker {slot.index} exited with code {exitcode}")
+            try:
+                # A halott munkás metrikái ne számítsanak tovább
+                os.remove(metrics_dump_path(self.state_dir, slot.process.pid))
+            except OSError:
+                pass
+            uptime = now - slot.started
+            slot.restarts = slot.restarts + 1 if uptime < 10 else 0
+            slot.next_start = now + min(_MAX_RESTART_DELAY, 0.5 * (2 ** slot.restarts)) if slot.restarts else now
+            slot.process = None
+        if now >= slot.next_start:
+            self._start_worker(slot)
+
+    def aggregate_metrics(self):
+        return read_aggregate_metrics(self.state_dir)
+
+    async def run(self):
+        """Start the workers and supervise them until cancelled"""
+        logger.info(f"Starting {self.workers} workers on {self.host}:{self.port} (SO_REUSEPORT)")
+        for slot in self._slots:
+            self._start_worker(slot)
+
+        metrics_server = None
+        if self.metrics_port:
+            proxy = _AggregateRegistry(self)
+            metrics_server = await start_metrics_server(proxy, self.metrics_host, self.metrics_port)
+
+        try:
+            while not self._stopping:
+                for slot in self._slots:
+                    self._check_worker(slot)
+                await asyncio.sleep(0.5)
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            self.stop()
+
+    def stop(self):
+        self._stopping = True
+        for slot in self._slots:
+            if slot.process is not None and slot.process.is_alive():
+                slot.process.terminate()
+        for slot in self._slots:
+            if slot.process is not None:
+                slot.process.join(timeout=5)
+
+
+class _AggregateRegistry:
+    """Registry-like view that re-reads the workers' dumps on every scrape"""
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+
+    def to_prometheus(self):
+        return self.supervisor.aggregate_metrics().to_prometheus()
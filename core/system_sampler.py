@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - System Sampler Module
+
+Background psutil sampler behind the sysinfo, processes, network and
+diskspace library commands. A daemon thread takes a snapshot of the system
+at a fixed interval, so the commands only read the latest snapshot instead
+of querying the OS on every call:
+
+    - every `interval` seconds: CPU, memory, swap and network counters
+    - every `table_interval` seconds: disk usage, the process table and the
+      socket table (the expensive walks); the process table is incremental
+      (core.process_table), so each process record carries its CPU % and
+      I/O rate since the previous walk
+
+The scalar readings are also kept as ring-buffered time series (the last
+`history_seconds`), so trend questions can be answered as well:
+
+    sampler = get_sampler()
+    sampler.snapshot()["cpu_percent"]
+    sampler.window("cpu_percent", 60)    # [(timestamp, value), ...]
+
+CPU usage is measured between two samples, so the value is meaningful
+from the first snapshot on (the first one waits a short priming interval).
+
+One sampler runs per process (get_sampler); it starts on first use.
+"""
+
+import logging
+import os
+import platform
+import threading
+import time
+from collections import deque
+
+from core.process_table import ProcessTable
+
+logger = logging.getLogger("System_Sampler")
+
+DEFAULT_INTERVAL = 1.0          # másodperc
+DEFAULT_TABLE_INTERVAL = 5.0    # folyamat- és kapcsolattábla, lemezek
+DEFAULT_HISTORY_SECONDS = 300
+PRIMING_INTERVAL = 0.1          # az első CPU mérés ennyi ideig tart
+
+# Idősorok a pillanatképek skalár értékeiből
+SERIES = ("cpu_percent", "memory_percent", "swap_percent", "net_sent_rate", "net_recv_rate",
+          "process_count", "connection_count")
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+class RingSeries:
+    """Fixed-size time series of (timestamp, value) pairs; the oldest samples drop out"""
+
+    def __init__(self, maxlen):
+        self._samples = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def append(self, timestamp, value):
+        self._samples.append((timestamp, value))
+
+    @property
+    def latest(self):
+        return self._samples[-1] if self._samples else None
+
+    def window(self, seconds, now=None):
+        """Samples of the last `seconds` seconds, oldest first"""
+        cutoff = (time.time() if now is None else now) - seconds
+        samples = list(self._samples)
+        # A minták időrendben vannak: hátulról keresünk
+        start = len(samples)
+        while start > 0 and samples[start - 1][0] >= cutoff:
+            start -= 1
+        return samples[start:]
+
+
+def summarize_window(samples):
+    """min / avg / max of a window of (timestamp, value) pairs, or None if it is empty"""
+    if not samples:
+        return None
+    values = [value for _, value in samples]
+    return {"min": min(values), "avg": sum(values) / len(values), "max": max(values), "samples": len(values)}
+
+
+class SystemSampler:
+    """
+    Periodic system snapshots on a daemon thread.
+
+    Args:
+        interval: Seconds between CPU / memory / network samples
+        table_interval: Seconds between disk, process table and socket table samples
+        history_seconds: Length of the kept time series
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, table_interval=DEFAULT_TABLE_INTERVAL,
+                 history_seconds=DEFAULT_HISTORY_SECONDS):
+        self.interval = interval
+        self.table_interval = max(interval, table_interval)
+        self.history_seconds = history_seconds
+        size = max(1, int(history_seconds / interval) + 1)
+        self.series = {name: RingSeries(size) for name in SERIES}
+        self.samples_taken = 0
+        self.errors = 0
+        self._snapshot = None
+        self._tables = {"disks": [], "processes": [], "connections": []}
+        self._tables_at = 0.0
+        self._net = None
+        self._static = None
+        self.process_table = ProcessTable()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.pid = os.getpid()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Take the first snapshot (blocking, so answers are available at once) and start the thread"""
+        with self._lock:
+            if self.running:
+                return self
+            self._stop.clear()
+            if self._snapshot is None:
+                self.sample()
+            self._thread = threading.Thread(target=self._loop, name="system-sampler", daemon=True)
+            self._thread.start()
+        logger.info(f"System sampler started (interval {self.interval}s, tables {self.table_interval}s)")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.table_interval + 1)
+            self._thread = None
+
+    def _loop(self):
+        next_run = time.monotonic() + self.interval
+        while not self._stop.wait(max(0.0, next_run - time.monotonic())):
+            next_run += self.interval
+            try:
+                self.sample()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"System sample failed: {e}")
+            if next_run < time.monotonic():
+                # Lemaradtunk (pl. lassú táblabejárás): nem pótoljuk a kimaradt mintákat
+                next_run = time.monotonic() + self.interval
+
+    def _static_info(self, psutil):
+        if self._static is None:
+            self._static = {
+                "node": platform.node(),
+                "system": platform.system(),
+                "release": platform.release(),
+                "processor": platform.processor(),
+                "physical_cores": psutil.cpu_count(logical=False),
+                "logical_cores": psutil.cpu_count(),
+                "boot_time": psutil.boot_time(),
+            }
+        return self._static
+
+    def sample(self):
+        """Take one snapshot now and return it"""
+        import psutil
+
+        now = time.time()
+        first = self._snapshot is None
+        cpu = psutil.cpu_percent(interval=PRIMING_INTERVAL if first else None)
+        mem = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        net = psutil.net_io_counters()
+        sent_rate = recv_rate = 0.0
+        if self._net is not None and net is not None and now > self._net[0]:
+            elapsed = now - self._net[0]
+            sent_rate = max(0.0, (net.bytes_sent - self._net[1].bytes_sent) / elapsed)
+            recv_rate = max(0.0, (net.bytes_recv - self._net[1].bytes_recv) / elapsed)
+        self._net = (now, net) if net is not None else None
+
+        if first or now - self._tables_at >= self.table_interval:
+            self._tables = self._sample_tables(psutil)
+            self._tables_at = now
+
+        snapshot = {
+            "time": now,
+            "cpu_percent": cpu,
+            "memory_total": mem.total,
+            "memory_used": mem.total - mem.available,
+            "memory_percent": mem.percent,
+            "swap_percent": swap.percent,
+            "net_sent_rate": sent_rate,
+            "net_recv_rate": recv_rate,
+            "interfaces": sorted(psutil.net_if_addrs().keys()),
+            "process_count": len(self._tables["processes"]),
+            "connection_count": len(self._tables["connections"]),
+            "tables_time": self._tables_at,
+        }
+        snapshot.update(self._static_info(psutil))
+        snapshot.update(self._tables)
+        for name in SERIES:
+            self.series[name].append(now, snapshot[name])
+        # Egyetlen hivatkozás cseréje: az olvasók mindig teljes pillanatképet látnak
+        self._snapshot = snapshot
+        self.samples_taken += 1
+        return snapshot
+
+    def _sample_tables(self, psutil):
+        disks = []
+        for part in psutil.disk_partitions(all=False):
+            if os.name == "nt" and ("cdrom" in part.opts or part.fstype == ""):
+                continue  # CD-ROM és nem elérhető meghajtók
+            try:
+                usage = psutil.disk_usage(part.mountpoint)
+            except OSError:
+                continue
+            disks.append({"device": part.device, "mountpoint": part.mountpoint, "total": usage.total,
+                          "used": usage.used, "percent": usage.percent})
+
+        processes = self.process_table.refresh()
+
+        connections = []
+        try:
+            for conn in psutil.net_connections(kind="inet"):
+                if conn.laddr and conn.laddr.port:
+                    connections.append({"laddr": f"{conn.laddr.ip}:{conn.laddr.port}",
+                                        "raddr": f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else "*:*",
+                                        "status": conn.status, "pid": conn.pid})
+        except (psutil.AccessDenied, OSError) as e:
+            logger.debug(f"Socket table not available: {e}")
+        return {"disks": disks, "processes": processes, "connections": connections}
+
+    def snapshot(self):
+        """The latest snapshot (a sample is taken now if there is none yet)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot or self.sample()
+        return snapshot
+
+    def window(self, name, seconds):
+        """Samples of one series in the last `seconds` seconds"""
+        return self.series[name].window(seconds)
+
+    @property
+    def stats(self):
+        snapshot = self._snapshot
+        return {"running": self.running, "samples": self.samples_taken, "errors": self.errors,
+                "age": time.time() - snapshot["time"] if snapshot else None}
+
+
+def get_sampler(interval=DEFAULT_INTERVAL, table_interval=DEFAULT_TABLE_INTERVAL,
+                history_seconds=DEFAULT_HISTORY_SECONDS):
+    """The process-wide sampler, started on the first call (later calls ignore the settings)"""
+    global _sampler
+    sampler = _sampler
+    if sampler is None or sampler.pid != os.getpid():
+        with _sampler_lock:
+            if _sampler is None or _sampler.pid != os.getpid():
+                # Fork után a szál nem létezik a gyermekben: új mintavevő kell
+                _sampler = SystemSampler(interval, table_interval, history_seconds).start()
+            sampler = _sampler
+    return sampler
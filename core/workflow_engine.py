@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Project-S - Workflow Engine Module
+
+Executes composite command files (felteteles.json, osszetett_parancsok.json)
+as a dependency graph:
+
+    {"parancsok": [
+        {"id": "gw",   "utasitas": "ping -c 1 192.168.0.1"},
+        {"id": "dns",  "utasitas": "ping -c 1 8.8.8.8"},
+        {"id": "diag", "utasitas": "ip route", "fugg": ["gw", "dns"],
+         "feltetel": {"barmely": [{"lepes": "gw", "sikeres": false},
+                                  {"lepes": "dns", "regex": "100% packet loss"}]}}
+    ], "parallel": 8}
+
+Steps:
+    id        - step name (defaults to the 1-based position)
+    utasitas  - the command (library command, JSON library call or shell command)
+    fugg      - ids of steps that must finish first (fan-in); a step can be
+                the dependency of many others (fan-out)
+    feltetel  - true/false, the id of a step that must have succeeded, or a
+                condition object on earlier results (see evaluate_condition);
+                the steps it references become dependencies automatically
+    cache     - seconds to reuse this command's result across workflow runs
+
+A step without a condition runs only if all its dependencies succeeded; a
+step with a condition runs when the condition holds, whatever the status of
+its dependencies. Independent branches run concurrently (up to "parallel"),
+so a run takes about as long as its critical path, which is reported with
+the results. Identical commands within one run are executed only once,
+unless they have side effects (two "del x" steps mean two deletions).
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+
+from core.single_flight import has_side_effects
+
+logger = logging.getLogger("Workflow_Engine")
+
+DEFAULT_PARALLELISM = 8
+DEFAULT_CACHE_SIZE = 256
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+class WorkflowError(ValueError):
+    """Invalid workflow document (unknown step, cycle, bad condition, ...)"""
+
+
+def _first(data, *keys, default=None):
+    """Value of the first key present (Hungarian and English field names)"""
+    for key in keys:
+        if key in data:
+            return data[key]
+    return default
+
+
+class StepResult:
+    """Outcome of one step"""
+
+    def __init__(self, status, exit_code=None, output="", duration=0.0, started=0.0, cached=False):
+        self.status = status
+        self.exit_code = exit_code
+        self.output = output
+        self.duration = duration
+        self.started = started
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.status == STATUS_OK
+
+    def to_dict(self):
+        return {"status": self.status, "exit_code": self.exit_code, "output": self.output,
+                "duration": round(self.duration, 4), "cached": self.cached}
+
+
+class WorkflowStep:
+    def __init__(self, step_id, command, depends_on=(), condition=None, cache_ttl=0):
+        self.id = step_id
+        self.command = command
+        self.condition = condition
+        self.cache_ttl = cache_ttl
+        self.depends_on = list(dict.fromkeys(list(depends_on) + condition_steps(condition)))
+
+
+def condition_steps(condition):
+    """Ids of the steps a condition refers to"""
+    if isinstance(condition, str):
+        return [condition]
+    if isinstance(condition, list):
+        return [step for item in condition for step in condition_steps(item)]
+    if isinstance(condition, dict):
+        nested = _first(condition, "mind", "all", "barmely", "any", "nem", "not")
+        if nested is not None:
+            return condition_steps(nested)
+        step = _first(condition, "lepes", "step")
+        return [str(step)] if step is not None else []
+    return []
+
+
+def _json_field(output, path):
+    """Value at a dotted path ("a.b.0") in a JSON output; raises KeyError if missing"""
+    value = json.loads(output)
+    for part in str(path).split("."):
+        if isinstance(value, list):
+            value = value[int(part)]
+        elif isinstance(value, dict):
+            value = value[part]
+        else:
+            raise KeyError(part)
+    return value
+
+
+def evaluate_condition(condition, results):
+    """
+    Evaluate a step condition on the results of earlier steps.
+
+    Forms:
+        true / false                      - constant
+        "step_id"                         - that step succeeded
+        {"mind": [...]}, {"barmely": [...]}, {"nem": {...}}   (all / any / not)
+        {"lepes": "id", ...checks}        - every given check must hold:
+            "sikeres": bool               - the step succeeded (or not)
+            "exit_code": n or [n, ...]    - exit code equals / is one of
+            "regex": "pattern"            - the output matches
+            "json": "a.b", "ertek": v     - JSON field in the output equals v
+            "json": "a.b", "letezik": b   - JSON field exists (or not)
+            "json": "a.b"                 - JSON field is truthy
+    """
+    if condition is None or isinstance(condition, bool):
+        return condition is not False
+    if isinstance(condition, str):
+        result = results.get(condition)
+        return result is not None and result.ok
+    if not isinstance(condition, dict):
+        raise WorkflowError(f"Invalid condition: {condition!r}")
+
+    if _first(condition, "mind", "all") is not None:
+        return all(evaluate_condition(c, results) for c in _first(condition, "mind", "all"))
+    if _first(condition, "barmely", "any") is not None:
+        return any(evaluate_condition(c, results) for c in _first(condition, "barmely", "any"))
+    if _first(condition, "nem", "not") is not None:
+        return not evaluate_condition(_first(condition, "nem", "not"), results)
+
+    result = results.get(str(_first(condition, "lepes", "step")))
+    if result is None:
+        return False
+
+    success = _first(condition, "sikeres", "success")
+    if success is not None and result.ok != bool(success):
+        return False
+
+    exit_code = _first(condition, "exit_code")
+    if exit_code is not None:
+        allowed = exit_code if isinstance(exit_code, list) else [exit_code]
+        if result.exit_code not in allowed:
+            return False
+
+    pattern = _first(condition, "regex")
+    if pattern is not None and not re.search(pattern, result.output or "", re.MULTILINE):
+        return False
+
+    path = _first(condition, "json")
+    if path is not None:
+        try:
+            value = _json_field(result.output, path)
+            exists = True
+        except (ValueError, KeyError, IndexError, TypeError):
+            value, exists = None, False
+        expected_exists = _first(condition, "letezik", "exists")
+        if expected_exists is not None:
+            if exists != bool(expected_exists):
+                return False
+        elif "ertek" in condition or "equals" in condition:
+            if not exists or value != _first(condition, "ertek", "equals"):
+                return False
+        elif not value:
+            return False
+
+    return True
+
+
+def _step_id(value, label):
+    """Step id from a document value (string or integer)"""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise WorkflowError(f"{label} must be a string or an integer, got {value!r}")
+    return str(value)
+
+
+def _step_fields(index, item):
+    """(id, command, depends_on, condition, cache_ttl) of one step item, with type checks"""
+    label = f"Step #{index + 1}"
+    if "parancs" in item and "utasitas" not in item:
+        name, params = item["parancs"], item.get("paraméterek", "")
+        if not isinstance(name, str) or not isinstance(params, str):
+            raise WorkflowError(f"{label}: 'parancs' and 'paraméterek' must be strings")
+        # Könyvtári hívás a CMD: JSON formátumában
+        command = json.dumps({"parancs": name, "paraméterek": params}, ensure_ascii=False)
+    else:
+        command = _first(item, "utasitas", "command")
+    if not isinstance(command, str) or not command.strip():
+        raise WorkflowError(f"{label} has no command ('utasitas' must be a non-empty string)")
+
+    step_id = _step_id(_first(item, "id", "nev", default=index + 1), f"{label} id")
+
+    depends_on = _first(item, "fugg", "depends_on", default=[])
+    if not isinstance(depends_on, list):
+        depends_on = [depends_on]
+    depends_on = [_step_id(d, f"Dependency of step '{step_id}'") for d in depends_on]
+
+    cache_ttl = item.get("cache", 0)
+    try:
+        if isinstance(cache_ttl, bool):
+            raise ValueError
+        cache_ttl = float(cache_ttl)
+    except (TypeError, ValueError):
+        raise WorkflowError(f"Step '{step_id}': 'cache' must be a number of seconds, got {cache_ttl!r}")
+
+    return step_id, command, depends_on, _first(item, "feltetel", "condition"), cache_ttl
+
+
+class Workflow:
+    """Validated step graph of a workflow document"""
+
+    def __init__(self, steps, parallelism=DEFAULT_PARALLELISM):
+        self.steps = {step.id: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise WorkflowError("Step ids must be unique")
+        self.parallelism = max(1, parallelism)
+        self._validate()
+
+    @classmethod
+    def from_document(cls, document):
+        """Build a workflow from a {"parancsok": [...]} document"""
+        if not isinstance(document, dict) or not isinstance(document.get("parancsok"), list):
+            raise WorkflowError("Workflow document must be an object with a 'parancsok' list")
+        steps = []
+        for index, item in enumerate(document["parancsok"]):
+            if isinstance(item, str):
+                item = {"utasitas": item}
+            if not isinstance(item, dict):
+                raise WorkflowError(f"Invalid step #{index + 1}: {item!r}")
+            steps.append(WorkflowStep(*_step_fields(index, item)))
+        try:
+            parallelism = int(document.get("parallel", DEFAULT_PARALLELISM))
+        except (TypeError, ValueError):
+            raise WorkflowError(f"Invalid parallel value: {document.get('parallel')!r}")
+        return cls(steps, parallelism)
+
+    def _validate(self):
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise WorkflowError(f"Step '{step.id}' depends on unknown step '{dependency}'")
+        # Körkeresés (Kahn-algoritmus)
+        remaining = {step_id: len(step.depends_on) for step_id, step in self.steps.items()}
+        dependents = {step_id: [] for step_id in self.steps}
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                dependents[dependency].append(step.id)
+        ready = [step_id for step_id, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            step_id = ready.pop()
+            visited += 1
+            for dependent in dependents[step_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if visited != len(self.steps):
+            cyclic = sorted(step_id for step_id, count in remaining.items() if count > 0)
+            raise WorkflowError(f"Dependency cycle between steps: {', '.join(cyclic)}")
+
+
+class StepCache:
+    """Results of successful commands, reused across runs for steps with a "cache" TTL"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, command):
+        entry = self._entries.get(command)
+        if entry is None:
+            return None
+        expires, exit_code, output = entry
+        if expires <= time.monotonic():
+            del self._entries[command]
+            return None
+        return exit_code, output
+
+    def put(self, command, exit_code, output, ttl):
+        if ttl <= 0 or exit_code != 0:
+            return
+        if len(self._entries) >= self.max_entries:
+            # A legkorábban lejáró bejegyzés megy
+            del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+        self._entries[command] = (time.monotonic() + ttl, exit_code, output)
+
+
+class WorkflowEngine:
+    """
+    Runs workflows on the event loop.
+
+    Args:
+        execute: Async callable(command) returning (exit_code, output)
+        cache: StepCache shared between runs (optional)
+        shareable: Callable(command) -> True if identical steps of one run may
+            share one execution (default: commands without side effects)
+    """
+
+    def __init__(self, execute, cache=None, shareable=None):
+        self.execute = execute
+        self.cache = cache if cache is not None else StepCache()
+        self.shareable = shareable or (lambda command: not has_side_effects(command))
+
+    async def run(self, workflow, on_step=None):
+        """
+        Execute a workflow.
+
+        Args:
+            workflow: Workflow to run
+            on_step: Optional async callback(step_id, StepResult) called as each step finishes
+
+        Returns:
+            Summary dict: status, duration, critical_path and the result of every step
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(workflow.parallelism)
+        results = {}
+        finished = {step_id: asyncio.Event() for step_id in workflow.steps}
+        inflight = {}  # Azonos parancs egy futáson belül csak egyszer fut
+
+        async def execute_command(step):
+            cached = self.cache.get(step.command)
+            if cached is not None:
+                return cached[0], cached[1], True
+            if not self.shareable(step.command):
+                exit_code, output = await self._execute(step, semaphore)
+                return exit_code, output, False
+            task = inflight.get(step.command)
+            if task is None:
+                task = inflight[step.command] = asyncio.ensure_future(self._execute(step, semaphore))
+            exit_code, output = await task
+            return exit_code, output, False
+
+        async def run_step(step):
+            for dependency in step.depends_on:
+                await finished[dependency].wait()
+            step_started = time.monotonic()
+            try:
+                if step.condition is not None:
+                    should_run = evaluate_condition(step.condition, results)
+                else:
+                    should_run = all(results[d].ok for d in step.depends_on)
+                if not should_run:
+                    result = StepResult(STATUS_SKIPPED, started=step_started - started)
+                else:
+                    exit_code, output, cached = await execute_command(step)
+                    result = StepResult(STATUS_OK if exit_code == 0 else STATUS_FAILED, exit_code, output,
+                                        time.monotonic() - step_started, step_started - started, cached)
+            except Exception as e:
+                logger.error(f"Workflow step '{step.id}' failed: {e}")
+                result = StepResult(STATUS_FAILED, None, f"Error: {e}", time.monotonic() - step_started,
+                                    step_started - started)
+            results[step.id] = result
+            finished[step.id].set()
+            if on_step is not None:
+                await on_step(step.id, result)
+
+        await asyncio.gather(*(run_step(step) for step in workflow.steps.values()))
+        return self._summary(workflow, results, time.monotonic() - started)
+
+    async def _execute(self, step, semaphore):
+        async with semaphore:
+            exit_code, output = await self.execute(step.command)
+        self.cache.put(step.command, exit_code, output, step.cache_ttl)
+        return exit_code, output
+
+    @staticmethod
+    def critical_path(workflow, results):
+        """The chain of dependencies that ended last (it determined the total run time)"""
+        if not results:
+            return []
+        finish = {step_id: r.started + r.duration for step_id, r in results.items()}
+        step_id = max(finish, key=finish.get)
+        path = [step_id]
+        while workflow.steps[step_id].depends_on:
+            step_id = max(workflow.steps[step_id].depends_on, key=finish.get)
+            path.append(step_id)
+        return list(reversed(path))
+
+    def _summary(self, workflow, results, duration):
+        failed = [step_id for step_id, r in results.items() if r.status == STATUS_FAILED]
+        succeeded = [step_id for step_id, r in results.items() if r.ok]
+        if not failed:
+            status = STATUS_OK
+        elif not succeeded:
+            status = STATUS_FAILED
+        else:
+            status = "partial"
+        return {
+            "status": status,
+            "duration": round(duration, 4),
+            "succeeded": len(succeeded),
+            "failed": len(failed),
+            "skipped": len(results) - len(succeeded) - len(failed),
+            "critical_path": self.critical_path(workflow, results),
+            "steps": {step_id: results[step_id].to_dict() for step_id in workflow.steps},
+        }
@@ -4,15 +4,10 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any
 import json
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("replay_manager.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+from core.logging_setup import setup_logging
+
+# Configure logging (non-blocking, see core.logging_setup)
+setup_logging("replay_manager.log")
 
 logger = logging.getLogger("Replay_Manager")
 
@@ -22,10 +17,15 @@ class ReplayManager:
     Handles automatic retries and command validation.
     """
     
-    def __init__(self, max_history_size: int = 10, max_retries: int = 3, retry_cooldown: float = 1.0):
+    def __init__(self, max_history_size: int = 10, max_retries: int = 3, retry_cooldown: float = 1.0,
+                 history_store=None, source: str = "replay_manager"):
         self.max_history_size = max_history_size
         self.max_retries = max_retries
         self.retry_cooldown = retry_cooldown
+        # Opcionális tartós tároló (core.history_store.HistoryStore), közös a szerverrel;
+        # a sorszámok csak a saját (source) bejegyzéseinket számolják
+        self.history_store = history_store
+        self.source = source
         
         self.command_history: List[Dict[str, Any]] = []
         self.failed_commands: Dict[str, int] = {}
@@ -54,7 +54,7 @@ class ReplayManager:
     
     def add_command(self, command: str, response: str, success: bool = True) -> None:
         """
-        Add a command and its response to history.
+        Add a finished command and its response to history (call once per command).
         
         Args:
             command: The executed command
@@ -76,6 +76,24 @@ class ReplayManager:
         if len(self.command_history) > self.max_history_size:
             self.command_history.pop()
         
+        if self.history_store is not None:
+            self.history_store.add(command, response, success=success, source=self.source)
+        
+        self.track_result(command, success)
+        
+        logger.info(f"Command added to history: {command[:50]}...")
+        
+        # Log to journal
+        self.log_to_journal(command, response, success)
+    
+    def track_result(self, command: str, success: bool) -> None:
+        """
+        Update the retry tracking of a command without adding a history entry.
+        
+        Args:
+            command: The executed command
+            success: Whether the command executed successfully
+        """
         # Update execution tracking
         self.last_execution[command] = time.time()
         
@@ -85,11 +103,24 @@ class ReplayManager:
         else:
             # Clear failed attempts on success
             self.failed_commands.pop(command, None)
+    
+    def recent_commands(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The most recent history entries, newest first.
         
-        logger.info(f"Command added to history: {command[:50]}...")
-        
-        # Log to journal
-        self.log_to_journal(command, response, success)
+        Args:
+            limit: Maximum number of entries (default: max_history_size)
+        """
+        limit = self.max_history_size if limit is None else limit
+        if self.history_store is not None:
+            return self.history_store.recent(limit=limit, source=self.source)
+        return self.command_history[:limit]
+    
+    def history_size(self) -> int:
+        """Number of entries REPLAY indices can refer to"""
+        if self.history_store is not None:
+            return self.history_store.count(source=self.source)
+        return len(self.command_history)
     
     def get_command(self, index: int) -> Optional[Dict[str, Any]]:
         """
@@ -102,6 +133,10 @@ class ReplayManager:
             The command entry or None if not found
         """
         try:
+            if self.history_store is not None:
+                # A tartós tároló a teljes előzményt tartalmazza, nem csak az utolsó tízet
+                return self.history_store.nth_recent(index, source=self.source)
+            
             # Convert to 0-based index
             actual_index = index - 1
             if 0 <= actual_index < len(self.command_history):
@@ -165,7 +200,7 @@ class ReplayManager:
         if command.startswith("REPLAY:"):
             try:
                 index = int(command.split(":")[1].strip())
-                if index < 1 or index > len(self.command_history):
+                if index < 1 or index > self.history_size():
                     return False
             except (ValueError, IndexError):
                 return False
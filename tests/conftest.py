@@ -0,0 +1,10 @@
+"""
+Project-S - Test configuration
+
+Logging is set up console-only before any module calls setup_logging(),
+so importing core.command_server does not create command_server.log.
+"""
+
+from core.logging_setup import setup_logging
+
+setup_logging(console=False)
@@ -0,0 +1,86 @@
+"""
+Project-S - Admission Tests
+
+Tickets of requests cancelled before they get a concurrency slot must
+not stay counted as pending.
+"""
+
+import asyncio
+import json
+
+from core.admission import AdmissionController
+
+
+def test_release_is_idempotent():
+    admission = AdmissionController()
+    ticket = admission.reserve("client", "CMD")
+
+    admission.release(ticket)
+    admission.release(ticket)
+
+    assert admission.pending == 0
+
+
+def test_ticket_cancelled_while_queued_for_a_slot_is_released():
+    admission = AdmissionController(type_limits={"CMD": 1})
+
+    async def request(ticket, started):
+        async with admission.slot(ticket):
+            started.set()
+            await asyncio.sleep(30)
+
+    async def run():
+        first = admission.reserve("client", "CMD")
+        started = asyncio.Event()
+        running = asyncio.create_task(request(first, started))
+        await started.wait()
+        # Ezek a slot() szemaforján várakoznak
+        queued = [asyncio.create_task(request(admission.reserve("client", "CMD"), asyncio.Event()))
+                  for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert admission.pending == 4
+        for task in queued + [running]:
+            task.cancel()
+        await asyncio.gather(*queued, running, return_exceptions=True)
+
+    asyncio.run(run())
+    assert admission.pending == 0
+
+
+class FakeWebSocket:
+    """Just enough of a websockets connection for CommandServer.command_handler"""
+
+    remote_address = ("127.0.0.1", 50000)
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            raise StopAsyncIteration
+        return self.messages.pop(0)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+def test_disconnect_releases_tickets_of_requests_that_never_started():
+    from core.command_server import CommandServer
+
+    async def run():
+        server = CommandServer(shell_pool_size=0, code_pool_size=0, history_path=":memory:",
+                               sample_interval=0)
+        messages = [json.dumps({"id": str(i), "type": "CMD", "payload": f"sleep 3{i}"}) for i in range(5)]
+        try:
+            # A kapcsolat az utolsó üzenet után bezárul, a még el sem indult taskok leállnak
+            await server.command_handler(FakeWebSocket(messages))
+            await asyncio.sleep(0.1)
+            return server.admission.pending
+        finally:
+            server.history.close()
+
+    assert asyncio.run(asyncio.wait_for(run(), 10)) == 0
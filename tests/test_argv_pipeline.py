@@ -0,0 +1,92 @@
+"""
+Project-S - Argv Pipeline Tests
+
+Parsing of library command templates, the in-process pipeline stages
+and shell-free execution of templates.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+from core.argv_pipeline import PipelineError, parse_command_template
+from core.command_library import _execute_template, _execute_template_async
+
+
+def run_stages(template, text, chunk_size=None):
+    line_filter = parse_command_template(template).line_filter()
+    data = text.encode("utf-8")
+    chunk_size = chunk_size or len(data) or 1
+    output = b"".join(line_filter.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size))
+    return (output + line_filter.close()).decode("utf-8")
+
+
+@pytest.mark.parametrize("template, expected", [
+    ("prog | grep -i ERROR", "error 1\nERROR 3\n"),
+    ("prog | grep -v error", "ok 2\nERROR 3\nwarn 10\n"),
+    ("prog | grep -F 1.", ""),
+    ("prog | grep r.o", "error 1\n"),
+    ("prog | findstr /I error", "error 1\nERROR 3\n"),
+    ("prog | find \"ok\"", "ok 2\n"),
+    ("prog | head -n 2", "error 1\nok 2\n"),
+    ("prog | tail 1", "warn 10\n"),
+    ("prog | grep -i error | wc -l", "2\n"),
+    ("prog | sort", "ERROR 3\nerror 1\nok 2\nwarn 10\n"),
+    ("prog | sort -r | head 1", "warn 10\n"),
+])
+def test_stages_filter_the_output_line_by_line(template, expected):
+    text = "error 1\nok 2\nERROR 3\nwarn 10"
+
+    assert run_stages(template, text) == expected
+    # A bájtok bármilyen darabolásban érkezhetnek
+    assert run_stages(template, text, chunk_size=3) == expected
+
+
+def test_numeric_sort_and_uniq():
+    assert run_stages("prog | sort -n | uniq", "10\n9\n9\n100\nx\n") == "9\n10\n100\nx\n"
+
+
+def test_multibyte_characters_split_across_chunks():
+    assert run_stages("prog | grep ő", "árvíztűrő\nfúrógép\n", chunk_size=1) == "árvíztűrő\n"
+
+
+def test_buffering_stage_output_passes_the_later_stages():
+    assert run_stages("prog | tail 3 | grep a", "a1\nb2\na3\nb4\na5\n") == "a3\na5\n"
+
+
+def test_arguments_replace_the_placeholder_and_stay_plain_argv():
+    template = parse_command_template("ping -c 1 {args} -q")
+
+    assert template.argv("host") == ["ping", "-c", "1", "host", "-q"]
+    assert parse_command_template("echo").argv('"a b" ; rm -rf x | y') == ["echo", "a b", ";", "rm", "-rf",
+                                                                          "x", "|", "y"]
+
+
+@pytest.mark.parametrize("template", [
+    "netstat -ano > out.txt",
+    "echo a; rm x",
+    "prog | xargs rm",
+    "prog | sort -u",
+    "prog | grep",
+    "prog | grep (",
+    "prog || grep x",
+    "prog 'unbalanced",
+    "",
+])
+def test_unsupported_templates_are_rejected(template):
+    with pytest.raises(PipelineError):
+        parse_command_template(template)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX programs")
+def test_templates_run_without_a_shell(tmp_path):
+    marker = tmp_path / "created"
+
+    echoed = _execute_template("echo", f"one; touch {marker}")
+    filtered = asyncio.run(_execute_template_async("printf {args} | grep b | wc -l", r"'a\nb\nab\n'"))
+
+    assert echoed == f"one; touch {marker}"
+    assert not os.path.exists(marker)
+    assert filtered == "2"
@@ -0,0 +1,133 @@
+"""
+Project-S - Command Server Tests
+
+Server-wide limits shared by the execution engine, the pools and the
+command library.
+"""
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from core.command_library import _execute_command_async
+from core.command_server import CommandServer
+from core.execution_engine import ExecutionEngine, shared_engine
+
+
+def make_server(**options):
+    options.setdefault("history_path", ":memory:")
+    options.setdefault("sample_interval", 0)
+    return CommandServer(**options)
+
+
+def run_with_server(server, coroutine_factory):
+    async def run():
+        try:
+            return await coroutine_factory(server)
+        finally:
+            if server.shell_pool is not None:
+                await server.shell_pool.close()
+            if server.code_pool is not None:
+                await server.code_pool.close()
+            server.history.close()
+    return asyncio.run(asyncio.wait_for(run(), 30))
+
+
+def measure_peak(engine, coroutines):
+    """Run coroutines concurrently; returns (results, peak engine.active, elapsed seconds)"""
+    async def run():
+        peak = 0
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, engine.active)
+                await asyncio.sleep(0.01)
+
+        watcher = asyncio.create_task(watch())
+        start = time.monotonic()
+        try:
+            results = await asyncio.gather(*coroutines)
+        finally:
+            watcher.cancel()
+        return results, peak, time.monotonic() - start
+    return run()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses the POSIX shell pool")
+def test_shell_pool_commands_share_max_concurrency():
+    server = make_server(max_concurrency=2, shell_pool_size=4, code_pool_size=0)
+
+    results, peak, elapsed = run_with_server(server, lambda s: measure_peak(
+        s.engine, [s.handle_cmd(f"sleep 0.3; echo {i}") for i in range(4)]))
+
+    assert sorted(r.strip() for r in results) == ["0", "1", "2", "3"]
+    assert peak == 2
+    assert elapsed >= 0.55
+
+
+def test_code_pool_runs_share_max_concurrency():
+    server = make_server(max_concurrency=1, shell_pool_size=0, code_pool_size=2)
+
+    results, peak, elapsed = run_with_server(server, lambda s: measure_peak(
+        s.engine, [s.handle_code("import time; time.sleep(0.3); print('done')") for _ in range(2)]))
+
+    assert all("done" in r for r in results)
+    assert peak == 1
+    assert elapsed >= 0.55
+
+
+def test_library_subprocesses_take_a_slot_of_the_shared_engine():
+    engine = ExecutionEngine(max_concurrency=1)
+    command = f'"{sys.executable}" -c "import time; time.sleep(0.3); print(1)"'
+
+    async def run():
+        token = shared_engine.set(engine)
+        try:
+            return await measure_peak(engine, [_execute_command_async(command) for _ in range(3)])
+        finally:
+            shared_engine.reset(token)
+
+    results, peak, elapsed = asyncio.run(run())
+
+    assert all(r.strip() == "1" for r in results)
+    assert peak == 1
+    assert elapsed >= 0.85
+
+
+def test_replay_reads_history_off_the_event_loop(monkeypatch):
+    server = make_server(shell_pool_size=0, code_pool_size=0)
+    nth_recent = server.history.nth_recent
+
+    def slow_nth_recent(n, source=None):
+        time.sleep(0.5)
+        return nth_recent(n, source)
+
+    monkeypatch.setattr(server.history, "nth_recent", slow_nth_recent)
+
+    async def scenario(s):
+        await s.execute_message("INFO:version")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        try:
+            replayed = await s.execute_message("REPLAY:1")
+            missing = await s.execute_message("REPLAY:99")
+        finally:
+            ticker.cancel()
+        return replayed, missing, ticks
+
+    replayed, missing, ticks = run_with_server(server, scenario)
+
+    assert not replayed.startswith(("Invalid", "Error"))
+    assert missing.startswith("Invalid REPLAY index: 99. History size: 1")
+    # A lassú olvasás alatt is forgott az eseményhurok
+    assert ticks >= 40
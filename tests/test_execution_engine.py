@@ -0,0 +1,128 @@
+"""
+Project-S - Execution Engine Tests
+
+Concurrency limit and timeout handling of core.execution_engine.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from core.execution_engine import ExecutionEngine
+
+
+def sleep_command(seconds):
+    return f'"{sys.executable}" -c "import time; time.sleep({seconds})"'
+
+
+def assert_process_gone(pid, wait=5):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.05)
+    pytest.fail(f"background child {pid} survived the timeout")
+
+
+def test_concurrent_commands_finish_in_about_one_duration():
+    engine = ExecutionEngine(max_concurrency=4)
+
+    async def run():
+        return await asyncio.gather(*(engine.run_shell(sleep_command(0.5)) for _ in range(4)))
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    elapsed = time.monotonic() - start
+
+    assert all(result.ok for result in results)
+    assert elapsed < 1.5
+
+
+def test_max_concurrency_is_never_exceeded():
+    engine = ExecutionEngine(max_concurrency=2)
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, engine.active)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        watcher = asyncio.create_task(watch())
+        try:
+            return await asyncio.gather(*(engine.run_shell(sleep_command(0.3)) for _ in range(6)))
+        finally:
+            watcher.cancel()
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    elapsed = time.monotonic() - start
+
+    assert all(result.ok for result in results)
+    assert peak == 2
+    # Három kör, egyenként 0,3 s
+    assert elapsed >= 0.85
+    assert engine.active == 0
+
+
+def test_timeout_returns_timed_out_result():
+    engine = ExecutionEngine(default_timeout=0.5)
+
+    start = time.monotonic()
+    result = asyncio.run(engine.run_shell(sleep_command(30)))
+
+    assert result.timed_out
+    assert not result.ok
+    assert time.monotonic() - start < 5
+    assert engine.active == 0
+
+
+@pytest.mark.skipif(os.name == "nt", reason="process groups are POSIX-only here")
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # A háttérben futó unokafolyamatnak is le kell állnia
+    cmd = f"sleep 30 & echo $! > {pid_file}; wait"
+    engine = ExecutionEngine()
+
+    result = asyncio.run(engine.run_shell(cmd, timeout=0.5))
+
+    assert result.timed_out
+    assert_process_gone(int(pid_file.read_text()))
+
+
+def test_cancelled_request_releases_its_slot():
+    engine = ExecutionEngine(max_concurrency=1)
+
+    async def run():
+        task = asyncio.create_task(engine.run_shell(sleep_command(30)))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await engine.run_shell(sleep_command(0))
+
+    result = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert result.ok
+    assert engine.active == 0
+
+
+@pytest.mark.skipif(os.name == "nt", reason="process groups are POSIX-only here")
+def test_timeout_kills_background_children_after_the_leader_exited(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # A vezető shell azonnal kilép, de a háttérfolyamat nyitva tartja a pipe-okat
+    cmd = f"sleep 30 & echo $! > {pid_file}; echo hi"
+    engine = ExecutionEngine()
+
+    start = time.monotonic()
+    result = asyncio.run(engine.run_shell(cmd, timeout=0.5))
+
+    assert result.timed_out
+    assert time.monotonic() - start < 5
+    assert_process_gone(int(pid_file.read_text()))
@@ -0,0 +1,52 @@
+"""
+Project-S - File Transfer Tests
+
+Range reads of a file that is truncated while it is being read.
+"""
+
+import pytest
+
+from core.file_transfer import FileRange, TransferError
+
+
+@pytest.fixture
+def big_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 4096)  # 1 MiB
+    return path
+
+
+def test_full_read_returns_the_requested_window(big_file):
+    with FileRange(str(big_file), offset=100, length=1000) as file_range:
+        data = file_range.read()
+
+    assert data == big_file.read_bytes()[100:1100]
+
+
+def test_truncation_during_chunked_read_raises_transfer_error(big_file):
+    received = 0
+    with FileRange(str(big_file)) as file_range:
+        with pytest.raises(TransferError) as excinfo:
+            for offset, chunk in file_range.chunks(64 * 1024):
+                received += len(chunk)
+                if offset == 0:
+                    # Mint a logrotate copytruncate: a fájl olvasás közben rövidül meg
+                    with open(big_file, "r+b") as f:
+                        f.truncate(100 * 1024)
+
+    assert received == 64 * 1024
+    assert "shorter than expected" in str(excinfo.value)
+    assert excinfo.value.details["offset"] == 100 * 1024
+
+
+def test_truncation_before_read_raises_transfer_error(big_file):
+    file_range = FileRange(str(big_file))
+    big_file.write_bytes(b"")
+
+    with file_range, pytest.raises(TransferError):
+        file_range.read()
+
+
+def test_offset_beyond_end_is_rejected(big_file):
+    with pytest.raises(TransferError):
+        FileRange(str(big_file), offset=2 * 1024 * 1024)
@@ -0,0 +1,89 @@
+"""
+Project-S - History Store Tests
+
+Indexed lookups (prefix, substring, time range), retention and
+durability of the SQLite command history.
+"""
+
+import pytest
+
+import core.history_store as history_store
+from core.history_store import HistoryStore
+
+
+@pytest.fixture
+def store():
+    history = HistoryStore(":memory:")
+    yield history
+    history.close()
+
+
+def commands(entries):
+    return [entry["command"] for entry in entries]
+
+
+def test_prefix_search_returns_newest_first(store):
+    for command in ("CMD: dir", "CODE: print(1)", "CMD: ls -la", "CMDX"):
+        store.add(command)
+
+    assert commands(store.search_prefix("CMD: ")) == ["CMD: ls -la", "CMD: dir"]
+    assert commands(store.search_prefix("CMD: ", limit=1)) == ["CMD: ls -la"]
+
+
+@pytest.mark.parametrize("use_fts", [True, False])
+def test_substring_search_with_and_without_the_fts_index(store, use_fts):
+    if use_fts and not store.fts:
+        pytest.skip("SQLite without fts5 trigram support")
+    store.fts = use_fts
+    for command in ("CMD: git status", "CMD: echo 100%_done", "CODE: status = 1", "CMD: dir"):
+        store.add(command)
+
+    assert commands(store.search("status")) == ["CODE: status = 1", "CMD: git status"]
+    # A LIKE helyettesítő karakterei szó szerint értendők
+    assert commands(store.search("0%_")) == ["CMD: echo 100%_done"]
+    assert commands(store.search("%")) == ["CMD: echo 100%_done"]
+
+
+def test_time_range_is_half_open_and_oldest_first(store):
+    for ts in (100, 200, 300, 400):
+        store.add(f"CMD: at {ts}", timestamp=ts)
+
+    assert commands(store.time_range(200, 400)) == ["CMD: at 200", "CMD: at 300"]
+    assert commands(store.time_range(end=200)) == ["CMD: at 100"]
+    assert commands(store.time_range(start=350)) == ["CMD: at 400"]
+
+
+def test_long_responses_are_capped(store):
+    store.add("CMD: big", "x" * 5000)
+
+    response = store.nth_recent(1)["response"]
+    assert response.startswith("x" * 4096)
+    assert "904 more characters not stored" in response
+
+
+def test_oldest_entries_are_pruned(monkeypatch):
+    monkeypatch.setattr(history_store, "PRUNE_INTERVAL", 4)
+    store = HistoryStore(":memory:", max_entries=3)
+    try:
+        for i in range(8):
+            store.add(f"CMD: {i}")
+
+        assert store.count() == 3
+        assert commands(store.recent()) == ["CMD: 7", "CMD: 6", "CMD: 5"]
+    finally:
+        store.close()
+
+
+def test_history_survives_a_restart_and_is_pruned_on_open(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    for i in range(5):
+        store.add(f"CMD: {i}", source="server")
+    store.close()
+
+    reopened = HistoryStore(path, max_entries=2)
+    try:
+        assert commands(reopened.recent()) == ["CMD: 4", "CMD: 3"]
+        assert reopened.nth_recent(2, source="server")["command"] == "CMD: 3"
+    finally:
+        reopened.close()
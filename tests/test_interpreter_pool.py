@@ -0,0 +1,72 @@
+"""
+Project-S - Interpreter Pool Tests
+
+Warm code workers: captured output, state reset between runs, and
+replacement of workers that were recycled, timed out or crashed.
+"""
+
+import asyncio
+
+from core.interpreter_pool import InterpreterPool
+
+
+def run_pool(scenario, **options):
+    async def run():
+        pool = InterpreterPool(**options)
+        try:
+            return await scenario(pool)
+        finally:
+            await pool.close()
+    return asyncio.run(asyncio.wait_for(run(), 60))
+
+
+def test_output_of_print_and_child_processes_is_captured():
+    async def scenario(pool):
+        return await pool.run("import os, sys\nprint('hello')\nprint('warn', file=sys.stderr)\n"
+                              "os.system('echo from child')\nraise SystemExit(4)")
+
+    result = run_pool(scenario, size=1)
+
+    assert sorted(result.stdout.splitlines()) == ["from child", "hello"]
+    assert result.stderr.strip() == "warn"
+    assert result.returncode == 4
+
+
+def test_environment_and_namespace_do_not_leak_between_runs(tmp_path):
+    async def scenario(pool):
+        await pool.run(f"import os\nos.environ['LEAK'] = '1'\nos.chdir({str(tmp_path)!r})\nleak = 1")
+        return await pool.run("import os\nprint(os.environ.get('LEAK'), os.getcwd() == "
+                              f"{str(tmp_path)!r}, 'leak' in globals())")
+
+    result = run_pool(scenario, size=1)
+
+    assert result.stdout.strip() == "None False False"
+
+
+def test_worker_is_recycled_after_max_runs():
+    async def scenario(pool):
+        pids = []
+        for _ in range(3):
+            result = await pool.run("import os\nprint(os.getpid())")
+            pids.append(int(result.stdout))
+        return pids, pool.stats["recycled"]
+
+    pids, recycled = run_pool(scenario, size=1, max_runs=2)
+
+    assert pids[0] == pids[1] != pids[2]
+    assert recycled == 1
+
+
+def test_timed_out_and_crashed_workers_are_replaced():
+    async def scenario(pool):
+        timed_out = await pool.run("import time\ntime.sleep(30)", timeout=0.5)
+        crashed = await pool.run("import os\nos._exit(9)")
+        after = await pool.run("print('still serving')")
+        return timed_out, crashed, after, pool.stats
+
+    timed_out, crashed, after, stats = run_pool(scenario, size=1)
+
+    assert timed_out.timed_out
+    assert crashed.returncode != 0 and "Code worker failed" in crashed.stderr
+    assert after.stdout.strip() == "still serving"
+    assert stats["timeouts"] == 1 and stats["crashed"] == 1
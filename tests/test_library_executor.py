@@ -0,0 +1,77 @@
+"""
+Project-S - Library Executor Tests
+
+Dispatch of library commands by execution kind: inline, thread pool,
+natively awaited, and CPU-bound commands on the process pool.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from core.command_library import COMMAND_LIBRARY, KIND_CPU, KIND_IO, KIND_TRIVIAL
+from core.library_executor import LibraryExecutor
+
+
+def _where(args=""):
+    """Process and thread the command ran in (plus a bit of pure-Python work)"""
+    total = sum(i * i for i in range(20000))
+    return f"{os.getpid()} {threading.current_thread().name} {total > 0}"
+
+
+@pytest.fixture
+def where_commands():
+    names = {"test_where_trivial": KIND_TRIVIAL, "test_where_io": KIND_IO, "test_where_cpu": KIND_CPU}
+    for name, kind in names.items():
+        COMMAND_LIBRARY.register(name, _where, kind=kind, replace=True)
+    yield names
+    for name in names:
+        COMMAND_LIBRARY._specs.pop(name, None)
+
+
+def call(executor, command_id):
+    async def run():
+        try:
+            return await executor.call(command_id)
+        finally:
+            executor.shutdown()
+    pid, thread, worked = asyncio.run(run()).split()
+    return int(pid), thread, worked
+
+
+def test_trivial_and_io_commands_run_in_this_process(where_commands):
+    pid, thread, _ = call(LibraryExecutor(process_workers=0), "test_where_trivial")
+    assert (pid, thread) == (os.getpid(), "MainThread")
+
+    pid, thread, _ = call(LibraryExecutor(process_workers=0), "test_where_io")
+    assert pid == os.getpid() and thread.startswith("library")
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the test command is only registered in forked workers")
+def test_cpu_bound_commands_run_on_the_process_pool(where_commands):
+    pid, _, worked = call(LibraryExecutor(process_workers=1), "test_where_cpu")
+
+    assert pid != os.getpid()
+    assert worked == "True"
+
+
+def test_cpu_bound_commands_fall_back_to_threads(where_commands, monkeypatch):
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("no processes here")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    executor = LibraryExecutor(process_workers=1)
+    monkeypatch.setattr(executor, "_process_pool", lambda: BrokenPool() if executor.process_workers else None)
+
+    pid, thread, _ = call(executor, "test_where_cpu")
+
+    assert pid == os.getpid() and thread.startswith("library")
+    assert executor.process_workers == 0
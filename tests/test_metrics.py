@@ -0,0 +1,90 @@
+"""
+Project-S - Metrics Tests
+
+Histogram percentiles, merging across worker processes, the Prometheus
+text format and the HTTP endpoint.
+"""
+
+import asyncio
+
+import pytest
+
+from core.metrics import Histogram, MetricsRegistry, ServerMetrics, start_metrics_server
+
+
+def test_percentiles_are_interpolated_within_buckets():
+    histogram = Histogram("latency", "test", buckets=(1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+
+    (series,) = histogram.snapshot()
+    assert series["count"] == 4 and series["sum"] == 6.5 and series["max"] == 3.0
+    assert series["p50"] == pytest.approx(1.5)
+    assert series["p99"] == pytest.approx(2 + (3.0 - 2) * 0.96)
+
+
+def test_percentiles_never_exceed_the_largest_value():
+    histogram = Histogram("latency", "test", buckets=(1, 10))
+    histogram.observe(2.0)
+
+    (series,) = histogram.snapshot()
+    assert series["p50"] <= 2.0 and series["p99"] <= 2.0
+
+
+def test_dumps_of_several_workers_are_summed():
+    first, second = ServerMetrics(), ServerMetrics()
+    first.observe_request("CMD", "subprocess", 0.001, 0.2, 100)
+    second.observe_request("CMD", "subprocess", 0.002, 0.4, 300)
+    second.observe_rejection("CMD", "rate")
+
+    merged = MetricsRegistry.merged([first.registry.dump(), second.registry.dump()]).snapshot()
+
+    (requests,) = merged["command_server_requests_total"]["values"]
+    assert requests == {"labels": {"path": "subprocess", "type": "CMD"}, "value": 2}
+    (execution,) = merged["command_server_execution_seconds"]["values"]
+    assert execution["count"] == 2 and execution["sum"] == pytest.approx(0.6)
+    assert merged["command_server_rejected_total"]["values"][0]["value"] == 1
+
+
+def test_prometheus_exposition_has_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Request latency", buckets=(0.1, 1))
+    histogram.observe(0.05, {"type": "CMD"})
+    histogram.observe(0.5, {"type": "CMD"})
+    registry.counter("requests_total", "Requests").inc({"type": "CMD"})
+
+    lines = registry.to_prometheus().splitlines()
+
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{type="CMD",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{type="CMD",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{type="CMD",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{type="CMD"} 2' in lines
+    assert 'requests_total{type="CMD"} 1' in lines
+
+
+def test_metrics_endpoint_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests").inc()
+
+    async def fetch(port, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+        response = await reader.read()
+        writer.close()
+        return response.decode("utf-8")
+
+    async def run():
+        server = await start_metrics_server(registry, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await fetch(port, "/metrics"), await fetch(port, "/other")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    metrics, missing = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert metrics.startswith("HTTP/1.1 200 OK")
+    assert metrics.endswith("requests_total 1\n")
+    assert missing.startswith("HTTP/1.1 404")
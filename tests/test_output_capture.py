@@ -0,0 +1,89 @@
+"""
+Project-S - Output Capture Tests
+
+Head + tail capture with spill to disk; the spill file work of awrite()
+and atext() stays off the event loop.
+"""
+
+import asyncio
+import threading
+import time
+
+import core.output_capture as output_capture
+from core.output_capture import OutputCapture, read_output
+
+
+def test_truncated_output_names_its_spill_file(tmp_path):
+    capture = OutputCapture(head_bytes=4, tail_bytes=4, directory=str(tmp_path))
+    for chunk in (b"abcd", b"efgh", b"ijkl", b"mnop"):
+        capture.write(chunk)
+
+    text = capture.text()
+    output_capture._compressor.submit(lambda: None).result(5)
+
+    assert text == f"abcd\n... [8 bytes omitted, full output: output {capture.output_id}] ...\nmnop"
+    assert read_output(capture.output_id, 2, 8, directory=str(tmp_path)) == (b"cdefghij", True)
+
+
+def test_output_that_fits_leaves_no_file(tmp_path):
+    capture = OutputCapture(head_bytes=4, tail_bytes=4, directory=str(tmp_path))
+    capture.write(b"abcdefgh")
+
+    assert capture.text() == "abcdefgh"
+    assert capture.output_id is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_writes_and_cleanup_run_off_the_event_loop(tmp_path, monkeypatch):
+    cleanup_threads = []
+    create_private = output_capture._create_private
+
+    class SlowFile:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, data):
+            time.sleep(0.05)
+            return self.f.write(data)
+
+        def close(self):
+            self.f.close()
+
+    def slow_cleanup(directory, ttl=output_capture.DEFAULT_OUTPUT_TTL):
+        cleanup_threads.append(threading.current_thread())
+        time.sleep(0.1)
+        return 0
+
+    monkeypatch.setattr(output_capture, "_create_private", lambda path: SlowFile(create_private(path)))
+    monkeypatch.setattr(output_capture, "cleanup_outputs", slow_cleanup)
+    monkeypatch.setattr(output_capture, "_last_cleanup", {})
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        texts = []
+        try:
+            for _ in range(2):
+                capture = OutputCapture(head_bytes=4, tail_bytes=4, directory=str(tmp_path))
+                for chunk in (b"abcd", b"efgh", b"ijkl", b"mnop", b"qrst"):
+                    await capture.awrite(chunk)
+                texts.append(await capture.atext())
+        finally:
+            ticker.cancel()
+        return texts, ticks
+
+    texts, ticks = asyncio.run(run())
+
+    assert all("bytes omitted" in text for text in texts)
+    # ~1 s lassú írás alatt is forgott az eseményhurok
+    assert ticks >= 50
+    # A takarítás munkaszálon, és percenként legfeljebb egyszer fut
+    assert len(cleanup_threads) == 1
+    assert cleanup_threads[0] is not threading.main_thread()
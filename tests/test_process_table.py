@@ -0,0 +1,79 @@
+"""
+Project-S - Process Table Tests
+
+Top-N ranking with filters, processes command options, and incremental
+per-process CPU accounting between refreshes.
+"""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from core.process_table import ProcessTable, parse_process_options, top_processes
+
+
+def record(pid, name, cpu=0.0, rss=0, io=0.0, username="alice"):
+    return {"pid": pid, "name": name, "username": username, "rss": rss, "cpu_percent": cpu, "io_rate": io}
+
+
+RECORDS = [
+    record(1, "init", cpu=0.1, rss=10, username="root"),
+    record(2, "python3", cpu=50.0, rss=300, io=5.0),
+    record(3, "python3", cpu=50.0, rss=100, io=9.0, username="DOMAIN\\Alice"),
+    record(4, "chrome", cpu=20.0, rss=900),
+    record(5, "sshd", cpu=0.0, rss=20, username=None),
+]
+
+
+def pids(records):
+    return [r["pid"] for r in records]
+
+
+def test_ranking_by_each_sort_key():
+    assert pids(top_processes(RECORDS, 3, "cpu")) == [2, 3, 4]
+    assert pids(top_processes(RECORDS, 2, "rss")) == [4, 2]
+    assert pids(top_processes(RECORDS, 1, "io")) == [3]
+
+
+def test_ties_prefer_larger_memory_then_lower_pid():
+    same = [record(9, "a", rss=5), record(7, "b", rss=5), record(8, "c", rss=6)]
+
+    assert pids(top_processes(same, 3, "cpu")) == [8, 7, 9]
+
+
+def test_user_and_name_filters():
+    assert pids(top_processes(RECORDS, 10, user="alice")) == [2, 3, 4]
+    assert pids(top_processes(RECORDS, 10, user="root")) == [1]
+    assert pids(top_processes(RECORDS, 10, name="^PY")) == [2, 3]
+    assert pids(top_processes(RECORDS, 10, user="alice", name="chrome|sshd")) == [4]
+
+
+def test_process_options_are_parsed_and_validated():
+    options = parse_process_options("sort=RSS n=5 user=root name=py.*")
+
+    assert (options["sort"], options["n"], options["user"]) == ("rss", 5, "root")
+    assert options["name"].search("PYTHON")
+    for args in ("sort=name", "n=x", "name=(", "verbose", "limit=3"):
+        with pytest.raises(ValueError):
+            parse_process_options(args)
+
+
+def test_refresh_measures_cpu_since_the_previous_refresh_and_drops_exited_processes():
+    pytest.importorskip("psutil")
+    table = ProcessTable()
+    busy = subprocess.Popen([sys.executable, "-c", "while True: pass"])
+    try:
+        first = {r["pid"]: r for r in table.refresh()}
+        time.sleep(0.5)
+        second = {r["pid"]: r for r in table.refresh()}
+    finally:
+        busy.kill()
+        busy.wait()
+    third = {r["pid"]: r for r in table.refresh()}
+
+    assert first[busy.pid]["cpu_percent"] == 0.0
+    assert second[busy.pid]["cpu_percent"] > 20.0
+    assert busy.pid not in third
+    assert len(table) == len(third)
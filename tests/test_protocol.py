@@ -0,0 +1,140 @@
+"""
+Project-S - Protocol Tests
+
+JSON envelopes next to the legacy text prefixes: parsing, replies tagged
+with the request id, concurrent requests on one connection and streamed
+output frames.
+"""
+
+import asyncio
+import json
+import sys
+
+import pytest
+
+from core.command_server import CommandServer
+from core.execution_engine import DEFAULT_CHUNK_SIZE
+from core.protocol import (ProtocolError, envelope_to_legacy, is_error_response, make_reply,
+                           parse_envelope)
+
+
+class FakeSocket:
+    """Minimal websocket: yields the given messages, then stays open until enough replies were sent"""
+
+    remote_address = ("127.0.0.1", 50000)
+
+    def __init__(self, messages, expected_replies):
+        self.messages = list(messages)
+        self.expected_replies = expected_replies
+        self.sent = []
+        self.done = asyncio.Event()
+
+    async def send(self, message):
+        self.sent.append(message)
+        if len(self.sent) >= self.expected_replies:
+            self.done.set()
+
+    def __aiter__(self):
+        return self._receive()
+
+    async def _receive(self):
+        for message in self.messages:
+            yield message
+        await self.done.wait()
+
+
+def test_legacy_messages_are_not_envelopes():
+    assert parse_envelope("CMD:dir") is None
+    assert parse_envelope("INFO:version") is None
+
+
+def test_envelope_is_parsed_and_converted_to_legacy():
+    envelope = parse_envelope('{"id": 42, "type": "cmd", "payload": "echo hi"}')
+
+    assert envelope == {"id": 42, "type": "CMD", "payload": "echo hi", "stream": False}
+    assert envelope_to_legacy(envelope) == "CMD:echo hi"
+
+
+def test_object_payload_is_sent_as_json():
+    envelope = parse_envelope('{"id": "1", "type": "CMD", "payload": {"parancs": "sysinfo"}}')
+
+    assert json.loads(envelope_to_legacy(envelope)[len("CMD:"):]) == {"parancs": "sysinfo"}
+
+
+@pytest.mark.parametrize("message, request_id", [
+    ("{not json", None),
+    ('{"type": "CMD", "payload": "x"}', None),
+    ('{"id": [1], "type": "CMD"}', None),
+    ('{"id": "5", "type": "NOPE"}', "5"),
+    ('{"id": "6", "type": "INFO", "stream": true}', "6"),
+])
+def test_invalid_envelopes_are_rejected_with_their_id(message, request_id):
+    with pytest.raises(ProtocolError) as excinfo:
+        parse_envelope(message)
+    assert excinfo.value.request_id == request_id
+
+
+def test_reply_carries_id_and_extra_fields():
+    reply = json.loads(make_reply("8", "busy", "later", retry_after_ms=40))
+
+    assert reply == {"id": "8", "type": "busy", "payload": "later", "retry_after_ms": 40}
+    assert is_error_response("Error: boom")
+    assert not is_error_response("ok")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX shell commands")
+def test_envelope_replies_come_back_in_completion_order():
+    server = CommandServer(history_path=":memory:", sample_interval=0,
+                           shell_pool_size=0, code_pool_size=0)
+    socket = FakeSocket([
+        json.dumps({"id": "slow", "type": "CMD", "payload": "sleep 0.5; echo slow"}),
+        json.dumps({"id": "fast", "type": "CMD", "payload": "echo fast"}),
+        '{"id": "bad", "type": "NOPE"}',
+    ], expected_replies=3)
+
+    async def run():
+        try:
+            await asyncio.wait_for(server.command_handler(socket), 30)
+        finally:
+            server.history.close()
+
+    asyncio.run(run())
+    replies = [json.loads(message) for message in socket.sent]
+
+    assert [reply["id"] for reply in replies] == ["bad", "fast", "slow"]
+    assert replies[0]["type"] == "error"
+    assert replies[1]["type"] == "result" and "fast" in replies[1]["payload"]
+    assert replies[2]["type"] == "result" and "slow" in replies[2]["payload"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX shell commands")
+def test_streamed_cmd_sends_bounded_output_frames_then_exit():
+    server = CommandServer(history_path=":memory:", sample_interval=0,
+                           shell_pool_size=0, code_pool_size=0)
+    socket = FakeSocket([], expected_replies=0)
+    envelope = parse_envelope(json.dumps({
+        "id": "7", "type": "CMD", "stream": True,
+        "payload": "head -c 200000 /dev/zero | tr '\\0' x; echo; echo oops >&2; exit 3",
+    }))
+
+    async def run():
+        try:
+            return await asyncio.wait_for(server.handle_stream(socket, envelope), 30)
+        finally:
+            server.history.close()
+
+    sent = asyncio.run(run())
+    frames = [json.loads(message) for message in socket.sent]
+    output, exit_frame = frames[:-1], frames[-1]
+
+    assert all(frame["id"] == "7" for frame in frames)
+    assert [frame["seq"] for frame in frames] == list(range(len(frames)))
+    assert len(output) > 1
+    assert max(len(frame["payload"]) for frame in output) <= DEFAULT_CHUNK_SIZE
+    stdout = "".join(frame["payload"] for frame in output if frame["stream"] == "stdout")
+    stderr = "".join(frame["payload"] for frame in output if frame["stream"] == "stderr")
+    assert stdout == "x" * 200000 + "\n"
+    assert stderr == "oops\n"
+    assert sent == len(stdout) + len(stderr)
+    assert exit_frame["type"] == "exit"
+    assert exit_frame["payload"] == 3 and exit_frame["timed_out"] is False
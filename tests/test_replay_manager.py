@@ -0,0 +1,56 @@
+"""
+Project-S - Replay Manager Tests
+
+ReplayManager on a HistoryStore shared with the server: one entry per
+finished command, and REPLAY indices that only count its own entries.
+"""
+
+import pytest
+
+from core.history_store import HistoryStore
+from replay.replay_manager import ReplayManager
+
+
+@pytest.fixture
+def store():
+    history = HistoryStore(":memory:")
+    yield history
+    history.close()
+
+
+@pytest.fixture
+def manager(store, tmp_path, monkeypatch):
+    # A napló (copilot_journal.md) a munkakönyvtárba íródik
+    monkeypatch.chdir(tmp_path)
+    return ReplayManager(history_store=store, source="ai_command_handler")
+
+
+def test_each_finished_command_is_stored_once(manager, store):
+    manager.add_command("CMD: dir", "file.txt", True)
+    manager.track_result("CMD: dir", True)
+
+    assert store.count() == 1
+    assert store.nth_recent(1)["response"] == "file.txt"
+
+
+def test_indices_ignore_entries_of_other_writers(manager, store):
+    manager.add_command("CMD: first", "1")
+    store.add("CMD: from the server", "x", source="server")
+    manager.add_command("CMD: second", "2")
+    store.add("CMD: also from the server", "y", source="server")
+
+    assert manager.get_command(1)["command"] == "CMD: second"
+    assert manager.get_command(2)["command"] == "CMD: first"
+    assert manager.get_command(3) is None
+    assert manager.history_size() == 2
+    assert [e["command"] for e in manager.recent_commands()] == ["CMD: second", "CMD: first"]
+    assert manager.validate_command("REPLAY:2")
+    assert not manager.validate_command("REPLAY:3")
+
+
+def test_track_result_counts_failures_without_history_entries(manager, store):
+    manager.track_result("CMD: flaky", False)
+    manager.track_result("CMD: flaky", False)
+
+    assert manager.failed_commands["CMD: flaky"] == 2
+    assert store.count() == 0
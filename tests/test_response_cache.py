@@ -0,0 +1,113 @@
+"""
+Project-S - Response Cache Tests
+
+Request normalization, TTL/LRU limits and invalidation of cached FILE
+responses when the file changes.
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from core.command_server import CommandServer
+from core.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache()
+
+
+def test_equivalent_requests_share_one_key(cache, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert cache.request_key("INFO: Version ").key == cache.request_key("INFO:version").key
+    assert (cache.request_key("FILE:read a.txt length=5 offset=1").key
+            == cache.request_key(f"FILE:read {tmp_path / 'a.txt'} offset=1 length=5").key)
+    assert cache.request_key("CMD:SYSINFO").key == cache.request_key("CMD: sysinfo").key
+
+
+@pytest.mark.parametrize("message", [
+    "INFO:metrics",
+    "FILE:write a.txt || x",
+    "FILE:read a.txt offset=oops",
+    "CMD:rm -rf build",
+    "CODE:print(1)",
+])
+def test_side_effects_and_invalid_requests_are_not_cached(cache, message):
+    assert cache.request_key(message) is None
+
+
+def test_errors_and_expired_entries_are_not_served(cache, monkeypatch):
+    key = cache.request_key("INFO:version")
+    cache.put(key, "Error retrieving system info: boom")
+    assert cache.get(key) is None
+
+    now = [1000.0]
+    monkeypatch.setattr("core.response_cache.time.monotonic", lambda: now[0])
+    cache.put(key, "v1")
+    assert cache.get(key) == "v1"
+    now[0] += cache.ttls["INFO"]
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_bytes=int(sys.getsizeof("x" * 100) * 2.5))
+    keys = {name: cache.request_key(f"INFO:{name}") for name in "abc"}
+
+    cache.put(keys["a"], "x" * 100)
+    cache.put(keys["b"], "x" * 100)
+    cache.get(keys["a"])
+    cache.put(keys["c"], "x" * 100)
+
+    assert cache.get(keys["b"]) is None
+    assert cache.get(keys["a"]) is not None and cache.get(keys["c"]) is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_write_drops_the_file_and_its_parent_listings(cache, tmp_path):
+    target = tmp_path / "sub" / "a.txt"
+    target.parent.mkdir()
+    target.write_text("old")
+    (tmp_path / "b.txt").write_text("b")
+    messages = [f"FILE:read {target}", f"FILE:list {tmp_path} depth=2", f"FILE:list {target.parent}",
+                f"FILE:read {tmp_path / 'b.txt'}"]
+    for message in messages:
+        cache.put(cache.request_key(message), "cached")
+
+    assert cache.invalidate_path(str(target)) == 3
+    assert [cache.get(cache.request_key(message)) for message in messages] == [None, None, None, "cached"]
+
+
+def test_changes_made_outside_the_server_are_noticed(cache, tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_text("old")
+    cache.put(cache.request_key(f"FILE:read {target}"), "old")
+
+    target.write_text("newer")
+
+    assert cache.get(cache.request_key(f"FILE:read {target}")) is None
+
+
+def test_server_serves_reads_from_cache_until_the_file_is_written(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = CommandServer(history_path=":memory:", sample_interval=0,
+                           shell_pool_size=0, code_pool_size=0)
+
+    async def run():
+        try:
+            await server.process_message("FILE:write a.txt || first")
+            first = await server.process_message("FILE:read a.txt")
+            cached = await server.process_message("FILE:read a.txt")
+            hits = server.cache.stats["hits"]
+            await server.process_message("FILE:write a.txt || second")
+            second = await server.process_message("FILE:read a.txt")
+            return first, cached, hits, second, server.cache.stats["invalidations"]
+        finally:
+            server.history.close()
+
+    first, cached, hits, second, invalidations = asyncio.run(run())
+
+    assert first.endswith("first") and cached == first and hits == 1
+    assert second.endswith("second") and invalidations == 1
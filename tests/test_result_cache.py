@@ -0,0 +1,91 @@
+"""
+Project-S - Result Cache Tests
+
+LRU + TTL cache of library command results and the per-command cache
+policies declared in the command registry.
+"""
+
+import asyncio
+
+from core.command_registry import CommandRegistry
+from core.result_cache import CACHE_FOREVER, CACHE_NEVER, MISSING, ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_own_ttl():
+    clock = FakeClock()
+    cache = ResultCache(clock=clock)
+    cache.put("short", "a", 5)
+    cache.put("forever", "b", CACHE_FOREVER)
+    cache.put("never", "c", CACHE_NEVER)
+
+    clock.now += 5
+
+    assert cache.get("short") is MISSING
+    assert cache.get("forever") == "b"
+    assert cache.get("never") is MISSING
+    assert cache.stats["expirations"] == 1
+
+
+def test_stored_none_is_a_hit():
+    cache = ResultCache()
+    cache.put("key", None, 10)
+
+    assert cache.get("key") is None
+    assert cache.hits == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    cache.get("a")
+    cache.put("c", 3, 10)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def make_registry(cache):
+    calls = []
+
+    def counted(args=""):
+        calls.append(args)
+        return "Error: failed" if args == "bad" else f"result {len(calls)}"
+
+    async def counted_async(args=""):
+        return counted(args)
+
+    registry = CommandRegistry(shell_runner=None, entry_point_group=None, cache=cache)
+    registry.register("cached", counted, cache_ttl=10, async_target=counted_async)
+    registry.register("uncached", counted)
+    return registry, calls
+
+
+def test_registry_caches_per_command_and_arguments():
+    registry, calls = make_registry(ResultCache())
+
+    assert registry["cached"]("x") == registry["cached"](" x ") == "result 1"
+    assert registry["cached"]("y") == "result 2"
+    assert registry["uncached"]("x") != registry["uncached"]("x")
+    assert len(calls) == 4
+
+
+def test_errors_are_not_cached_and_async_calls_share_the_entries():
+    registry, calls = make_registry(ResultCache())
+
+    registry["cached"]("bad")
+    registry["cached"]("bad")
+    first = registry["cached"]("x")
+    awaited = asyncio.run(registry.acall("cached", "x"))
+
+    assert awaited == first
+    assert calls == ["bad", "bad", "x"]
@@ -0,0 +1,97 @@
+"""
+Project-S - Retry Policy Tests
+
+Classification of failed executions, the choice of policy per command
+class, and the retry loop's attempt and time limits.
+"""
+
+import asyncio
+
+import pytest
+
+from core.execution_engine import ExecutionResult
+from core.retry_policy import DEFAULT_POLICIES, RetryPolicies, RetryPolicy, run_with_retry
+
+
+@pytest.mark.parametrize("result, expected", [
+    (ExecutionResult(127, stderr="sh: 1: foo: not found"), (False, "exit code")),
+    (ExecutionResult(1, stderr="cat: x: No such file or directory"), (False, "permanent error")),
+    (ExecutionResult(1, stderr="SyntaxError: invalid syntax"), (False, "permanent error")),
+    (ExecutionResult(7, stderr="curl: (7) Connection refused"), (True, "transient error")),
+    (ExecutionResult(22, stderr="The requested URL returned error: 503"), (True, "transient error")),
+    (ExecutionResult(1, stderr="sqlite3.OperationalError: database is locked"), (True, "transient error")),
+    (ExecutionResult(-9), (True, "signal")),
+    (ExecutionResult(None, timed_out=True), (False, "timeout")),
+    (ExecutionResult(1), (False, "unclassified failure")),
+])
+def test_failures_are_classified(result, expected):
+    assert RetryPolicy("test").classify(result) == expected
+
+
+def test_permanent_patterns_win_over_retryable_exit_codes():
+    policy = RetryPolicy("test", retryable_exit_codes=(2,))
+
+    assert policy.classify(ExecutionResult(2, stderr="usage: tool [-h]")) == (False, "permanent error")
+    assert policy.classify(ExecutionResult(2)) == (True, "exit code")
+
+
+@pytest.mark.parametrize("cmd, policy", [
+    ("grep needle file.txt", "shell"),
+    ("ping -t example.com", "network"),
+    ("git push origin main", "state_changing"),
+    ("echo hi > out.txt", "state_changing"),
+    ("rm -rf build", "state_changing"),
+])
+def test_policy_is_chosen_by_command_class(cmd, policy):
+    assert RetryPolicies().for_command(cmd).name == policy
+
+
+def test_default_policies_do_not_rerun_answers_or_timeouts():
+    no_match = ExecutionResult(1)  # grep találat nélkül, test -f hiányzó fájlra
+    timed_out = ExecutionResult(None, timed_out=True)  # pl. ping -t
+
+    assert not DEFAULT_POLICIES["shell"].classify(no_match)[0]
+    for policy in DEFAULT_POLICIES.values():
+        assert not policy.classify(timed_out)[0]
+
+
+def run_attempts(policy, results):
+    attempts = []
+
+    async def operation():
+        attempts.append(len(attempts))
+        return results[min(len(attempts) - 1, len(results) - 1)]
+
+    result = asyncio.run(run_with_retry(operation, policy, "test"))
+    return result, len(attempts)
+
+
+def test_transient_failures_are_retried_until_success():
+    policy = RetryPolicy("test", max_attempts=3, base_delay=0.001)
+    transient = ExecutionResult(1, stderr="Resource temporarily unavailable")
+
+    result, attempts = run_attempts(policy, [transient, transient, ExecutionResult(0)])
+
+    assert result.ok and attempts == 3
+
+
+def test_attempts_stop_at_max_attempts():
+    policy = RetryPolicy("test", max_attempts=2, base_delay=0.001)
+
+    result, attempts = run_attempts(policy, [ExecutionResult(-15)])
+
+    assert result.returncode == -15 and attempts == 2
+
+
+def test_no_retry_starts_after_the_time_budget():
+    policy = RetryPolicy("test", max_attempts=5, base_delay=0.2, jitter=0, max_elapsed=0.1)
+
+    _, attempts = run_attempts(policy, [ExecutionResult(-9)])
+
+    assert attempts == 1
+
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy("test", base_delay=1.0, multiplier=2.0, max_delay=3.0, jitter=0)
+
+    assert [policy.delay(retry) for retry in (1, 2, 3)] == [1.0, 2.0, 3.0]
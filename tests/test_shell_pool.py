@@ -0,0 +1,112 @@
+"""
+Project-S - Shell Pool Tests
+
+Malformed command lines fail fast instead of hanging the persistent shell
+until the timeout, and shared sessions do not leak state between requests.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from core.shell_pool import ShellPool
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="tests the POSIX /bin/sh session")
+
+
+def run_commands(commands, affinity=False, timeout=10):
+    """Run commands one after the other on a one-session pool; returns (results, elapsed seconds)"""
+    async def run():
+        pool = ShellPool(size=1, affinity=affinity)
+        try:
+            start = time.monotonic()
+            results = [await pool.run(cmd, timeout=timeout, client_id="client" if affinity else None)
+                       for cmd in commands]
+            return results, time.monotonic() - start
+        finally:
+            await pool.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("affinity", [False, True])
+@pytest.mark.parametrize("cmd, returncode", [
+    ("echo 'unterminated", 2),
+    ('echo "unterminated', 2),
+    # Mint `sh -c`: a záró backslash önmagát jelenti
+    ("echo trailing \\", 0),
+])
+def test_unterminated_input_fails_fast_and_keeps_the_session(affinity, cmd, returncode):
+    (broken, after), elapsed = run_commands([cmd, "echo still alive"], affinity=affinity)
+
+    assert not broken.timed_out
+    assert broken.returncode == returncode
+    assert after.returncode == 0
+    assert after.stdout.strip() == "still alive"
+    assert elapsed < 5
+
+
+def test_shared_session_does_not_leak_state():
+    results, _ = run_commands([
+        "export PROJECT_S_TEST=leaked; alias ll=leaked; cd /",
+        'echo "${PROJECT_S_TEST:-clean}"; alias ll 2>/dev/null || echo no-alias; pwd',
+    ])
+
+    lines = results[1].stdout.split()
+    assert lines[0] == "clean"
+    assert lines[1] == "no-alias"
+    assert lines[2] != "/"
+
+
+def test_affinity_session_keeps_state():
+    results, _ = run_commands(["export PROJECT_S_TEST=kept", 'echo "$PROJECT_S_TEST"'], affinity=True)
+
+    assert results[1].stdout.strip() == "kept"
+
+
+def test_background_job_output_does_not_leak_into_the_next_reply():
+    results, _ = run_commands([
+        "(sleep 0.5; echo LEAKED) & echo A",
+        "sleep 1; echo B",
+    ])
+
+    assert results[0].stdout.strip() == "A"
+    assert results[1].stdout.strip() == "B"
+
+
+def test_timeout_kills_the_running_command(tmp_path):
+    pid_file = tmp_path / "cmd.pid"
+
+    (result, after), elapsed = run_commands([f"echo $$ > {pid_file}; sleep 30", "echo next"], timeout=0.5)
+
+    assert result.timed_out
+    assert after.stdout.strip() == "next"
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.05)
+    pytest.fail(f"command {pid} survived the timeout")
+
+
+def test_cancelled_request_does_not_return_a_killed_session():
+    async def run():
+        pool = ShellPool(size=1, affinity=False)
+        try:
+            task = asyncio.create_task(pool.run("sleep 30", timeout=60))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await pool.run("echo after", timeout=10)
+        finally:
+            await pool.close()
+
+    result = asyncio.run(asyncio.wait_for(run(), 20))
+
+    assert result.returncode == 0
+    assert result.stdout.strip() == "after"
@@ -0,0 +1,124 @@
+"""
+Project-S - Single Flight Tests
+
+Coalescing of identical concurrent calls (threads and coroutines) and
+the read-only check that decides which shell commands may be coalesced.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.single_flight import AsyncSingleFlight, SingleFlight, is_read_only, normalize_command
+
+
+@pytest.mark.parametrize("command, read_only", [
+    ("dir C:\\temp", True),
+    ("grep -r needle .", True),
+    ("C:\\Windows\\System32\\PING.EXE host", True),
+    ("hostname", True),
+    ("hostname newname", False),
+    ("arp -a", True),
+    ("arp -d 10.0.0.1", False),
+    ("cat a.txt > b.txt", False),
+    ("echo hi; rm -rf x", False),
+    ("ls $(rm x)", False),
+    ("python deploy.py", False),
+    ("", False),
+])
+def test_only_allowlisted_commands_without_operators_are_read_only(command, read_only):
+    assert is_read_only(command) == read_only
+
+
+def test_whitespace_does_not_change_the_key():
+    assert normalize_command("ls   -la  /tmp") == normalize_command("ls -la /tmp")
+    assert normalize_command('echo "a  b"') != normalize_command('echo "a b"')
+
+
+def test_concurrent_thread_calls_share_one_execution():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow, 21)))
+               for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flights.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [42] * 4
+    assert calls == [21]
+    assert flights.stats == {"executions": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_thread_callers_share_the_exception_and_nothing_is_remembered():
+    flights = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: "again") == "again"
+    assert flights.executions == 2
+
+
+def test_concurrent_coroutines_share_one_execution():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.stats == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_execution_survives_one_cancelled_caller_but_not_all():
+    flights = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flights.do("shared", work))
+        second = asyncio.create_task(flights.do("shared", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        shared = await second
+
+        alone = asyncio.create_task(flights.do("alone", work))
+        await asyncio.sleep(0.01)
+        (task, _), = [entry for key, entry in flights._calls.items() if key == "alone"]
+        alone.cancel()
+        await asyncio.gather(alone, return_exceptions=True)
+        await asyncio.sleep(0)
+        return shared, task.cancelled()
+
+    shared, abandoned_cancelled = asyncio.run(run())
+
+    assert shared == "done"
+    assert abandoned_cancelled
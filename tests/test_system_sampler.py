@@ -0,0 +1,66 @@
+"""
+Project-S - System Sampler Tests
+
+Ring-buffered time series and the background snapshots behind the
+sysinfo, processes, network and diskspace commands.
+"""
+
+import os
+import time
+
+import pytest
+
+from core.system_sampler import SERIES, RingSeries, SystemSampler, summarize_window
+
+psutil = pytest.importorskip("psutil")
+
+
+def test_ring_series_keeps_the_newest_samples():
+    series = RingSeries(3)
+    for ts in range(5):
+        series.append(float(ts), ts * 10)
+
+    assert len(series) == 3
+    assert series.latest == (4.0, 40)
+    assert series.window(1.5, now=4.0) == [(3.0, 30), (4.0, 40)]
+    assert series.window(100, now=4.0) == [(2.0, 20), (3.0, 30), (4.0, 40)]
+
+
+def test_window_summary():
+    assert summarize_window([]) is None
+    assert summarize_window([(0, 1.0), (1, 3.0), (2, 2.0)]) == {"min": 1.0, "avg": 2.0, "max": 3.0,
+                                                                "samples": 3}
+
+
+def test_snapshot_carries_readings_tables_and_series():
+    sampler = SystemSampler(interval=1.0, table_interval=60.0)
+
+    first = sampler.snapshot()
+    second = sampler.sample()
+
+    assert first is not second
+    assert 0.0 <= second["cpu_percent"] <= 100.0
+    assert second["memory_total"] > 0 and second["logical_cores"] >= 1
+    assert any(record["pid"] == os.getpid() for record in second["processes"])
+    assert second["process_count"] == len(second["processes"])
+    # A drága táblák csak table_interval szerint frissülnek
+    assert second["processes"] is first["processes"]
+    assert second["tables_time"] == first["tables_time"]
+    for name in SERIES:
+        assert len(sampler.series[name]) == 2
+
+
+def test_background_thread_keeps_sampling():
+    sampler = SystemSampler(interval=0.05, table_interval=0.05, history_seconds=1)
+    try:
+        sampler.start()
+        deadline = time.monotonic() + 5
+        while sampler.samples_taken < 4 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert sampler.running
+        assert sampler.samples_taken >= 4
+        assert sampler.errors == 0
+        assert len(sampler.window("cpu_percent", 60)) >= 4
+    finally:
+        sampler.stop()
+    assert not sampler.running
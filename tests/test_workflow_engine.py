@@ -0,0 +1,68 @@
+"""
+Project-S - Workflow Engine Tests
+
+Malformed WORKFLOW: documents are rejected with WorkflowError.
+"""
+
+import asyncio
+
+import pytest
+
+from core.workflow_engine import Workflow, WorkflowEngine, WorkflowError
+
+
+@pytest.mark.parametrize("document", [
+    None,
+    [],
+    {},
+    {"parancsok": "echo a"},
+    {"parancsok": [42]},
+    {"parancsok": [{"utasitas": 42}]},
+    {"parancsok": [{"utasitas": "   "}]},
+    {"parancsok": [{"parancs": ["ping"], "paraméterek": "x"}]},
+    {"parancsok": [{"utasitas": "echo a", "id": True}]},
+    {"parancsok": [{"utasitas": "echo a", "id": {"x": 1}}]},
+    {"parancsok": [{"utasitas": "echo a", "fugg": [{"x": 1}]}]},
+    {"parancsok": [{"utasitas": "echo a", "cache": "soon"}]},
+    {"parancsok": [{"utasitas": "echo a", "cache": True}]},
+    {"parancsok": [{"id": "a", "utasitas": "echo a"}, {"id": "a", "utasitas": "echo b"}]},
+    {"parancsok": [{"id": "a", "utasitas": "echo a", "fugg": "missing"}]},
+    {"parancsok": [{"id": "a", "utasitas": "echo a", "fugg": "b"},
+                   {"id": "b", "utasitas": "echo b", "fugg": "a"}]},
+    {"parancsok": ["echo a"], "parallel": "many"},
+])
+def test_malformed_document_raises_workflow_error(document):
+    with pytest.raises(WorkflowError):
+        Workflow.from_document(document)
+
+
+def test_valid_document_runs_in_dependency_order():
+    document = {"parancsok": [
+        {"id": "a", "utasitas": "echo a"},
+        {"id": "b", "utasitas": "echo b", "fugg": "a"},
+        {"id": "c", "utasitas": "echo c", "fugg": ["a", "b"]},
+    ]}
+    order = []
+
+    async def execute(command):
+        order.append(command)
+        return 0, command[5:]
+
+    summary = asyncio.run(WorkflowEngine(execute).run(Workflow.from_document(document)))
+
+    assert order == ["echo a", "echo b", "echo c"]
+    assert summary["status"] == "ok"
+
+
+def test_server_reports_malformed_workflow_as_error_reply():
+    from core.command_server import CommandServer
+
+    async def run():
+        server = CommandServer(shell_pool_size=0, code_pool_size=0, history_path=":memory:",
+                               sample_interval=0)
+        try:
+            return await server.handle_workflow('{"parancsok": [{"utasitas": 42}]}')
+        finally:
+            server.history.close()
+
+    assert asyncio.run(run()).startswith("Error: ")